@@ -0,0 +1,1049 @@
+#!/usr/bin/python
+
+"""A local stand-in for the Betfair API, for benchmarking pybetfair offline.
+
+MockBetfairServer answers the SOAP calls that pybetfair makes most often,
+over plain HTTP, with generated but realistic responses:
+
+    global   -- login, keepAlive, getEvents
+    exchange -- getMarket, getAllMarkets, getInPlayMarkets, getMarketPrices,
+                getMarketPricesCompressed, getCompleteMarketPricesCompressed,
+                getMarketTradedVolumeCompressed, getDetailAvailableMktDepth,
+                placeBets, cancelBets, getCurrentBets, getMUBets,
+                getCurrentBetsLite, getMUBetsLite, getBetLite,
+                getBetMatchesLite
+
+The number of markets and runners, the latency added to every response and
+whether responses are gzipped can all be configured, and the prices are
+generated from a seed, so a benchmark run against the server can be repeated
+exactly. Bets are matched at once if their price is as good as the best
+available, and otherwise stay unmatched until they are cancelled.
+
+Every call other than login needs a session token returned by login, and
+fails with NO_SESSION otherwise.
+
+The server can be run from the command line (python mockbetfair.py --help),
+or in-process alongside the client, e.g.
+
+    server = MockBetfairServer(markets=50, latency=0.02).start()
+    exchange = BFExchangeService(hostname=server.hostname, secure=False)
+    ...
+    server.stop()
+
+Copyright (C) 2006-9 Russ Gray russgray@shinyhead.me.uk
+
+This program is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+"""
+
+import BaseHTTPServer
+import SocketServer
+import re
+import threading
+from gzip import GzipFile
+from random import Random
+from StringIO import StringIO
+from time import time, sleep, gmtime, strftime
+from xml.sax.saxutils import escape
+
+_EXCHANGE_SOAP_NAMESPACE = 'http://www.betfair.com/publicapi/v5/BFExchangeService/'
+_GLOBAL_SOAP_NAMESPACE = 'http://www.betfair.com/publicapi/v3/BFGlobalService/'
+
+# the event type that all the mock markets are under
+SOCCER_EVENT_TYPE_ID = 1
+
+# ids of the first mock event and market
+FIRST_EVENT_ID = 2000001
+FIRST_MARKET_ID = 1000001
+
+_RESPONSE_ENVELOPE = '<?xml version="1.0" encoding="UTF-8"?>' \
+    '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" ' \
+    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"><soap:Body>' \
+    '<n:%s xmlns:n="%s"><n:Result><header><clientStamp>0</clientStamp>' \
+    '<errorCode>%s</errorCode><minorErrorCode xsi:nil="1"/>%s' \
+    '<timestamp>%s</timestamp></header>%s</n:Result></n:%s></soap:Body>' \
+    '</soap:Envelope>'
+
+_FAULT_ENVELOPE = '<?xml version="1.0" encoding="UTF-8"?>' \
+    '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">' \
+    '<soap:Body><soap:Fault><faultcode>soap:Client</faultcode>' \
+    '<faultstring>%s</faultstring></soap:Fault></soap:Body></soap:Envelope>'
+
+# the body of each response when a call fails, filled in with the error code
+_ERROR_BODIES = {
+    'login':'<currency xsi:nil="1"/><errorCode>%s</errorCode>'
+        '<minorErrorCode xsi:nil="1"/>'
+        '<validUntil>0001-01-01T00:00:00.000Z</validUntil>',
+    'keepAlive':'<apiVersion xsi:nil="1"/><minorErrorCode xsi:nil="1"/>',
+    'getEvents':'<errorCode>%s</errorCode><eventItems xsi:nil="1"/>'
+        '<eventParentId>0</eventParentId><marketItems xsi:nil="1"/>'
+        '<minorErrorCode xsi:nil="1"/>',
+    'getMarket':'<errorCode>%s</errorCode><market xsi:nil="1"/>'
+        '<minorErrorCode xsi:nil="1"/>',
+    'getAllMarkets':'<errorCode>%s</errorCode><marketData xsi:nil="1"/>'
+        '<minorErrorCode xsi:nil="1"/>',
+    'getInPlayMarkets':'<errorCode>%s</errorCode><marketData xsi:nil="1"/>'
+        '<minorErrorCode xsi:nil="1"/>',
+    'getMarketPrices':'<errorCode>%s</errorCode><marketPrices xsi:nil="1"/>'
+        '<minorErrorCode xsi:nil="1"/>',
+    'getMarketPricesCompressed':'<errorCode>%s</errorCode>'
+        '<marketPrices xsi:nil="1"/><minorErrorCode xsi:nil="1"/>',
+    'getCompleteMarketPricesCompressed':'<completeMarketPrices xsi:nil="1"/>'
+        '<errorCode>%s</errorCode><minorErrorCode xsi:nil="1"/>',
+    'getMarketTradedVolumeCompressed':'<errorCode>%s</errorCode>'
+        '<tradedVolume xsi:nil="1"/><currencyCode xsi:nil="1"/>'
+        '<marketId>0</marketId><minorErrorCode xsi:nil="1"/>',
+    'getDetailAvailableMktDepth':'<errorCode>%s</errorCode>'
+        '<minorErrorCode xsi:nil="1"/><priceItems xsi:nil="1"/>',
+    'placeBets':'<betResults xsi:nil="1"/><errorCode>%s</errorCode>'
+        '<minorErrorCode xsi:nil="1"/>',
+    'cancelbets':'<betResults xsi:nil="1"/><errorCode>%s</errorCode>'
+        '<minorErrorCode xsi:nil="1"/>',
+    'getCurrentBets':'<bets xsi:nil="1"/><errorCode>%s</errorCode>'
+        '<minorErrorCode xsi:nil="1"/><totalRecordCount>0</totalRecordCount>',
+    'getMUBets':'<bets xsi:nil="1"/><errorCode>%s</errorCode>'
+        '<minorErrorCode xsi:nil="1"/><totalRecordCount>0</totalRecordCount>',
+    'getCurrentBetsLite':'<betLites xsi:nil="1"/><errorCode>%s</errorCode>'
+        '<minorErrorCode xsi:nil="1"/><totalRecordCount>0</totalRecordCount>',
+    'getMUBetsLite':'<betLites xsi:nil="1"/><errorCode>%s</errorCode>'
+        '<minorErrorCode xsi:nil="1"/><totalRecordCount>0</totalRecordCount>',
+    'getBetLite':'<betLite xsi:nil="1"/><errorCode>%s</errorCode>',
+    'getBetMatchesLite':'<matchLites xsi:nil="1"/><errorCode>%s</errorCode>',
+}
+
+# SOAP action -> (namespace, response element)
+_RESPONSES = {
+    'login':(_GLOBAL_SOAP_NAMESPACE, 'loginResponse'),
+    'keepAlive':(_GLOBAL_SOAP_NAMESPACE, 'keepAliveResponse'),
+    'getEvents':(_GLOBAL_SOAP_NAMESPACE, 'getEventsResponse'),
+    'getMarket':(_EXCHANGE_SOAP_NAMESPACE, 'getMarketResponse'),
+    'getAllMarkets':(_EXCHANGE_SOAP_NAMESPACE, 'getAllMarketsResponse'),
+    'getInPlayMarkets':(_EXCHANGE_SOAP_NAMESPACE, 'getInPlayMarketsResponse'),
+    'getMarketPrices':(_EXCHANGE_SOAP_NAMESPACE, 'getMarketPricesResponse'),
+    'getMarketPricesCompressed':(_EXCHANGE_SOAP_NAMESPACE,
+                                 'getMarketPricesCompressedResponse'),
+    'getCompleteMarketPricesCompressed':(_EXCHANGE_SOAP_NAMESPACE,
+                                 'getCompleteMarketPricesCompressedResponse'),
+    'getMarketTradedVolumeCompressed':(_EXCHANGE_SOAP_NAMESPACE,
+                                 'getMarketTradedVolumeCompressedResponse'),
+    'getDetailAvailableMktDepth':(_EXCHANGE_SOAP_NAMESPACE,
+                                 'getDetailAvailableMktDepthResponse'),
+    'placeBets':(_EXCHANGE_SOAP_NAMESPACE, 'placeBetsResponse'),
+    'cancelbets':(_EXCHANGE_SOAP_NAMESPACE, 'cancelBetsResponse'),
+    'getCurrentBets':(_EXCHANGE_SOAP_NAMESPACE, 'getCurrentBetsResponse'),
+    'getMUBets':(_EXCHANGE_SOAP_NAMESPACE, 'getMUBetsResponse'),
+    'getCurrentBetsLite':(_EXCHANGE_SOAP_NAMESPACE,
+                          'getCurrentBetsLiteResponse'),
+    'getMUBetsLite':(_EXCHANGE_SOAP_NAMESPACE, 'getMUBetsLiteResponse'),
+    'getBetLite':(_EXCHANGE_SOAP_NAMESPACE, 'getBetLiteResponse'),
+    'getBetMatchesLite':(_EXCHANGE_SOAP_NAMESPACE,
+                         'getBetMatchesLiteResponse'),
+}
+
+def _make_ladder():
+    """Return the valid Betfair prices, lowest first.
+
+    >>> ladder = _make_ladder()
+    >>> ladder[:3], ladder[99:102], ladder[-2:]
+    ([1.01, 1.02, 1.03], [2.0, 2.02, 2.04], [990.0, 1000.0])
+
+    """
+    # (upper bound, increment) in hundredths
+    bands = ((200, 1), (300, 2), (400, 5), (600, 10), (1000, 20), (2000, 50),
+             (3000, 100), (5000, 200), (10000, 500), (100000, 1000))
+    ladder = []
+    price = 101
+    for upper, increment in bands:
+        while price < upper:
+            ladder.append(price / 100.0)
+            price += increment
+    ladder.append(price / 100.0)
+    return ladder
+
+_LADDER = _make_ladder()
+
+def _iso_time(seconds):
+    return strftime('%Y-%m-%dT%H:%M:%S.000Z', gmtime(seconds))
+
+def _field(name, xml, default=None):
+    """Return the text of the first name element in a request."""
+    match = re.search(r'<(?:\w+:)?%s>([^<]*)</' % (name,), xml)
+    return match and match.group(1).strip() or default
+
+def _fields(name, xml):
+    """Return the contents of each name element in a request."""
+    return re.findall(r'<(?:\w+:)?%s>(.*?)</(?:\w+:)?%s>' % (name, name), xml,
+                      re.S)
+
+class MockRunner:
+
+    """A runner in a mock market, with a generated price ladder.
+
+    Attributes:
+        selectionId   -- the id of the runner
+        name          -- the name of the runner
+        sortOrder     -- the order in which the runner is displayed
+        backTick      -- the position in the price ladder of the best price
+                         to back, the best price to lay being one above it
+        backAmounts   -- the amounts available to back, best first
+        layAmounts    -- the amounts available to lay, best first
+        totalMatched  -- the amount matched on the runner
+
+    """
+    def __init__(self, selectionId, name, sortOrder, odds, random, depth=10):
+        self.selectionId = selectionId
+        self.name = name
+        self.sortOrder = sortOrder
+
+        # find the tick below the odds, leaving room for the ladder
+        # either side of it
+        tick = 0
+        while tick < len(_LADDER) - 1 and _LADDER[tick + 1] <= odds: tick += 1
+        self.backTick = max(depth - 1, min(tick, len(_LADDER) - depth - 1))
+
+        self.backAmounts = [ round(random.uniform(2, 500), 2)
+                             for i in range(depth) ]
+        self.layAmounts = [ round(random.uniform(2, 500), 2)
+                            for i in range(depth) ]
+        self.totalMatched = round(random.uniform(100, 50000), 2)
+
+    def bestBackPrice(self):
+        return _LADDER[self.backTick]
+
+    def bestLayPrice(self):
+        return _LADDER[self.backTick + 1]
+
+    def backPrices(self, depth):
+        """Return the best depth (price, amount) pairs available to back."""
+        return [ (_LADDER[self.backTick - i], self.backAmounts[i])
+                 for i in range(depth) ]
+
+    def layPrices(self, depth):
+        """Return the best depth (price, amount) pairs available to lay."""
+        return [ (_LADDER[self.backTick + 1 + i], self.layAmounts[i])
+                 for i in range(depth) ]
+
+class MockMarket:
+
+    """A generated market, and the responses describing it.
+
+    The responses are rendered when first asked for and then kept, as the
+    prices never change.
+
+    Attributes:
+        marketId  -- the id of the market
+        eventId   -- the id of the event the market is in
+        name      -- the name of the event
+        startTime -- the time the market starts, in seconds since the epoch
+        runners   -- list of MockRunner
+
+    """
+    def __init__(self, marketId, eventId, name, startTime, runners, random,
+                 depth=10):
+        self.marketId = marketId
+        self.eventId = eventId
+        self.name = name
+        self.startTime = startTime
+
+        # a spread of odds adding up to a fair book
+        weights = [ 1.0 / (i + 1.5) for i in range(runners) ]
+        total = sum(weights)
+        self.runners = [ MockRunner(marketId * 100 + i, 'Runner %i' % (i + 1),
+                                    i, total / weights[i], random, depth)
+                         for i in range(runners) ]
+        self._runners = dict([ (runner.selectionId, runner)
+                               for runner in self.runners ])
+        self._xml = {}
+
+    def getRunner(self, selectionId):
+        return self._runners.get(selectionId)
+
+    def render(self, action):
+        """Return the body of the response to action for this market."""
+        xml = self._xml.get(action)
+        if xml is None:
+            xml = self._xml[action] = getattr(self, '_render_' + action)()
+        return xml
+
+    def _render_getMarket(self):
+        runners = ''.join([ '<Runner><asianLineId>0</asianLineId>'
+            '<handicap>0.0</handicap><name>%s</name>'
+            '<selectionId>%i</selectionId></Runner>' % \
+            (escape(runner.name), runner.selectionId)
+            for runner in self.runners ])
+
+        return '<errorCode>OK</errorCode><market><countryISO3>GBR'\
+            '</countryISO3><discountAllowed>true</discountAllowed>' \
+            '<eventTypeId>%i</eventTypeId><lastRefresh>%i</lastRefresh>' \
+            '<marketBaseRate>5.0</marketBaseRate><marketDescription>Mock ' \
+            'market</marketDescription><marketDisplayTime>%s' \
+            '</marketDisplayTime><marketId>%i</marketId><marketStatus>ACTIVE' \
+            '</marketStatus><marketSuspendTime>%s</marketSuspendTime>' \
+            '<marketTime>%s</marketTime><marketType>O</marketType><menuPath>' \
+            '\\Soccer\\Mock League\\%s</menuPath><name>Match Odds</name>' \
+            '<numberOfWinners>1</numberOfWinners><parentEventId>%i' \
+            '</parentEventId><runners>%s</runners><runnersMayBeAdded>false' \
+            '</runnersMayBeAdded><timezone>GMT</timezone></market>' \
+            '<minorErrorCode xsi:nil="1"/>' % \
+            (SOCCER_EVENT_TYPE_ID, self.startTime * 1000,
+             _iso_time(self.startTime), self.marketId,
+             _iso_time(self.startTime), _iso_time(self.startTime),
+             escape(self.name), self.eventId, runners)
+
+    def _render_getMarketPrices(self):
+        def prices(pairs, betType):
+            return ''.join([ '<Price><amountAvailable>%.2f</amountAvailable>'
+                '<betType>%s</betType><depth>%i</depth><price>%s</price>'
+                '</Price>' % (amount, betType, depth + 1, price)
+                for depth, (price, amount) in enumerate(pairs) ])
+
+        runners = ''.join([ '<RunnerPrices><asianLineId>0</asianLineId>'
+            '<bestPricesToBack>%s</bestPricesToBack><bestPricesToLay>%s'
+            '</bestPricesToLay><handicap>0.0</handicap><lastPriceMatched>%s'
+            '</lastPriceMatched><reductionFactor>0.0</reductionFactor>'
+            '<selectionId>%i</selectionId><sortOrder>%i</sortOrder>'
+            '<totalAmountMatched>%.2f</totalAmountMatched><vacant>false'
+            '</vacant></RunnerPrices>' % \
+            (prices(runner.backPrices(3), 'L'),
+             prices(runner.layPrices(3), 'B'), runner.bestBackPrice(),
+             runner.selectionId, runner.sortOrder, runner.totalMatched)
+            for runner in self.runners ])
+
+        return '<errorCode>OK</errorCode><marketPrices><currencyCode>GBP' \
+            '</currencyCode><delay>0</delay><discountAllowed>true' \
+            '</discountAllowed><lastRefresh>%i</lastRefresh><marketBaseRate>' \
+            '5.0</marketBaseRate><marketId>%i</marketId><marketInfo ' \
+            'xsi:nil="1"/><marketStatus>ACTIVE</marketStatus>' \
+            '<numberOfWinners>1</numberOfWinners><runnerPrices>%s' \
+            '</runnerPrices></marketPrices><minorErrorCode xsi:nil="1"/>' % \
+            (self.startTime * 1000, self.marketId, runners)
+
+    def _render_getMarketPricesCompressed(self):
+        def prices(pairs, betType):
+            return ''.join([ '%s~%.2f~%s~%i~' % (price, amount, betType,
+                                                 depth + 1)
+                for depth, (price, amount) in enumerate(pairs) ])
+
+        runners = ''.join([ ':%i~%i~%.2f~%s~~0.0~false~~~~|%s|%s' % \
+            (runner.selectionId, runner.sortOrder, runner.totalMatched,
+             runner.bestBackPrice(), prices(runner.backPrices(3), 'L'),
+             prices(runner.layPrices(3), 'B'))
+            for runner in self.runners ])
+
+        return '<errorCode>OK</errorCode><marketPrices>%i~GBP~ACTIVE~0~1~~' \
+            'true~5.0~%i~~N%s</marketPrices><minorErrorCode xsi:nil="1"/>' % \
+            (self.marketId, self.startTime * 1000, runners)
+
+    def _render_getCompleteMarketPricesCompressed(self):
+        runners = []
+        for runner in self.runners:
+            depth = len(runner.backAmounts)
+            ladder = [ '%s~%.2f~0.0~0.0~0.0~' % (price, amount)
+                       for price, amount in runner.backPrices(depth) ]
+            ladder.reverse()
+            ladder.extend([ '%s~0.0~%.2f~0.0~0.0~' % (price, amount)
+                            for price, amount in runner.layPrices(depth) ])
+            runners.append(':%i~%i~%.2f~%s~~0.0~false~0~~~|%s' % \
+                (runner.selectionId, runner.sortOrder, runner.totalMatched,
+                 runner.bestBackPrice(), ''.join(ladder)))
+
+        return '<completeMarketPrices>%i~0~%s</completeMarketPrices>' \
+            '<errorCode>OK</errorCode><minorErrorCode xsi:nil="1"/>' % \
+            (self.marketId, ''.join(runners))
+
+    def _render_getMarketTradedVolumeCompressed(self):
+        # the runner's matched amount spread evenly over the prices around
+        # its best prices
+        runners = []
+        for runner in self.runners:
+            prices = [ price for price, amount in runner.backPrices(5) ]
+            prices.reverse()
+            prices.extend([ price for price, amount in runner.layPrices(5) ])
+            runners.append(':%i~0~0.0~0.0~0.0%s' % (runner.selectionId,
+                ''.join([ '|%s~%.2f' % (price,
+                                        runner.totalMatched / len(prices))
+                          for price in prices ])))
+
+        return '<errorCode>OK</errorCode><tradedVolume>%s</tradedVolume>' \
+            '<currencyCode>GBP</currencyCode><marketId>%i</marketId>' \
+            '<minorErrorCode xsi:nil="1"/>' % (''.join(runners),
+                                               self.marketId)
+
+class MockExchange:
+
+    """The markets, bets and sessions behind a MockBetfairServer.
+
+    Attributes:
+        markets -- list of MockMarket
+
+    """
+    def __init__(self, markets=100, runners=10, seed=0, interval=300,
+                 depth=10):
+        """Initialise a new instance.
+
+        markets  -- the number of markets to generate (default 100)
+        runners  -- the number of runners in each market (default 10)
+        seed     -- seeds the generated prices (default 0)
+        interval -- seconds between the markets' start times (default 300)
+        depth    -- the number of prices on each side of every runner's
+                    ladder (default 10)
+
+        """
+        random = Random(seed)
+
+        # markets start on the hour after the exchange is created, interval
+        # seconds apart
+        startTime = (int(time()) / 3600 + 1) * 3600
+        self.markets = [ MockMarket(FIRST_MARKET_ID + i, FIRST_EVENT_ID + i,
+                                    'Home %i v Away %i' % (i + 1, i + 1),
+                                    startTime + i * interval, runners, random,
+                                    depth)
+                         for i in range(markets) ]
+        self._markets = dict([ (market.marketId, market)
+                               for market in self.markets ])
+
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._bets = {}
+        self._nextBetId = 1
+
+    def handle(self, action, request):
+        """Return the HTTP status and SOAP envelope responding to request."""
+        if action not in _RESPONSES:
+            return 500, _FAULT_ENVELOPE % ('Unsupported action: %s' % \
+                                           (escape(action),),)
+
+        namespace, element = _RESPONSES[action]
+
+        # everything other than login needs a session
+        if action == 'login':
+            errorCode, body, sessionToken = self._login(request)
+        else:
+            sessionToken = _field('sessionToken', request)
+            self._lock.acquire()
+            try:
+                valid = sessionToken in self._sessions
+            finally:
+                self._lock.release()
+
+            if not valid:
+                return 200, self._envelope(namespace, element, 'NO_SESSION',
+                    None, _ERROR_BODIES[action].replace('%s', 'API_ERROR'))
+
+            errorCode, body = getattr(self, '_' + action)(request)
+
+        if errorCode != 'OK':
+            body = _ERROR_BODIES[action].replace('%s', errorCode)
+
+        return 200, self._envelope(namespace, element, 'OK', sessionToken,
+                                   body)
+
+    def _envelope(self, namespace, element, errorCode, sessionToken, body):
+        token = sessionToken and '<sessionToken>%s</sessionToken>' % \
+            (sessionToken,) or '<sessionToken xsi:nil="1"/>'
+        return _RESPONSE_ENVELOPE % (element, namespace, errorCode, token,
+                                     _iso_time(time()), body, element)
+
+    def _findMarket(self, marketId):
+        try:
+            return self._markets.get(int(marketId))
+        except (TypeError, ValueError):
+            return None
+
+    def _login(self, request):
+        username = _field('username', request)
+        if not username: return 'INVALID_USERNAME_OR_PASSWORD', None, None
+
+        self._lock.acquire()
+        try:
+            sessionToken = 'MOCK%08i' % (len(self._sessions) + 1,)
+            self._sessions[sessionToken] = username
+        finally:
+            self._lock.release()
+
+        body = '<currency>GBP</currency><errorCode>OK</errorCode>' \
+            '<minorErrorCode xsi:nil="1"/><validUntil>%s</validUntil>' % \
+            (_iso_time(time() + 86400 * 365),)
+        return 'OK', body, sessionToken
+
+    def _keepAlive(self, request):
+        return 'OK', '<apiVersion>mock</apiVersion>' \
+                     '<minorErrorCode xsi:nil="1"/>'
+
+    def _getEvents(self, request):
+        try:
+            parentId = int(_field('eventParentId', request))
+        except (TypeError, ValueError):
+            return 'INVALID_EVENT_ID', None
+
+        events = ''
+        markets = ''
+        if parentId == SOCCER_EVENT_TYPE_ID:
+            events = ''.join([ '<BFEvent><eventId>%i</eventId><eventName>%s'
+                '</eventName><eventTypeId>%i</eventTypeId><menuLevel>1'
+                '</menuLevel><orderIndex>%i</orderIndex><startTime>%s'
+                '</startTime><timezone>GMT</timezone></BFEvent>' % \
+                (market.eventId, escape(market.name), SOCCER_EVENT_TYPE_ID,
+                 i, _iso_time(market.startTime))
+                for i, market in enumerate(self.markets) ])
+        else:
+            markets = ''.join([ '<MarketSummary><eventTypeId>%i'
+                '</eventTypeId><exchangeId>1</exchangeId><marketId>%i'
+                '</marketId><marketName>Match Odds</marketName><marketType>O'
+                '</marketType><menuLevel>2</menuLevel><orderIndex>0'
+                '</orderIndex><startTime>%s</startTime><timezone>GMT'
+                '</timezone></MarketSummary>' % \
+                (SOCCER_EVENT_TYPE_ID, market.marketId,
+                 _iso_time(market.startTime))
+                for market in self.markets if market.eventId == parentId ])
+            if not markets: return 'INVALID_EVENT_ID', None
+
+        return 'OK', '<errorCode>OK</errorCode><eventItems>%s</eventItems>' \
+            '<eventParentId>%i</eventParentId><marketItems>%s</marketItems>' \
+            '<minorErrorCode xsi:nil="1"/>' % (events, parentId, markets)
+
+    def _render(self, action, request):
+        market = self._findMarket(_field('marketId', request))
+        if market is None: return 'INVALID_MARKET', None
+        return 'OK', market.render(action)
+
+    def _getMarket(self, request):
+        return self._render('getMarket', request)
+
+    def _getAllMarkets(self, request):
+        eventTypeIds = _fields('int', request)
+        if eventTypeIds and str(SOCCER_EVENT_TYPE_ID) not in eventTypeIds:
+            markets = []
+        else:
+            markets = self.markets
+        return 'OK', self._marketData(markets)
+
+    def _getInPlayMarkets(self, request):
+        # markets that have started are in-play, and those starting within
+        # a day are due to be
+        now = time()
+        return 'OK', self._marketData([ market for market in self.markets
+                                        if market.startTime < now + 86400 ])
+
+    def _marketData(self, markets):
+        now = time()
+        marketData = ''.join([ ':%i~Match Odds~O~ACTIVE~%i~\\Soccer\\Mock '
+            'League\\%s~/%i/%i/%i~%i~1~GBR~%i~%i~1~0.0~N~Y' % \
+            (market.marketId, market.startTime * 1000, market.name,
+             SOCCER_EVENT_TYPE_ID, market.eventId, market.marketId,
+             market.startTime <= now and 5 or 0, int(now * 1000),
+             len(market.runners))
+            for market in markets ])
+        return '<errorCode>OK</errorCode><marketData>%s</marketData>' \
+            '<minorErrorCode xsi:nil="1"/>' % (escape(marketData),)
+
+    def _getMarketPrices(self, request):
+        return self._render('getMarketPrices', request)
+
+    def _getMarketPricesCompressed(self, request):
+        return self._render('getMarketPricesCompressed', request)
+
+    def _getCompleteMarketPricesCompressed(self, request):
+        return self._render('getCompleteMarketPricesCompressed', request)
+
+    def _getMarketTradedVolumeCompressed(self, request):
+        return self._render('getMarketTradedVolumeCompressed', request)
+
+    def _getDetailAvailableMktDepth(self, request):
+        market = self._findMarket(_field('marketId', request))
+        if market is None: return 'INVALID_MARKET', None
+        try:
+            runner = market.getRunner(int(_field('selectionId', request)))
+        except (TypeError, ValueError):
+            runner = None
+        if runner is None: return 'INVALID_RUNNER', None
+
+        # the whole ladder, lowest price first
+        depth = len(runner.backAmounts)
+        items = [ (price, amount, 0.0)
+                  for price, amount in runner.backPrices(depth) ]
+        items.reverse()
+        items.extend([ (price, 0.0, amount)
+                       for price, amount in runner.layPrices(depth) ])
+        return 'OK', '<errorCode>OK</errorCode><minorErrorCode xsi:nil="1"/>' \
+            '<priceItems>%s</priceItems>' % (''.join([ '<AvailabilityInfo>'
+            '<odds>%s</odds>'
+            '<totalAvailableBackAmount>%.2f</totalAvailableBackAmount>'
+            '<totalAvailableLayAmount>%.2f</totalAvailableLayAmount>'
+            '<totalBspBackAmount>0.0</totalBspBackAmount><totalBspLayAmount>'
+            '0.0</totalBspLayAmount></AvailabilityInfo>' % item
+            for item in items ]),)
+
+    def _placeBets(self, request):
+        bets = _fields('PlaceBets', request)
+        if not 1 <= len(bets) <= 60:
+            return 'BETWEEN_1_AND_60_BETS_REQUIRED', None
+
+        results = []
+        self._lock.acquire()
+        try:
+            for bet in bets:
+                market = self._findMarket(_field('marketId', bet))
+                if market is None: return 'INVALID_MARKET', None
+
+                betId = self._nextBetId
+                self._nextBetId += 1
+
+                runner = market.getRunner(int(_field('selectionId', bet)))
+                betType = _field('betType', bet)
+                price = float(_field('price', bet))
+                size = float(_field('size', bet))
+
+                # bets at the best price or better are matched in full
+                matchedPrice = 0.0
+                if runner and betType == 'B' and price <= runner.bestBackPrice():
+                    matchedPrice = runner.bestBackPrice()
+                elif runner and betType == 'L' and price >= runner.bestLayPrice():
+                    matchedPrice = runner.bestLayPrice()
+
+                if runner:
+                    self._bets[betId] = (market.marketId, runner.selectionId,
+                        betType, matchedPrice or price, size,
+                        matchedPrice and 'M' or 'U', time())
+
+                results.append('<PlaceBetsResult><averagePriceMatched>%s'
+                    '</averagePriceMatched><betId>%i</betId><resultCode>%s'
+                    '</resultCode><sizeMatched>%.2f</sizeMatched><success>%s'
+                    '</success></PlaceBetsResult>' % (matchedPrice,
+                    runner and betId or 0, runner and 'OK' or 'INVALID_RUNNER',
+                    matchedPrice and size or 0.0, runner and 'true' or 'false'))
+        finally:
+            self._lock.release()
+
+        return 'OK', '<betResults>%s</betResults><errorCode>OK</errorCode>' \
+            '<minorErrorCode xsi:nil="1"/>' % (''.join(results),)
+
+    def _cancelbets(self, request):
+        betIds = _fields('betId', request)
+        if not 1 <= len(betIds) <= 40:
+            return 'INVALID_NUMER_OF_CANCELLATIONS', None
+
+        results = []
+        self._lock.acquire()
+        try:
+            for betId in map(int, betIds):
+                bet = self._bets.get(betId)
+                if bet and bet[5] == 'U':
+                    del self._bets[betId]
+                    resultCode, sizeCancelled = 'REMAINING_CANCELLED', bet[4]
+                else:
+                    resultCode, sizeCancelled = 'TAKEN_OR_LAPSED', 0.0
+
+                results.append('<CancelBetsResult><betId>%i</betId>'
+                    '<resultCode>%s</resultCode><sizeCancelled>%.2f'
+                    '</sizeCancelled><sizeMatched>%.2f</sizeMatched><success>'
+                    '%s</success></CancelBetsResult>' % (betId, resultCode,
+                    sizeCancelled, bet and bet[5] == 'M' and bet[4] or 0.0,
+                    sizeCancelled and 'true' or 'false'))
+        finally:
+            self._lock.release()
+
+        return 'OK', '<betResults>%s</betResults><errorCode>OK</errorCode>' \
+            '<minorErrorCode xsi:nil="1"/>' % (''.join(results),)
+
+    def _findBets(self, request, betStatus):
+        """Return the page of bets that request asks for, as (betId,
+        marketId, selectionId, betType, price, size, status, placed) tuples,
+        and the number of bets on all the pages."""
+        betStatus = _field('betStatus', request, betStatus)
+        marketId = int(_field('marketId', request, '0'))
+        recordCount = int(_field('recordCount', request, '200'))
+        startRecord = int(_field('startRecord', request, '0'))
+
+        self._lock.acquire()
+        try:
+            bets = [ (betId,) + bet for betId, bet in self._bets.items()
+                     if bet[5] in betStatus and marketId in (0, bet[0]) ]
+        finally:
+            self._lock.release()
+
+        bets.sort()
+        return bets[startRecord:startRecord + recordCount], len(bets)
+
+    def _getCurrentBets(self, request):
+        page, count = self._findBets(request, 'U')
+        if not page: return 'NO_RESULTS', None
+
+        never = '0001-01-01T00:00:00'
+        xml = []
+        for betId, marketId, selectionId, betType, price, size, status, \
+                                                            placed in page:
+            market = self._findMarket(marketId)
+            matched = status == 'M' and size or 0.0
+            xml.append('<Bet><asianLineId>0</asianLineId><avgPrice>%s'
+                '</avgPrice><betId>%i</betId><betStatus>%s</betStatus>'
+                '<betType>%s</betType><cancelledDate>%s</cancelledDate>'
+                '<lapsedDate>%s</lapsedDate><marketId>%i</marketId>'
+                '<marketName>Match Odds</marketName><marketType>O'
+                '</marketType><matchedDate>%s</matchedDate><matchedSize>%.2f'
+                '</matchedSize><matches xsi:nil="1"/><placedDate>%s'
+                '</placedDate><price>%s</price><profitAndLoss>0.0'
+                '</profitAndLoss><selectionId>%i</selectionId><selectionName>'
+                '%s</selectionName><settledDate>%s</settledDate>'
+                '<remainingSize>%.2f</remainingSize><requestedSize>%.2f'
+                '</requestedSize><voidedDate>%s</voidedDate></Bet>' % \
+                (matched and price or 0.0, betId, status, betType, never,
+                 never, marketId, matched and _iso_time(placed) or never,
+                 matched, _iso_time(placed), price, selectionId,
+                 escape(market.getRunner(selectionId).name), never,
+                 size - matched, size, never))
+
+        return 'OK', '<bets>%s</bets><errorCode>OK</errorCode>' \
+            '<minorErrorCode xsi:nil="1"/><totalRecordCount>%i' \
+            '</totalRecordCount>' % (''.join(xml), count)
+
+    def _getMUBets(self, request):
+        page, count = self._findBets(request, 'MU')
+        if not page: return 'NO_RESULTS', None
+
+        return 'OK', '<bets>%s</bets><errorCode>OK</errorCode>' \
+            '<minorErrorCode xsi:nil="1"/><totalRecordCount>%i' \
+            '</totalRecordCount>' % (''.join([ '<MUBet><asianLineId>0'
+                '</asianLineId><betId>%i</betId><betStatus>%s</betStatus>'
+                '<betType>%s</betType><marketId>%i</marketId><matchedDate>%s'
+                '</matchedDate><size>%.2f</size><placedDate>%s</placedDate>'
+                '<price>%s</price><selectionId>%i</selectionId><handicap>0.0'
+                '</handicap></MUBet>' % (betId, status, betType, marketId,
+                _iso_time(placed), size, _iso_time(placed), price,
+                selectionId) for betId, marketId, selectionId, betType, price,
+                size, status, placed in page ]), count)
+
+    def _getCurrentBetsLite(self, request):
+        page, count = self._findBets(request, 'U')
+        if not page: return 'NO_RESULTS', None
+
+        return 'OK', '<betLites>%s</betLites><errorCode>OK</errorCode>' \
+            '<minorErrorCode xsi:nil="1"/><totalRecordCount>%i' \
+            '</totalRecordCount>' % (''.join([ self._betLite(bet)
+                                               for bet in page ]), count)
+
+    def _getMUBetsLite(self, request):
+        page, count = self._findBets(request, 'MU')
+        if not page: return 'NO_RESULTS', None
+
+        return 'OK', '<betLites>%s</betLites><errorCode>OK</errorCode>' \
+            '<minorErrorCode xsi:nil="1"/><totalRecordCount>%i' \
+            '</totalRecordCount>' % (''.join([ '<MUBetLite><betId>%i</betId>'
+                '<transactionId>%i</transactionId><marketId>%i</marketId>'
+                '<size>%.2f</size><betStatus>%s</betStatus><betCategoryType>E'
+                '</betCategoryType><betPersistenceType>NONE'
+                '</betPersistenceType><bspLiability xsi:nil="1"/>'
+                '</MUBetLite>' % (betId, betId, marketId, size, status)
+                for betId, marketId, selectionId, betType, price, size,
+                status, placed in page ]), count)
+
+    def _findBet(self, request):
+        try:
+            betId = int(_field('betId', request))
+        except (TypeError, ValueError):
+            return None
+
+        self._lock.acquire()
+        try:
+            bet = self._bets.get(betId)
+        finally:
+            self._lock.release()
+
+        return bet and (betId,) + bet or None
+
+    def _getBetLite(self, request):
+        bet = self._findBet(request)
+        if bet is None: return 'BET_ID_INVALID', None
+
+        return 'OK', '%s<errorCode>OK</errorCode>' % \
+            (self._betLite(bet, 'betLite'),)
+
+    def _getBetMatchesLite(self, request):
+        bet = self._findBet(request)
+        if bet is None: return 'BET_ID_INVALID', None
+
+        # a matched bet is matched in one go, when it's placed
+        betId, marketId, selectionId, betType, price, size, status, \
+            placed = bet
+        if status != 'M': return 'NO_RESULTS', None
+
+        return 'OK', '<matchLites><MatchLite><betStatus>M</betStatus>' \
+            '<matchedDate>%s</matchedDate><priceMatched>%s</priceMatched>' \
+            '<sizeMatched>%.2f</sizeMatched><transactionId>%i' \
+            '</transactionId></MatchLite></matchLites><errorCode>OK' \
+            '</errorCode>' % (_iso_time(placed), price, size, betId)
+
+    def _betLite(self, bet, element='BetLite'):
+        betId, marketId, selectionId, betType, price, size, status, \
+            placed = bet
+        matched = status == 'M' and size or 0.0
+        return '<%s><betId>%i</betId><marketId>%i</marketId><matchedSize>' \
+            '%.2f</matchedSize><remainingSize>%.2f</remainingSize>' \
+            '<betStatus>%s</betStatus><betCategoryType>E</betCategoryType>' \
+            '<betPersistenceType>NONE</betPersistenceType><bspLiability ' \
+            'xsi:nil="1"/></%s>' % (element, betId, marketId, matched,
+                                     size - matched, status, element)
+
+def make_corpus(seed=0):
+    """Return a set of generated responses for benchmarking the response 
+    classes, as a list of (name, action, envelope) tuples.
+
+    The corpus covers the market and price calls for markets of 5 to 40
+    runners, the traded volume of markets of 20 and 40 runners, the depth
+    of a ladder of two hundred prices, getEvents with a thousand events, getAllMarkets and 
+    getInPlayMarkets with ten thousand markets, pages of unmatched bets and
+    bet placement results.
+
+    """
+    def call(exchange, action, request):
+        status, envelope = exchange.handle(action, request)
+        return envelope
+
+    def login(exchange):
+        return _field('sessionToken', call(exchange, 'login',
+                                           '<username>bench</username>'))
+
+    corpus = []
+    for runners in (5, 10, 20, 40):
+        exchange = MockExchange(1, runners, seed)
+        request = '<sessionToken>%s</sessionToken><marketId>%i</marketId>' % \
+            (login(exchange), FIRST_MARKET_ID)
+        actions = ('getMarket', 'getMarketPrices',
+                   'getMarketPricesCompressed',
+                   'getCompleteMarketPricesCompressed')
+        if runners >= 20: actions += ('getMarketTradedVolumeCompressed',)
+        for action in actions:
+            corpus.append(('%s-%i' % (action, runners), action,
+                           call(exchange, action, request)))
+
+    # a hundred prices either side of the best
+    deep = MockExchange(1, 2, seed, depth=100)
+    corpus.append(('getDetailAvailableMktDepth-200', 
+                   'getDetailAvailableMktDepth', call(deep,
+        'getDetailAvailableMktDepth', '<sessionToken>%s</sessionToken>'
+        '<marketId>%i</marketId><selectionId>%i</selectionId>' % \
+        (login(deep), FIRST_MARKET_ID, deep.markets[0].runners[0].selectionId))))
+
+    exchange = MockExchange(1000, 2, seed)
+    token = login(exchange)
+    corpus.append(('getEvents-1000', 'getEvents', call(exchange, 'getEvents',
+        '<sessionToken>%s</sessionToken><eventParentId>%i</eventParentId>' % \
+        (token, SOCCER_EVENT_TYPE_ID))))
+
+    # markets a few seconds apart, so that they are all due in-play today
+    markets = MockExchange(10000, 2, seed, interval=5)
+    request = '<sessionToken>%s</sessionToken>' % (login(markets),)
+    for action in ('getAllMarkets', 'getInPlayMarkets'):
+        corpus.append(('%s-10000' % (action,), action,
+                       call(markets, action, request)))
+
+    # rest 500 bets, 60 at a time, with a full placement result on the way
+    bet = '<PlaceBets><asianLineId>0</asianLineId><betType>B</betType>' \
+        '<marketId>%i</marketId><price>1000.0</price><selectionId>%i' \
+        '</selectionId><size>2.0</size></PlaceBets>' % \
+        (FIRST_MARKET_ID, exchange.markets[0].runners[0].selectionId)
+    placeBets = None
+    for count in (60,) * 8 + (20,):
+        placed = call(exchange, 'placeBets',
+            '<sessionToken>%s</sessionToken><bets>%s</bets>' % \
+            (token, bet * count))
+        placeBets = placeBets or placed
+    corpus.append(('placeBets-60', 'placeBets', placeBets))
+
+    for action, count in (('getCurrentBets', 500), ('getMUBets', 200),
+                          ('getCurrentBetsLite', 500), ('getMUBetsLite', 200)):
+        corpus.append(('%s-%i' % (action, count), action, call(exchange,
+            action, '<sessionToken>%s</sessionToken><betStatus>U</betStatus>'
+            '<recordCount>%i</recordCount>' % (token, count))))
+
+    return corpus
+
+class _MockRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    # keep connections open, as the real API does
+    protocol_version = 'HTTP/1.1'
+
+    # the status line, headers and body go out in separate writes, which
+    # Nagle's algorithm would hold back on a kept-alive connection
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        request = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        action = self.headers.get('SOAPAction', '').strip('"').split(':')[-1]
+
+        server = self.server
+        if server.latency: sleep(server.latency)
+        status, response = server.exchange.handle(action, request)
+
+        compressed = server.compressed and \
+                        'gzip' in self.headers.get('Accept-Encoding', '')
+        if compressed:
+            buffer = StringIO()
+            gzipper = GzipFile(fileobj=buffer, mode='wb', compresslevel=6)
+            gzipper.write(response)
+            gzipper.close()
+            response = buffer.getvalue()
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        if compressed: self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format,
+                                                              *args)
+
+class MockBetfairServer(SocketServer.ThreadingMixIn,
+                        BaseHTTPServer.HTTPServer):
+
+    """An HTTP server answering Betfair API calls from a MockExchange.
+
+    Each connection is handled by its own thread. Both the global and
+    exchange services are served at any URL, so the server can stand in
+    for every host a client uses.
+
+    Attributes:
+        exchange   -- the MockExchange answering calls
+        hostname   -- the host:port to give a client proxy
+        latency    -- seconds added to every response
+        compressed -- True if responses are gzipped for clients that accept
+                      it
+
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, address=('127.0.0.1', 0), markets=100, runners=10,
+                 latency=0.0, compressed=True, seed=0, verbose=False):
+        """Initialise a new server, listening but not yet serving.
+
+        address    -- the (host, port) to listen on (default an unused port
+                      on localhost)
+        markets    -- the number of markets to generate (default 100)
+        runners    -- the number of runners in each market (default 10)
+        latency    -- seconds added to every response (default 0)
+        compressed -- gzip responses for clients that accept it (default
+                      True)
+        seed       -- seeds the generated prices (default 0)
+        verbose    -- log every request (default False)
+
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, address, _MockRequestHandler)
+        self.exchange = MockExchange(markets, runners, seed)
+        self.latency = latency
+        self.compressed = compressed
+        self.verbose = verbose
+        self.hostname = '%s:%i' % self.server_address[:2]
+        self._thread = None
+
+    def start(self):
+        """Serve requests in a background thread, and return the server."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.setDaemon(True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving requests and close the listening socket."""
+        if self._thread:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+if __name__ == "__main__":
+    usage = "Usage: mockbetfair [OPTIONS]"
+    shorthelp = "Try `mockbetfair --help' for more information."
+    longhelp = """Serve a mock Betfair API for benchmarking.
+Example: mockbetfair --port=8080 --markets=500 --latency=0.05
+
+    -h, --help                                  display help
+    -v, --verbose                               log every request
+
+        --host=HOST                             the address to listen on
+                                                (default 127.0.0.1)
+        --port=PORT                             the port to listen on (default
+                                                8080)
+        --markets=COUNT                         the number of markets (default 100)
+        --runners=COUNT                         the number of runners in each
+                                                market (default 10)
+        --latency=SECONDS                       seconds added to every response
+                                                (default 0)
+        --no-gzip                               never compress responses
+        --seed=SEED                             seeds the generated prices
+                                                (default 0)
+
+        --testInternal                          run internal unit tests"""
+
+    import sys, getopt
+
+    host = '127.0.0.1'
+    port = 8080
+    markets = 100
+    runners = 10
+    latency = 0.0
+    compressed = True
+    seed = 0
+    verbose = False
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hv", ["help", "verbose",
+            "host=", "port=", "markets=", "runners=", "latency=", "no-gzip",
+            "seed=", "testInternal"])
+    except getopt.GetoptError, e:
+        print e
+        print usage
+        print shorthelp
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            print usage
+            print longhelp
+            sys.exit(0)
+        elif opt in ("-v", "--verbose"):
+            verbose = True
+        elif opt == "--host":
+            host = arg
+        elif opt == "--port":
+            port = int(arg)
+        elif opt == "--markets":
+            markets = int(arg)
+        elif opt == "--runners":
+            runners = int(arg)
+        elif opt == "--latency":
+            latency = float(arg)
+        elif opt == "--no-gzip":
+            compressed = False
+        elif opt == "--seed":
+            seed = int(arg)
+        elif opt == "--testInternal":
+            import doctest
+            doctest.testmod()
+            sys.exit(0)
+
+    server = MockBetfairServer((host, port), markets, runners, latency,
+                               compressed, seed, verbose)
+    print "Serving %i markets of %i runners at http://%s/" % \
+        (markets, runners, server.hostname)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+# vim: set ts=4 sw=4 softtabstop=4 smarttab expandtab:
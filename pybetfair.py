@@ -28,16 +28,38 @@ Street, Fifth Floor, Boston, MA 02110-1301, USA.
 try:
     import httplib2
 except ImportError:
-    from httplib import HTTPConnection, HTTPSConnection
     httplib2 = None
     
+# only needed for secure asynchronous connections (Python 2.6 or later)
+try:
+    import ssl
+except ImportError:
+    ssl = None
+    
+import asyncore
+import errno
+import heapq
+import sys
+from collections import deque
+from httplib import HTTPConnection, HTTPSConnection, HTTPException
+from select import select
+import socket
+import threading
+import atexit
+import gc
+import os
 from xml.dom.minidom import parseString
-from time import strptime, mktime
+from xml.parsers import expat
+from xml.sax.saxutils import escape
+from time import strptime, mktime, time, sleep
 from datetime import datetime, timedelta
-from math import floor
+from math import floor, ceil
+from array import array
+from bisect import bisect_left, bisect_right
 from decimal import Decimal, negInf, Inf, NaN
 #import decimal 
 from gzip import GzipFile
+from Queue import Queue
 from StringIO import StringIO
 from urlparse import urljoin
 
@@ -48,9 +70,91 @@ _GLOBAL_SOAP_NAMESPACE = 'http://www.betfair.com/publicapi/v3/BFGlobalService/'
 LIVE_UK_EXCHANGE_HOST = "api.betfair.com"
 LIVE_AUS_EXCHANGE_HOST = "api-au.betfair.com"
 
+# set True to keep the xml node on the compact (slotted) domain objects: 
+# Price, RunnerPrices, Runner, Bet, MUBet, Match, BetLite, MUBetLite, 
+# MatchLite, VolumeInfo and ProfitAndLoss. By default they drop it, so they
+# don't pin the parsed document in memory
+KEEP_DOMAIN_XML = False
+
+# set False to have responses drop their xml once they are built, so the 
+# parsed document can be freed straight away. Proxies can override this with
+# their keepXml argument
+KEEP_RESPONSE_XML = True
+
+# decoded times, keyed by the string they were decoded from. Cleared when it
+# reaches _ISO_TIME_CACHE_SIZE entries
+_ISO_TIME_CACHE = {}
+_ISO_TIME_CACHE_SIZE = 4096
+
 def _convert_iso_time(timeStr):
-    tm = strptime(timeStr[:19], "%Y-%m-%dT%H:%M:%S")
-    return datetime.fromtimestamp(mktime(tm))
+    """Convert a time from the API to a datetime, in UTC without a tzinfo.
+    
+    The fields are read from their fixed positions in the 
+    YYYY-MM-DDTHH:MM:SS layout, and any fraction of a second is dropped. A 
+    time given with an offset rather than Z is converted to UTC. Decoded 
+    times are cached, as many values (the null date in particular) come up
+    over and over again.
+    
+    >>> _convert_iso_time('2009-03-29T01:30:00.000Z')
+    datetime.datetime(2009, 3, 29, 1, 30)
+    >>> _convert_iso_time('2009-03-29T02:30:00+01:00')
+    datetime.datetime(2009, 3, 29, 1, 30)
+    >>> _convert_iso_time('0001-01-01T00:00:00.000Z')
+    datetime.datetime(1, 1, 1, 0, 0)
+    
+    """
+    try:
+        return _ISO_TIME_CACHE[timeStr]
+    except KeyError:
+        pass
+        
+    value = datetime(int(timeStr[0:4]), int(timeStr[5:7]), int(timeStr[8:10]),
+                     int(timeStr[11:13]), int(timeStr[14:16]), 
+                     int(timeStr[17:19]))
+                     
+    # the offset (if any) follows the seconds and their fraction
+    zone = timeStr[19:].lstrip('.0123456789')
+    if zone and zone != 'Z':
+        digits = zone[1:].replace(':', '')
+        offset = timedelta(hours=int(digits[:2]), minutes=int(digits[2:4] or 0))
+        if zone[0] == '-': value += offset
+        else: value -= offset
+        
+    if len(_ISO_TIME_CACHE) >= _ISO_TIME_CACHE_SIZE: _ISO_TIME_CACHE.clear()
+    _ISO_TIME_CACHE[timeStr] = value
+    return value
+    
+def _node_xml(obj):
+    """Return the xml an object was built from, or a summary of the object if
+    its node wasn't kept."""
+    if obj.node is not None: return obj.node.toprettyxml()
+    
+    # without a __str__ of its own, str() would come back here
+    if getattr(obj.__class__, '__str__', object.__str__) == object.__str__:
+        return '<%s>' % (obj.__class__.__name__,)
+    return '<%s %s>' % (obj.__class__.__name__, str(obj))
+    
+def _discard_xml(obj):
+    """Drop the xml kept by a response and the objects built from it.
+    
+    Walks the attributes of every object holding a node, and the lists they 
+    hold. Objects that have already dropped their node (e.g. the compact 
+    domain objects) are assumed to hold nothing else that needs dropping.
+    
+    """
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif getattr(obj, 'node', None) is not None:
+            obj.node = None
+            if hasattr(obj, '__dict__'):
+                if 'doc' in obj.__dict__: obj.doc = None
+                stack.extend(obj.__dict__.values())
+            else:
+                stack.extend([ getattr(obj, name, None) 
+                               for name in obj.__slots__ ])
     
 def _is_horse_race(eventTypeId):
     """Return True if the specified event type ID represents a horse race.
@@ -122,136 +226,2616 @@ def _round_asian_handicap(handicap):
     absolute (i.e. non-negative) handicap values. Based on code taken from
     Helpers.js in exchange-web source.
     
-    >>> _round_asian_handicap(0)
-    '0'
-    >>> _round_asian_handicap(1)
-    '1.0'
-    >>> _round_asian_handicap(1.5)
-    '1.5'
+    >>> _round_asian_handicap(0)
+    '0'
+    >>> _round_asian_handicap(1)
+    '1.0'
+    >>> _round_asian_handicap(1.5)
+    '1.5'
+    
+    """
+    if handicap == 0: return '0'
+    elif handicap == floor(handicap): return "%.1f" % (handicap,)
+    else: return str(handicap)
+    
+def _format_double_line_profit(from_, to, unit):
+    """Helper function for formatting Asian Handicap profit and loss data.
+    
+    >>> _format_double_line_profit(Decimal("-INF"), Decimal("-4"), "goal")
+    'lose by more than 3 goals'
+    >>> _format_double_line_profit(Decimal("-INF"), Decimal("-1"), "goal")
+    'lose'
+    >>> _format_double_line_profit(Decimal("-INF"), Decimal("0.0"), "goal")
+    'lose or draw'
+    >>> _format_double_line_profit(Decimal("-INF"), Decimal("2"), "goal")
+    'do not win by 3 goals or more'
+    >>> _format_double_line_profit(Decimal("0"), Decimal("INF"), "goal")
+    'win or draw'
+    >>> _format_double_line_profit(Decimal("1"), Decimal("INF"), "goal")
+    'win'
+    >>> _format_double_line_profit(Decimal("3"), Decimal("INF"), "goal")
+    'win by at least 3 goals'
+    >>> _format_double_line_profit(Decimal("0"), Decimal("0"), "goal")
+    'draw'
+    >>> _format_double_line_profit(Decimal("2"), Decimal("2"), "goal")
+    'win by 2 goals'
+    >>> _format_double_line_profit(Decimal("-1"), Decimal("-1"), "goal")
+    'lose by 1 goal'
+    
+    """
+    result = ""
+    if from_ == negInf:
+        handicap = abs(to + 1).to_integral()
+        myUnit = handicap == 1 and unit or unit + "s"
+        if to < 0:
+            if handicap > 0:
+                result = "lose by more than %i %s" % (handicap, myUnit)
+            else:
+                result = "lose"
+        elif to == 0: result = "lose or draw"
+        else: result = "do not win by %i %s or more" % (handicap, myUnit)
+    elif to == Inf:
+        if from_ == 0: result = "win or draw"
+        elif from_ == 1: result = "win"
+        else:
+            handicap = abs(from_).to_integral()
+            myUnit = handicap == 1 and unit or unit + "s"
+            result = "win by at least %i %s" % (handicap, myUnit)
+    elif from_ == to:
+        handicap = abs(to).to_integral()
+        myUnit = handicap == 1 and unit or unit + "s"
+        if from_ == 0: result = "draw"
+        elif from_ > 0: result = "win by %i %s" % (handicap, myUnit)
+        elif from_ < 0: result = "lose by %i %s" % (handicap, myUnit)
+    
+    return result
+    
+    
+# escaped separators in compressed payloads, and the tokens that stand in for
+# them while the payload is split up (see BetfairStringExtensions.Sanitize)
+_COMPRESSED_ESCAPES = (
+    ('\\,', '<COMMA>'),
+    ('\\;', '<SEMICOLON>'),
+    ('\\:', '<COLON>'),
+    ('\\|', '<PIPE>'),
+    ('\\~', '<TILDE>'),
+)
+
+def _sanitize_compressed(data):
+    """Replace escaped separators in a compressed payload with tokens.
+    
+    >>> _sanitize_compressed('NR\\: 2. Hellaga(7.2%,12\\:41)')
+    'NR<COLON> 2. Hellaga(7.2%,12<COLON>41)'
+    
+    """
+    for escaped, token in _COMPRESSED_ESCAPES:
+        data = data.replace(escaped, token)
+    return data
+    
+def _desanitize_compressed(data):
+    """Restore the separators replaced by _sanitize_compressed, unescaped.
+    
+    >>> _desanitize_compressed('NR<COLON> 2. Hellaga(7.2%,12<COLON>41)')
+    'NR: 2. Hellaga(7.2%,12:41)'
+    
+    """
+    for escaped, token in _COMPRESSED_ESCAPES:
+        data = data.replace(token, escaped[1])
+    return data
+    
+def _float_or_none(value):
+    """Convert an optional field of a compressed payload to a float.
+    
+    >>> _float_or_none('4.1')
+    4.1
+    >>> _float_or_none('') is None
+    True
+    
+    """
+    return value and float(value) or None
+    
+def _index_runners(runners):
+    """Index a list of runners, or of runner prices, by (selectionId, 
+    asianLineId). The first of any duplicates is kept, as a scan of the list
+    would find."""
+    index = {}
+    for runner in runners:
+        index.setdefault((runner.selectionId, runner.asianLineId), runner)
+    return index
+    
+def _parse_removed_runners(data):
+    """Parse the removed runners field of a compressed payload.
+    
+    >>> [ str(r) for r in _parse_removed_runners('2. Hellaga,16.41,7.2;') ]
+    ['(2. Hellaga, 16:41, 7.2%)']
+    >>> _parse_removed_runners('')
+    []
+    
+    """
+    removedRunners = []
+    for removedRunner in data.split(';'):
+        if not removedRunner: continue
+        fields = removedRunner.split(',')
+        removedRunners.append(RemovedRunner(_desanitize_compressed(fields[0]),
+                                            fields[1].replace('.', ':'),
+                                            float(fields[2])))
+    return removedRunners
+    
+def _parse_compressed_prices(data):
+    """Parse one block of best prices from a compressed payload.
+    
+    Each price is a price~amount~betType~depth group. As with the XML 
+    response, the list is padded out to a depth of 3 with empty prices.
+    
+    >>> [ str(p) for p in _parse_compressed_prices('2.16~8.96~L~1~2.14~2.51~L~2~') ]
+    ['(8.96 @ 2.16)', '(2.51 @ 2.14)', '(0.00 @ 0.00)']
+    
+    """
+    values = data.split('~')
+    prices = []
+    for i in range(0, len(values) - 3, 4):
+        price = Price(betType=values[i + 2], depth=int(values[i + 3]))
+        price.price = float(values[i])
+        price.amountAvailable = float(values[i + 1])
+        prices.append(price)
+        
+    betType = prices and prices[0].betType or "B"
+    while len(prices) < 3:
+        prices.append(Price(depth=len(prices) + 1, betType=betType))
+        
+    return prices
+    
+def _parse_compressed_runner_info(runnerPrices, data):
+    """Set the runner info fields of a compressed payload on runnerPrices.
+    
+    The info fields are the same for both compressed price calls, although 
+    the number of trailing separators varies, so missing fields are treated 
+    as empty.
+    
+    """
+    info = data.split('~')
+    if len(info) < 11:
+        info.extend([''] * (11 - len(info)))
+        
+    runnerPrices.selectionId = int(info[0])
+    runnerPrices.sortOrder = int(info[1])
+    runnerPrices.totalAmountMatched = float(info[2])
+    runnerPrices.lastPriceMatched = _float_or_none(info[3]) or 0.0
+    runnerPrices.handicap = _float_or_none(info[4]) or 0.0
+    runnerPrices.reductionFactor = _float_or_none(info[5]) or 0.0
+    runnerPrices.vacant = info[6] == "true"
+    runnerPrices.asianLineId = info[7] and int(info[7]) or 0
+    runnerPrices.farBSP = _float_or_none(info[8])
+    runnerPrices.nearBSP = _float_or_none(info[9])
+    runnerPrices.actualBSP = _float_or_none(info[10])
+    
+def _parse_compressed_runner_prices(data):
+    """Parse a single runner from a getMarketPricesCompressed payload."""
+    fields = data.split('|')
+    
+    runnerPrices = RunnerPrices()
+    _parse_compressed_runner_info(runnerPrices, fields[0])
+    runnerPrices.bestPricesToBack = _parse_compressed_prices(fields[1])
+    runnerPrices.bestPricesToLay = _parse_compressed_prices(fields[2])
+    
+    return runnerPrices
+    
+def _parse_compressed_market_prices(data):
+    """Parse a getMarketPricesCompressed payload into a MarketPrices object.
+    
+    The payload is a colon separated list of the market info followed by one
+    entry per runner. Market and runner info fields are separated by tildes,
+    and the back and lay prices of each runner follow its info, separated by
+    pipes. Separators that appear in text fields are escaped with a 
+    backslash.
+    
+    >>> prices = _parse_compressed_market_prices(
+    ...     '21251122~GBP~ACTIVE~0~1~NR\\: (EST)~true~5.0~1223311933533~'
+    ...     '2. Hellaga,16.41,7.2;~N:3112966~1~179.32~2.78~~37.8~false~~~~|'
+    ...     '2.16~8.96~L~1~2.14~2.51~L~2~|2.78~28.93~B~1~:3392894~0~0.0~~~7.8~'
+    ...     'false~~~~|18.0~21.81~L~1~|160.0~3.0~B~1~')
+    >>> prices.marketId, prices.marketStatus, prices.marketInfo
+    (21251122, 'ACTIVE', 'NR: (EST)')
+    >>> [ runner.selectionId for runner in prices.runnerPrices ]
+    [3392894, 3112966]
+    >>> runner = prices.getRunnerPrices(3112966)
+    >>> runner.lastPriceMatched, runner.reductionFactor
+    (2.78, 37.8)
+    >>> [ str(p) for p in runner.bestPricesToLay ]
+    ['(28.93 @ 2.78)', '(0.00 @ 0.00)', '(0.00 @ 0.00)']
+    
+    """
+    fields = _sanitize_compressed(data).split(':')
+    info = fields[0].split('~')
+    
+    marketPrices = MarketPrices()
+    marketPrices.marketId = int(info[0])
+    marketPrices.currencyCode = info[1]
+    marketPrices.marketStatus = info[2]
+    marketPrices.delay = int(info[3])
+    marketPrices.numberOfWinners = int(info[4])
+    marketPrices.marketInfo = info[5] and _desanitize_compressed(info[5]) \
+        or None
+    marketPrices.discountAllowed = info[6] == "true"
+    marketPrices.marketBaseRate = float(info[7])
+    marketPrices.lastRefresh = int(info[8])
+    marketPrices.removedRunners = _parse_removed_runners(info[9])
+    marketPrices.bspMarket = info[10] == "Y"
+    marketPrices.runnerPrices = [ _parse_compressed_runner_prices(runner) \
+        for runner in fields[1:] if runner ]
+    
+    # sort runner list
+    marketPrices.runnerPrices.sort(lambda x,y: x.sortOrder - y.sortOrder)
+    marketPrices._runnerPricesIndex = _index_runners(marketPrices.runnerPrices)
+    
+    return marketPrices
+    
+def _parse_complete_prices(runnerPrices, data):
+    """Set the price ladder of a getCompleteMarketPricesCompressed runner.
+    
+    Each price is a price~backAmount~layAmount~bspBackAmount~bspLayAmount
+    group. The ladder is stored column-wise in arrays, sorted by price.
+    
+    >>> runner = CompleteRunnerPrices()
+    >>> _parse_complete_prices(runner, '4.1~0.0~66.53~0.0~0.0~4.0~643.01~0.0~0.0~2.5~')
+    >>> runner.prices.tolist(), runner.layAmounts.tolist()
+    ([4.0, 4.1], [0.0, 66.53])
+    >>> runner.bspLayAmounts.tolist()
+    [2.5, 0.0]
+    
+    """
+    values = data.split('~')
+    if values[-1] == '': values.pop()
+    values = map(float, values)
+    
+    _set_ladder(runnerPrices, [ values[i::5] for i in range(5) ])
+    
+def _set_ladder(ladder, columns):
+    """Store the columns of a price ladder on a PriceLadder as arrays.
+    
+    columns is a list of the prices, back amounts, lay amounts, BSP back 
+    amounts and BSP lay amounts, each a list with an entry per price.
+    
+    """
+    # the ladder comes back in price order, but bisect relies on it
+    prices = columns[0]
+    if prices != sorted(prices):
+        order = range(len(prices))
+        order.sort(lambda x,y: cmp(prices[x], prices[y]))
+        columns = [ [ column[i] for i in order ] for column in columns ]
+        
+    ladder.prices = array('d', columns[0])
+    ladder.backAmounts = array('d', columns[1])
+    ladder.layAmounts = array('d', columns[2])
+    ladder.bspBackAmounts = array('d', columns[3])
+    ladder.bspLayAmounts = array('d', columns[4])
+    
+def _parse_complete_runner_prices(data):
+    """Parse a single runner from a getCompleteMarketPricesCompressed 
+    payload."""
+    fields = data.split('|')
+    
+    runnerPrices = CompleteRunnerPrices()
+    _parse_compressed_runner_info(runnerPrices, fields[0])
+    _parse_complete_prices(runnerPrices, fields[1])
+    
+    return runnerPrices
+    
+def _parse_complete_market_prices(data):
+    """Parse a getCompleteMarketPricesCompressed payload into a 
+    CompleteMarketPrices object.
+    
+    The payload is laid out as for getMarketPricesCompressed, but the market
+    info is just the market id, delay and removed runners, and each runner 
+    is followed by a single block holding the full price ladder.
+    
+    >>> prices = _parse_complete_market_prices(
+    ...     '21250569~0~Baylini,14.29,8.6;:1457299~8~745.56~24.0~~3.9~false~0~'
+    ...     '20.62~24.0~~|1.01~12677.34~0.0~0.0~3.0~20.0~10.22~0.0~0.0~3.09~'
+    ...     '21.0~9.53~0.0~0.0~0.0~27.0~0.0~1.48~0.0~0.0~28.0~0.0~6.7~0.0~0.0~'
+    ...     ':936474~10~974.26~40.0~~3.2~false~0~10.38~37.95~~|1.01~5.0~0.0~'
+    ...     '0.0~18.0~')
+    >>> prices.marketId, prices.delay, [ str(r) for r in prices.removedRunners ]
+    (21250569, 0, ['(Baylini, 14:29, 8.6%)'])
+    >>> runner = prices.getRunnerPrices(1457299)
+    >>> runner.reductionFactor, runner.farBSP, runner.nearBSP, runner.actualBSP
+    (3.9, 20.62, 24.0, None)
+    >>> [ str(p) for p in runner.getBestPricesToBack() ]
+    ['(9.53 @ 21.00)', '(10.22 @ 20.00)', '(12677.34 @ 1.01)']
+    >>> [ str(p) for p in runner.getBestPricesToLay() ]
+    ['(1.48 @ 27.00)', '(6.70 @ 28.00)', '(0.00 @ 0.00)']
+    >>> runner.amountAvailableToBack(20.0), runner.amountAvailableToLay(28.0)
+    (19.75, 8.18)
+    
+    """
+    fields = _sanitize_compressed(data).split(':')
+    info = fields[0].split('~')
+    
+    completeMarketPrices = CompleteMarketPrices()
+    completeMarketPrices.marketId = int(info[0])
+    completeMarketPrices.delay = int(info[1])
+    completeMarketPrices.removedRunners = _parse_removed_runners(info[2])
+    completeMarketPrices.runnerPrices = [ \
+        _parse_complete_runner_prices(runner) for runner in fields[1:] \
+        if runner ]
+    
+    # sort runner list
+    completeMarketPrices.runnerPrices.sort(lambda x,y: \
+        x.sortOrder - y.sortOrder)
+    completeMarketPrices._runnerPricesIndex = \
+        _index_runners(completeMarketPrices.runnerPrices)
+    
+    return completeMarketPrices
+    
+def _parse_runner_traded_volume(data):
+    """Parse a single runner from a getMarketTradedVolumeCompressed payload.
+    
+    The runner info is followed by a price~amount group for each price 
+    traded at, separated by pipes. The prices are stored in arrays, sorted
+    by price.
+    
+    >>> runner = _parse_runner_traded_volume(
+    ...     '2311135~0~0.0~12.5~30.0|4.8~4.0|6.2~7.96|5.0~45.26')
+    >>> runner.selectionId, runner.actualBSP, runner.totalBspLiabilityMatchedAmount
+    (2311135, None, 30.0)
+    >>> runner.prices.tolist(), runner.amounts.tolist()
+    ([4.8, 5.0, 6.2], [4.0, 45.26, 7.96])
+    
+    """
+    fields = data.split('|')
+    info = fields[0].split('~')
+    
+    runner = RunnerTradedVolume()
+    runner.selectionId = int(info[0])
+    runner.asianLineId = int(info[1])
+    runner.actualBSP = _float_or_none(info[2])
+    runner.totalBspBackMatchedAmount = float(info[3])
+    runner.totalBspLiabilityMatchedAmount = float(info[4])
+    
+    volumes = [ field.split('~') for field in fields[1:] if field ]
+    volumes = [ (float(price), float(amount)) for price, amount in volumes ]
+    volumes.sort()
+    runner.prices = array('d', [ price for price, amount in volumes ])
+    runner.amounts = array('d', [ amount for price, amount in volumes ])
+    
+    return runner
+    
+def _parse_market_traded_volume(data):
+    """Parse a getMarketTradedVolumeCompressed payload into a list of 
+    RunnerTradedVolume, one for each runner (and asian line) in the market.
+    
+    Runners are separated by colons, as in the other compressed payloads.
+    
+    >>> runners = _parse_market_traded_volume(
+    ...     ':2311135~0~0.0~0.0~0.0|4.8~4.0|6.2~7.96:2311129~0~11.5~1.0~2.0|'
+    ...     '10.5~42.0')
+    >>> [ (runner.selectionId, runner.totalMatched()) for runner in runners ]
+    [(2311135, 11.96), (2311129, 42.0)]
+    
+    """
+    return [ _parse_runner_traded_volume(runner) 
+             for runner in data.split(':') if runner ]
+    
+def _iter_all_markets(data):
+    """Parse a getAllMarkets payload, yielding a MarketData for each market.
+    
+    Markets are separated by colons and their fields by tildes. The payload 
+    is walked one market at a time, so the markets can be consumed (e.g. by
+    a MarketCatalogue) without a list of them all being built first.
+    
+    >>> markets = _iter_all_markets(
+    ...     ':20158165~Match Odds~O~ACTIVE~1164223800000~\\Soccer\\Scottish '
+    ...     'Soccer\\Partick v Clyde~/1/2695886/610072/20158165~0~1~GBR~'
+    ...     '1164192924479~3~1~8737.44~N~Y:20158166~Over\\: Under 2.5~O~'
+    ...     'SUSPENDED~1164223800000~\\Soccer~/1/2695886/20158166~0~1~~'
+    ...     '1164192924479~2~1~~N~N')
+    >>> market = markets.next()
+    >>> market.marketId, market.eventTypeId, market.countryISO3, market.eventDate
+    (20158165, 1, 'GBR', datetime.datetime(2006, 11, 22, 19, 30))
+    >>> print market.menuPath
+    \Soccer\Scottish Soccer\Partick v Clyde
+    >>> market.totalAmountMatched, market.bspMarket, market.turningInPlay
+    (8737.44, False, True)
+    >>> market = markets.next()
+    >>> market.marketName, market.countryISO3, market.totalAmountMatched
+    ('Over: Under 2.5', None, 0.0)
+    >>> list(markets)
+    []
+    
+    """
+    data = _sanitize_compressed(data)
+    start = 0
+    while start < len(data):
+        end = data.find(':', start)
+        if end < 0: end = len(data)
+        if end > start: yield MarketData(data[start:end].split('~'))
+        start = end + 1
+        
+class _LightText(object):
+    
+    """A text node produced by the expat parser backend."""
+    
+    __slots__ = ('nodeValue',)
+    
+    nodeType = 3
+    childNodes = ()
+    
+    def __init__(self, data):
+        self.nodeValue = data
+        
+    def hasChildNodes(self):
+        return False
+        
+    def _writexml(self, writer, indent, addindent, newl):
+        writer.write('%s%s%s' % (indent, escape(self.nodeValue), newl))
+        
+class _LightElement(object):
+    
+    """An element produced by the expat parser backend.
+    
+    Supports the subset of the minidom Element interface used by the response
+    classes. The first call to getElementsByTagName walks the subtree once and
+    indexes every descendant by tag name, so the repeated lookups made while
+    constructing a domain object are dictionary lookups rather than a full 
+    subtree scan each time.
+    
+    """
+    
+    __slots__ = ('tagName', 'attributes', 'childNodes', 'parentNode', '_index')
+    
+    nodeType = 1
+    nodeValue = None
+    
+    def __init__(self, tagName, attributes, parentNode):
+        self.tagName = tagName
+        self.attributes = attributes
+        self.childNodes = []
+        self.parentNode = parentNode
+        self._index = None
+        
+    def _get_localName(self):
+        return self.tagName.split(':')[-1]
+        
+    localName = property(_get_localName)
+    nodeName = property(lambda self: self.tagName)
+        
+    def hasChildNodes(self):
+        return len(self.childNodes) > 0
+        
+    def getAttribute(self, name):
+        return self.attributes.get(name, '')
+        
+    def getElementsByTagName(self, name):
+        """Return all descendant elements with the tag name, in document order.
+        
+        The returned list is shared between callers and must not be modified.
+        
+        """
+        index = self._index
+        if index is None:
+            index = self._index = {}
+            stack = self.childNodes[::-1]
+            while stack:
+                node = stack.pop()
+                if node.nodeType == 1:
+                    index.setdefault(node.tagName, []).append(node)
+                    stack.extend(node.childNodes[::-1])
+                    
+        return index.get(name, [])
+        
+    def getElementsByTagNameNS(self, namespaceURI, localName):
+        """Return all descendant elements with the namespace and local name."""
+        matches = []
+        stack = self.childNodes[::-1]
+        while stack:
+            node = stack.pop()
+            if node.nodeType == 1:
+                if node.localName == localName and \
+                                        node._namespaceURI() == namespaceURI:
+                    matches.append(node)
+                stack.extend(node.childNodes[::-1])
+                
+        return matches
+        
+    def _namespaceURI(self):
+        # resolve the prefix against the xmlns declarations in scope
+        parts = self.tagName.split(':')
+        attribute = len(parts) > 1 and 'xmlns:' + parts[0] or 'xmlns'
+        
+        node = self
+        while node is not None and node.nodeType == 1:
+            if attribute in node.attributes:
+                return node.attributes[attribute]
+            node = node.parentNode
+            
+        return None
+        
+    def toprettyxml(self, indent='\t', newl='\n'):
+        writer = StringIO()
+        self._writexml(writer, '', indent, newl)
+        return writer.getvalue()
+        
+    def _writexml(self, writer, indent, addindent, newl):
+        writer.write('%s<%s' % (indent, self.tagName))
+        
+        names = self.attributes.keys()
+        names.sort()
+        for name in names:
+            writer.write(' %s="%s"' % (name, 
+                escape(self.attributes[name], {'"': '&quot;'})))
+                
+        if not self.childNodes:
+            writer.write('/>%s' % (newl,))
+        elif len(self.childNodes) == 1 and self.childNodes[0].nodeType == 3:
+            writer.write('>%s</%s>%s' % (escape(self.childNodes[0].nodeValue),
+                                         self.tagName, newl))
+        else:
+            writer.write('>%s' % (newl,))
+            for node in self.childNodes:
+                node._writexml(writer, indent + addindent, addindent, newl)
+            writer.write('%s</%s>%s' % (indent, self.tagName, newl))
+            
+class _LightDocument(_LightElement):
+    
+    """The document produced by the expat parser backend."""
+    
+    __slots__ = ()
+    
+    nodeType = 9
+    
+    def __init__(self):
+        _LightElement.__init__(self, '#document', {}, None)
+        
+    def _get_documentElement(self):
+        return self.childNodes and self.childNodes[0] or None
+        
+    documentElement = property(_get_documentElement)
+    
+    def _writexml(self, writer, indent, addindent, newl):
+        writer.write('<?xml version="1.0" ?>%s' % (newl,))
+        for node in self.childNodes:
+            node._writexml(writer, indent, addindent, newl)
+        
+def _parse_expat(xmlString):
+    """Parse a response into a lightweight document in a single expat pass.
+    
+    The result can be passed to any of the response classes in place of a 
+    minidom document.
+    
+    >>> doc = _parse_expat('<a xmlns:n="urn:x"><n:b><c>1</c><c/></n:b></a>')
+    >>> [ node.hasChildNodes() for node in doc.getElementsByTagName('c') ]
+    [True, False]
+    >>> doc.getElementsByTagName('c')[0].childNodes[0].nodeValue
+    u'1'
+    >>> doc.getElementsByTagNameNS('urn:x', 'b')[0].tagName
+    u'n:b'
+    
+    """
+    document = _LightDocument()
+    stack = [document]
+    
+    def startElement(name, attributes):
+        parent = stack[-1]
+        element = _LightElement(name, attributes, parent)
+        parent.childNodes.append(element)
+        stack.append(element)
+        
+    def endElement(name):
+        stack.pop()
+        
+    def characterData(data):
+        if len(stack) > 1: stack[-1].childNodes.append(_LightText(data))
+        
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.StartElementHandler = startElement
+    parser.EndElementHandler = endElement
+    parser.CharacterDataHandler = characterData
+    parser.Parse(xmlString, True)
+    
+    return document
+    
+# parser backends available to HttpHelper, keyed by name
+_PARSERS = {
+    'minidom': parseString,
+    'expat': _parse_expat,
+}
+
+class ConnectionPool:
+    
+    """Thread-safe pool of persistent HTTP(S) connections.
+    
+    Idle connections are kept per (hostname, secure) pair, so that repeated
+    requests to the same Betfair host reuse a warm socket rather than paying
+    for a fresh connect and TLS handshake on every call. Connections that have
+    sat idle for longer than idleTimeout, or whose socket has been closed by
+    the server, are discarded when next looked at.
+    
+    """
+    
+    def __init__(self, maxsize=4, idleTimeout=60, debuglevel=0):
+        """Initialise a new instance.
+        
+        maxsize     -- maximum number of idle connections kept per host 
+                       (default 4)
+        idleTimeout -- seconds an idle connection is kept before it is closed
+                       (default 60)
+        debuglevel  -- configures httplib's wiredump (default 0)
+        
+        """
+        self.maxsize = maxsize
+        self.idleTimeout = idleTimeout
+        self.debuglevel = debuglevel
+        
+        # (hostname, secure) -> list of (connection, time last released)
+        self._idle = {}
+        self._lock = threading.Lock()
+        
+    def getConnection(self, hostname, secure):
+        """Return a (connection, reused) tuple for the specified host.
+        
+        The most recently released live connection is returned if there is
+        one, otherwise a new connection is created. reused is True if the
+        connection has been used for a previous request.
+        
+        """
+        now = time()
+        stale = []
+        conn = None
+        
+        self._lock.acquire()
+        try:
+            idle = self._idle.get((hostname, secure), [])
+            while idle:
+                candidate, released = idle.pop()
+                if now - released > self.idleTimeout or \
+                                            _is_connection_dropped(candidate):
+                    stale.append(candidate)
+                else:
+                    conn = candidate
+                    break
+        finally:
+            self._lock.release()
+            
+        for candidate in stale: candidate.close()
+        
+        if conn: return conn, True
+        return self._newConnection(hostname, secure), False
+        
+    def _newConnection(self, hostname, secure):
+        conn = secure and HTTPSConnection(hostname) or HTTPConnection(hostname)
+        conn.set_debuglevel(self.debuglevel)
+        return conn
+        
+    def releaseConnection(self, hostname, secure, conn):
+        """Return a connection to the pool once its response has been read.
+        
+        The connection is closed instead if the pool for the host is full.
+        
+        """
+        self._lock.acquire()
+        try:
+            idle = self._idle.setdefault((hostname, secure), [])
+            if len(idle) < self.maxsize:
+                idle.append((conn, time()))
+                conn = None
+        finally:
+            self._lock.release()
+            
+        if conn: conn.close()
+        
+    def evictIdle(self):
+        """Close all connections that have exceeded the idle timeout."""
+        now = time()
+        stale = []
+        
+        self._lock.acquire()
+        try:
+            for idle in self._idle.values():
+                live = [ (conn, released) for conn, released in idle \
+                            if now - released <= self.idleTimeout ]
+                stale.extend([ conn for conn, released in idle \
+                            if now - released > self.idleTimeout ])
+                idle[:] = live
+        finally:
+            self._lock.release()
+            
+        for conn in stale: conn.close()
+        
+    def warm(self, hostname, secure, count):
+        """Open new connections to the specified host until count of them 
+        are idle, so that the next requests don't have to wait for a connect
+        and TLS handshake. Returns the number of connections opened.
+        
+        The connections are handed out as reused ones, so a request that 
+        can't be sent over one the server has since dropped is sent again on
+        a new connection; see HttpHelper._pooledRequest.
+        
+        """
+        self.evictIdle()
+        
+        self._lock.acquire()
+        try:
+            idle = self._idle.setdefault((hostname, secure), [])
+            stale = [ conn for conn, released in idle \
+                        if _is_connection_dropped(conn) ]
+            idle[:] = [ (conn, released) for conn, released in idle \
+                        if conn not in stale ]
+            needed = min(count, self.maxsize) - len(idle)
+        finally:
+            self._lock.release()
+            
+        for conn in stale: conn.close()
+        
+        for i in range(needed):
+            conn = self._newConnection(hostname, secure)
+            _connect(conn)
+            self.releaseConnection(hostname, secure, conn)
+        return max(needed, 0)
+        
+    def closeAll(self):
+        """Close all idle connections."""
+        self._lock.acquire()
+        try:
+            idle = self._idle
+            self._idle = {}
+        finally:
+            self._lock.release()
+            
+        for connections in idle.values():
+            for conn, released in connections: conn.close()
+            
+def _is_connection_dropped(conn):
+    """Return True if an idle connection can no longer be used.
+    
+    An idle keep-alive socket should have nothing to read, so if select
+    reports it as readable the server has closed it (or sent something we
+    weren't expecting) and the connection must be discarded.
+    
+    """
+    return _is_socket_dropped(conn.sock)
+    
+def _is_socket_dropped(sock):
+    if sock is None: return True
+    
+    try:
+        readable, writable, errored = select([sock], [], [], 0)
+    except (socket.error, ValueError):
+        return True
+        
+    return len(readable) > 0
+    
+def _connect(conn):
+    """Open the socket of a pooled connection.
+    
+    Nagle's algorithm is turned off, so that a request written in more than 
+    one piece isn't held back until the server acknowledges the first, which
+    on a keep-alive connection can add tens of milliseconds to every call.
+    
+    """
+    conn.connect()
+    try:
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except (socket.error, AttributeError):
+        pass
+        
+def _encode_envelope(envelope):
+    """Return an envelope as UTF-8 bytes.
+    
+    Envelopes are unicode if anything formatted into them was, e.g. a session
+    token read from a response. httplib writes a unicode body separately from
+    the headers, and its length in characters isn't its length in bytes.
+    
+    >>> _encode_envelope(u'<name>Atl\\xe9tico</name>')
+    '<name>Atl\\xc3\\xa9tico</name>'
+    
+    """
+    if isinstance(envelope, unicode): return envelope.encode('utf-8')
+    return envelope
+    
+# shared by all HttpHelpers that aren't given a pool of their own, so the
+# global and exchange proxies reuse each other's connections to a host
+DEFAULT_CONNECTION_POOL = ConnectionPool()
+
+# the SOAP actions sent over a BFExchangeService's OrderLane
+_ORDER_ACTIONS = ('placeBets', 'updateBets', 'cancelbets')
+
+class OrderLane:
+    
+    """Connections kept apart for bet placement, update and cancellation.
+    
+    Orders sent over the same connections as data requests can be held up 
+    behind them, e.g. waiting for a connection while a large getMarketPrices
+    or getCurrentBets response is read. A BFExchangeService given an 
+    OrderLane sends placeBets, updateBets and cancelBets over the lane's own
+    connections instead, and records their timings in the lane's metrics 
+    rather than the proxy's, e.g.
+    
+        lane = OrderLane()
+        exchangeProxy = BFExchangeService(orderLane=lane)
+        exchangeProxy.warmOrderLane()
+        ...
+        print lane.metrics.getHistogram('placeBets', 'total')
+        
+    Calling warmOrderLane again tops the lane back up if the server has
+    closed its connections in the meantime, and costs little otherwise. An 
+    order is only sent again if it couldn't be written to a lane connection
+    at all; once it has been written, any failure to read the response is 
+    raised, so that bets are never placed twice.
+    
+    Attributes:
+        connections -- the number of connections to keep warm
+        pool        -- ConnectionPool holding them
+        metrics     -- CallMetrics the order calls are recorded in
+        
+    """
+    def __init__(self, connections=2, idleTimeout=300, metrics=None):
+        """Initialise a new lane.
+        
+        connections -- the number of connections to keep warm (default 2)
+        idleTimeout -- seconds an idle connection is kept (default 300)
+        metrics     -- CallMetrics to record the order calls in (defaults to
+                       a new CallMetrics)
+                       
+        """
+        self.connections = connections
+        self.pool = ConnectionPool(connections, idleTimeout)
+        self.metrics = metrics or CallMetrics()
+
+class WorkerPool:
+    
+    """A pool of daemon threads for running blocking API calls concurrently.
+    
+    Threads are started as they are needed and then kept, so that the 
+    connections they hold are reused from one batch of calls to the next.
+    
+    """
+    def __init__(self):
+        self._tasks = Queue()
+        self._threads = []
+        self._outstanding = 0
+        self._lock = threading.Lock()
+        
+        # stop the threads cleanly rather than leave them to be killed part
+        # way through interpreter shutdown
+        atexit.register(self.close)
+        
+    def imapUnordered(self, func, items, maxWorkers=8):
+        """Call func on each of items, yielding results as they complete.
+        
+        No more than maxWorkers calls from this batch run at the same time. 
+        Yields (item, result, error) tuples, where error is the exception
+        raised by func (and result is None) if the call failed.
+        
+        """
+        items = list(items)
+        results = Queue()
+        submitted = 0
+        pending = 0
+        
+        while submitted < len(items) or pending:
+            while submitted < len(items) and pending < maxWorkers:
+                self._submit(func, items[submitted], results)
+                submitted += 1
+                pending += 1
+                
+            yield results.get()
+            pending -= 1
+            
+    def _submit(self, func, item, results):
+        self._lock.acquire()
+        try:
+            self._outstanding += 1
+            if self._outstanding > len(self._threads):
+                thread = threading.Thread(target=self._work)
+                thread.setDaemon(True)
+                thread.start()
+                self._threads.append(thread)
+        finally:
+            self._lock.release()
+            
+        self._tasks.put((func, item, results))
+        
+    def close(self):
+        """Stop all the threads, once they have finished their current 
+        call."""
+        self._lock.acquire()
+        try:
+            threads = self._threads
+            self._threads = []
+        finally:
+            self._lock.release()
+            
+        for thread in threads: self._tasks.put(None)
+        for thread in threads: thread.join(1)
+        
+    def _work(self):
+        while True:
+            task = self._tasks.get()
+            if task is None: return
+            
+            func, item, results = task
+            try:
+                result = (item, func(item), None)
+            except Exception, e:
+                result = (item, None, e)
+                
+            # count the thread as free before handing back the result, so the
+            # next call submitted doesn't start a thread it doesn't need
+            self._lock.acquire()
+            try:
+                self._outstanding -= 1
+            finally:
+                self._lock.release()
+                
+            results.put(result)
+            
+# shared by all BFExchangeServices that aren't given a pool of their own
+DEFAULT_WORKER_POOL = WorkerPool()
+
+class BatchResults(dict):
+    
+    """Responses from a batch call, keyed by the id each request was for.
+    
+    Attributes:
+        errors       -- dict of the exceptions raised by requests that failed, 
+                        keyed in the same way
+        sessionToken -- the session token from the most recent response 
+                        header, to be used for the next request (None if no
+                        request returned one)
+                        
+    """
+    def __init__(self):
+        dict.__init__(self)
+        self.errors = {}
+        self.sessionToken = None
+        self._timestamp = None
+        
+    def _add(self, key, response, error):
+        if error:
+            self.errors[key] = error
+            return
+            
+        self[key] = response
+        _take_newest_token(self, response.header)
+        
+    def _merge(self, other):
+        # replace the entries that were requested again with their new results
+        for key in other:
+            self.errors.pop(key, None)
+            self._add(key, other[key], None)
+        for key in other.errors:
+            self.pop(key, None)
+            self._add(key, None, other.errors[key])
+        return self
+        
+def _unique(items):
+    """Return a list of items in their original order, leaving out repeats.
+    
+    >>> _unique([3, 1, 3, 2, 1])
+    [3, 1, 2]
+    
+    """
+    seen = set()
+    unique = []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            unique.append(item)
+    return unique
+    
+def _take_newest_token(results, header):
+    # each response carries a new token, the newest one wins
+    if header.sessionToken and (results._timestamp is None or \
+                                header.timestamp >= results._timestamp):
+        results.sessionToken = header.sessionToken
+        results._timestamp = header.timestamp
+        
+# the most orders the API accepts in one placeBets, updateBets and cancelBets
+# request; the bulk methods split larger lists into requests of this size
+MAX_PLACE_BETS = 60
+MAX_UPDATE_BETS = 15
+MAX_CANCEL_BETS = 40
+
+def _chunk_indices(items, chunkSize, key=None):
+    """Split the positions of items into lists of at most chunkSize, keeping
+    items with a different key(item) in different lists.
+    
+    >>> _chunk_indices('abcde', 2)
+    [[0, 1], [2, 3], [4]]
+    >>> _chunk_indices([1, 2, 1, 1, 2], 2, key=lambda item: item)
+    [[0, 2], [3], [1, 4]]
+    
+    """
+    groups = {}
+    order = []
+    for index in range(len(items)):
+        group = key and key(items[index])
+        if group not in groups:
+            groups[group] = []
+            order.append(group)
+        groups[group].append(index)
+        
+    chunks = []
+    for group in order:
+        indices = groups[group]
+        for start in range(0, len(indices), chunkSize):
+            chunks.append(indices[start:start + chunkSize])
+    return chunks
+    
+class MissingBetResults(Exception):
+    
+    """Recorded in BulkResults.errors for a request whose response was OK but
+    left out the results of some of its orders.
+    
+    Attributes:
+        missing -- the number of orders without a result
+        count   -- the number of orders in the request
+        
+    """
+    def __init__(self, missing, count):
+        Exception.__init__(self, "No result for %i of %i orders" % \
+            (missing, count))
+        self.missing = missing
+        self.count = count
+        
+class BulkResults(list):
+    
+    """Results of a bulk bet call, one per order in the order they were given.
+    
+    Each entry is the BetPlacementResult, UpdateBetsResult or CancelBetsResult
+    for the order, or None if the request it was sent in raised an exception 
+    or was rejected as a whole, in which case see responses and errors. 
+    Update and cancel results are matched to their orders by betId, and 
+    placement results by position.
+    
+    Attributes:
+        chunks       -- list of the orders' positions sent in each request
+        responses    -- list of the response to each request, in the same 
+                        order as chunks (None for requests that failed)
+        errors       -- dict of the exceptions raised by requests that failed, 
+                        or MissingBetResults for those whose response left 
+                        orders out, keyed by their position in chunks
+        sessionToken -- the session token from the most recent response 
+                        header, to be used for the next request (None if no
+                        request returned one)
+                        
+    Requests retried by BFSession.call after a NO_SESSION are added to the 
+    end of chunks and responses.
+    
+    """
+    def __init__(self, count, chunks, betIds=None):
+        list.__init__(self, [None] * count)
+        self.chunks = chunks
+        self.responses = [None] * len(chunks)
+        self.errors = {}
+        self.sessionToken = None
+        self._timestamp = None
+        self._betIds = betIds
+        
+    def _add(self, chunk, response, error):
+        if error:
+            self.errors[chunk] = error
+            return
+            
+        self.responses[chunk] = response
+        indices = self.chunks[chunk]
+        if self._betIds is None:
+            for index, betResult in zip(indices, response.betResults):
+                self[index] = betResult
+            missing = len(indices) - len(response.betResults)
+        else:
+            # the same bet may be in a request more than once
+            positions = {}
+            for index in indices:
+                positions.setdefault(self._betIds[index], []).append(index)
+            missing = len(indices)
+            for betResult in response.betResults:
+                waiting = positions.get(betResult.betId)
+                if waiting:
+                    self[waiting.pop(0)] = betResult
+                    missing -= 1
+            
+        if missing > 0 and response.errorCode == "OK":
+            self.errors[chunk] = MissingBetResults(missing, len(indices))
+        _take_newest_token(self, response.header)
+        
+    def _merge(self, other, positions):
+        # add the requests of other, a retry of the orders at positions
+        offset = len(self.chunks)
+        for chunk in range(len(other.chunks)):
+            self.chunks.append([ positions[index] 
+                                 for index in other.chunks[chunk] ])
+            self.responses.append(other.responses[chunk])
+        for chunk in other.errors:
+            self.errors[offset + chunk] = other.errors[chunk]
+        for index in range(len(other)):
+            if other[index] is not None: self[positions[index]] = other[index]
+            
+        if other.sessionToken and (self._timestamp is None or \
+                                   other._timestamp >= self._timestamp):
+            self.sessionToken = other.sessionToken
+            self._timestamp = other._timestamp
+        return self
+        
+# the subscription service (ServiceEnum in the WSDL) that each SOAP action 
+# is throttled as
+_THROTTLED_SERVICES = {
+    'login':'LOGIN',
+    'keepAlive':'DO_KEEP_ALIVE',
+    'getActiveEventTypes':'LOAD_EVENT_TYPES',
+    'getEvents':'LOAD_EVENTS',
+    'getSubscriptionInfo':'LOAD_SUBSCRIPTION_INFO',
+    'getAccountFunds':'LOAD_ACCOUNT_FUNDS',
+    'getAccountStatement':'GET_ACCOUNT_STATEMENT',
+    'getBetHistory':'LOAD_BET_HISTORY',
+    'getCurrentBets':'GET_CURRENT_BETS',
+    'getMUBets':'GET_CURRENT_BETS',
+    'getCurrentBetsLite':'GET_CURRENT_BETS',
+    'getMUBetsLite':'GET_CURRENT_BETS',
+    'getMarket':'LOAD_MARKET',
+    'getMarketPrices':'LOAD_MARKET_PRICES',
+    'getMarketPricesCompressed':'LOAD_MARKET_PRICES_COMPRESSED',
+    'getCompleteMarketPricesCompressed':'LOAD_MARKET_PRICES_COMPRESSED',
+    'getMarketProfitAndLoss':'LOAD_MARKET_PROFIT_LOSS',
+    'getMarketTradedVolume':'GET_MARKET_TRADED_VOLUME',
+    'getMarketTradedVolumeCompressed':'GET_MARKET_TRADED_VOLUME',
+    'getDetailAvailableMktDepth':'LOAD_DETAILED_AVAIL_MKT_DEPTH',
+    'getBet':'GET_BET',
+    'getBetLite':'GET_BET',
+    'getBetMatchesLite':'GET_BET',
+    'placeBets':'PLACE_BETS',
+    'updateBets':'EDIT_BETS',
+    'cancelbets':'CANCEL_BETS',
+}
+
+# services whose requests are let through ahead of any others
+_PRIORITY_SERVICES = ('PLACE_BETS', 'EDIT_BETS', 'CANCEL_BETS')
+
+class ThrottleExceeded(Exception):
+    
+    """Raised by a ThrottleScheduler that sheds a request rather than keep 
+    it waiting.
+    
+    Attributes:
+        action      -- the SOAP action of the request
+        serviceType -- the throttled service it counts against
+        
+    """
+    def __init__(self, action, serviceType):
+        Exception.__init__(self, "Request shed to stay within throttle: %s" \
+            % (action,))
+        self.action = action
+        self.serviceType = serviceType
+        
+class _TokenBucket:
+    def __init__(self, maxUsages, period, tokens):
+        self.capacity = float(maxUsages)
+        self.rate = maxUsages / float(period)
+        self.tokens = max(0.0, min(self.capacity, float(tokens)))
+        self.updated = time()
+        
+    def delay(self, now):
+        """Return the seconds until a token is available."""
+        self.tokens = min(self.capacity, 
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1: return 0
+        return (1 - self.tokens) / self.rate
+        
+class ThrottleScheduler:
+    
+    """Keeps requests within the throttle limits of an API subscription.
+    
+    Each throttled service has a token bucket holding maxUsages tokens, 
+    refilled at maxUsages per period (taken to be seconds). Every request
+    takes a token from the bucket of the service its SOAP action counts 
+    against, waiting for one if necessary. An overall limit on requests per
+    second can also be set, e.g. to stay clear of data request charges.
+    
+    Waiting bet placement, update and cancellation requests are let through
+    ahead of all others, and are never shed. Other requests that would wait
+    longer than maxWait seconds are shed by raising ThrottleExceeded.
+    
+    A scheduler is usually shared by the global and exchange proxies, e.g.
+    
+        throttle = ThrottleScheduler(maxWait=2)
+        globalProxy = BFGlobalService(throttle=throttle)
+        exchangeProxy = BFExchangeService(throttle=throttle)
+        ...
+        info = globalProxy.getSubscriptionInfo(sessionToken)
+        throttle.configure(info.subscriptions)
+        
+    """
+    
+    def __init__(self, subscriptions=None, maxWait=None, 
+                 maxRequestsPerSecond=None, 
+                 priorityServices=_PRIORITY_SERVICES):
+        """Initialise a new scheduler.
+        
+        subscriptions        -- list of Subscription to take the limits from.
+                                Nothing is throttled until configured
+        maxWait              -- the most seconds a request other than a bet 
+                                placement, update or cancellation will wait 
+                                before it is shed (default None, never shed)
+        maxRequestsPerSecond -- an overall limit on requests per second 
+                                (default None, no limit)
+        priorityServices     -- the services to let through first
+        
+        """
+        self.maxWait = maxWait
+        self.priorityServices = priorityServices
+        
+        self._cond = threading.Condition()
+        self._buckets = {}
+        self._overall = maxRequestsPerSecond and _TokenBucket(
+            maxRequestsPerSecond, 1, maxRequestsPerSecond) or None
+            
+        # service type (None for the overall limit) -> heap of the keys of 
+        # the requests waiting for it, ordered by priority then arrival
+        self._waiting = {}
+        self._sequence = 0
+        
+        if subscriptions: self.configure(subscriptions)
+        
+    def configure(self, subscriptions):
+        """Set the limits from a list of Subscription, as returned by 
+        getSubscriptionInfo. Usage already counted in the current period is
+        taken into account."""
+        buckets = {}
+        for subscription in subscriptions:
+            if subscription.status != "ACTIVE": continue
+            
+            for service in subscription.services:
+                if service.maxUsages <= 0 or service.period <= 0: continue
+                
+                # if more than one subscription covers a service, the most
+                # generous limit applies
+                bucket = _TokenBucket(service.maxUsages, service.period, 
+                                      service.maxUsages - service.usageCount)
+                current = buckets.get(service.serviceType)
+                if current is None or bucket.rate > current.rate:
+                    buckets[service.serviceType] = bucket
+                    
+        self._cond.acquire()
+        try:
+            self._buckets = buckets
+            self._cond.notifyAll()
+        finally:
+            self._cond.release()
+            
+    def isPriority(self, action):
+        """Return True if requests performing action are let through 
+        first."""
+        return _THROTTLED_SERVICES.get(action) in self.priorityServices
+        
+    def acquire(self, action):
+        """Wait until a request performing action may be sent.
+        
+        Raises ThrottleExceeded if the request is shed instead.
+        
+        """
+        serviceType = _THROTTLED_SERVICES.get(action)
+        priority = serviceType in self.priorityServices
+        deadline = None
+        if not priority and self.maxWait is not None: 
+            deadline = time() + self.maxWait
+        
+        self._cond.acquire()
+        try:
+            limits = self._limits(serviceType)
+            if not limits: return
+            
+            self._sequence += 1
+            key = (not priority, self._sequence)
+            for name, bucket in limits:
+                heapq.heappush(self._waiting.setdefault(name, []), key)
+                
+            try:
+                while True:
+                    now = time()
+                    delay = self._delay(key, limits, now)
+                    if delay == 0:
+                        for name, bucket in limits: bucket.tokens -= 1
+                        return
+                        
+                    # don't wait for a token that won't arrive in time
+                    if deadline is not None and (now >= deadline or 
+                            (delay is not None and now + delay > deadline)):
+                        raise ThrottleExceeded(action, serviceType)
+                        
+                    timeout = delay
+                    if deadline is not None:
+                        timeout = min(timeout or deadline - now, 
+                                      deadline - now)
+                    self._cond.wait(timeout)
+                    
+                    # pick up any change of limits
+                    limits = self._limits(serviceType)
+            finally:
+                for waiting in self._waiting.values():
+                    if key in waiting:
+                        waiting.remove(key)
+                        heapq.heapify(waiting)
+                self._cond.notifyAll()
+        finally:
+            self._cond.release()
+            
+    def tryAcquire(self, action):
+        """Let a request performing action through if it can be sent now,
+        without waiting.
+        
+        Returns 0 if it can, otherwise the seconds to wait before trying 
+        again. Raises ThrottleExceeded if the request should be shed.
+        
+        """
+        serviceType = _THROTTLED_SERVICES.get(action)
+        
+        self._cond.acquire()
+        try:
+            limits = self._limits(serviceType)
+            if not limits: return 0
+            
+            delay = 0
+            for name, bucket in limits:
+                delay = max(delay, bucket.delay(time()))
+                
+                # let the blocked requests go first
+                if self._waiting.get(name): delay = max(delay, 0.01)
+                
+            if delay == 0:
+                for name, bucket in limits: bucket.tokens -= 1
+            elif serviceType not in self.priorityServices and \
+                            self.maxWait is not None and delay > self.maxWait:
+                raise ThrottleExceeded(action, serviceType)
+                
+            return delay
+        finally:
+            self._cond.release()
+            
+    def _limits(self, serviceType):
+        limits = []
+        bucket = self._buckets.get(serviceType)
+        if bucket: limits.append((serviceType, bucket))
+        if self._overall: limits.append((None, self._overall))
+        return limits
+        
+    def _delay(self, key, limits, now):
+        """Return the seconds until the request with key can take its 
+        tokens, or None if it must wait for requests ahead of it."""
+        delay = 0
+        for name, bucket in limits:
+            waiting = self._waiting.get(name)
+            if waiting and waiting[0] != key: return None
+            delay = max(delay, bucket.delay(now))
+        return delay
+        
+# upper bounds of the Histogram buckets, in seconds (10us to 100s)
+_HISTOGRAM_BOUNDS = [ m * 10 ** e for e in range(-5, 2) for m in (1, 2, 5) ] \
+                    + [100]
+                    
+class Histogram:
+    
+    """The distribution of a set of durations, in seconds.
+    
+    Durations are counted in buckets bounded by 1, 2 and 5 times each power
+    of ten from 10us to 100s, so percentiles are only accurate to the bucket
+    they fall in.
+    
+    >>> h = Histogram()
+    >>> for d in (0.003, 0.004, 0.012, 0.3): h.add(d)
+    >>> h.count, h.min, h.max
+    (4, 0.003, 0.3)
+    >>> h.percentile(50), h.percentile(100)
+    (0.005, 0.3)
+    
+    Attributes:
+        count  -- the number of durations added
+        total  -- their sum
+        min    -- the shortest, or None if none have been added
+        max    -- the longest, or None if none have been added
+        counts -- the number of durations in each bucket
+        
+    """
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.counts = [0] * (len(_HISTOGRAM_BOUNDS) + 1)
+        
+    def add(self, duration):
+        """Count another duration."""
+        self.counts[bisect_left(_HISTOGRAM_BOUNDS, duration)] += 1
+        self.count += 1
+        self.total += duration
+        if self.min is None or duration < self.min: self.min = duration
+        if self.max is None or duration > self.max: self.max = duration
+        
+    def mean(self):
+        """Return the mean duration, or None if none have been added."""
+        if not self.count: return None
+        return self.total / self.count
+        
+    def percentile(self, p):
+        """Return an upper bound on the pth percentile duration, or None if 
+        none have been added."""
+        if not self.count: return None
+        
+        rank = max(1, int(ceil(self.count * p / 100.0)))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank: break
+            
+        if i < len(_HISTOGRAM_BOUNDS): 
+            return min(_HISTOGRAM_BOUNDS[i], self.max)
+        return self.max
+        
+    def __str__(self):
+        if not self.count: return "count=0"
+        return "count=%i mean=%.2fms p50=%.2fms p90=%.2fms p99=%.2fms " \
+               "max=%.2fms" % (self.count, self.mean() * 1000, 
+                               self.percentile(50) * 1000,
+                               self.percentile(90) * 1000,
+                               self.percentile(99) * 1000, self.max * 1000)
+                               
+# the phases of a call recorded by CallMetrics, in the order they happen
+_CALL_PHASES = ('detect', 'format', 'queue', 'connect', 'request', 'send', 
+                'wait', 'read', 'inflate', 'parse', 'build', 'total')
+                
+class CallMetrics:
+    
+    """Collects the time taken by each phase of the API calls made by a 
+    proxy, and the number of bytes downloaded.
+    
+    The phases of a call, recorded against its SOAP action, are
+    
+        detect  -- from an opportunity being detected to its bets being ready
+                   to send (ArmedBets.fire only)
+        format  -- filling in the request envelope
+        queue   -- waiting for the throttle, or for a connection (asynchronous
+                   proxies only)
+        connect -- opening a new connection, including the TLS handshake
+        send    -- sending the request
+        wait    -- waiting for the response to start arriving
+        read    -- reading the rest of the response
+        inflate -- decompressing the response
+        parse   -- parsing the response XML
+        build   -- building the response object from the XML
+        total   -- the whole call
+        
+    connect is only recorded for calls that needed a new connection. When 
+    httplib2 is installed it makes the request itself, so connect, send, 
+    wait, read and inflate are recorded as a single request phase instead, 
+    and the downloaded byte counts are those after decompression.
+    
+    Any object with the same record and addBytes methods can be given to a
+    proxy in place of a CallMetrics, e.g. to pass the timings on to a 
+    monitoring system.
+    
+    Attributes:
+        histograms -- dict of (action, phase) to Histogram
+        bytes      -- dict of action to [downloaded, expanded] byte counts
+        
+    """
+    def __init__(self):
+        self.histograms = {}
+        self.bytes = {}
+        self._lock = threading.Lock()
+        
+    def record(self, action, phase, duration):
+        """Record the seconds a phase of a call performing action took."""
+        self._lock.acquire()
+        try:
+            histogram = self.histograms.get((action, phase))
+            if histogram is None: 
+                histogram = self.histograms[(action, phase)] = Histogram()
+            histogram.add(duration)
+        finally:
+            self._lock.release()
+            
+    def addBytes(self, action, downloaded, expanded):
+        """Record the size of a response to a call performing action, as 
+        downloaded and once decompressed."""
+        self._lock.acquire()
+        try:
+            counts = self.bytes.setdefault(action, [0, 0])
+            counts[0] += downloaded
+            counts[1] += expanded
+        finally:
+            self._lock.release()
+            
+    def getHistogram(self, action, phase):
+        """Return the Histogram for a phase of the calls performing action,
+        or None if there haven't been any."""
+        return self.histograms.get((action, phase))
+        
+    def getDownloadStats(self):
+        """Return the total bytes downloaded and what they expanded to, as
+        a (downloaded, expanded) tuple."""
+        self._lock.acquire()
+        try:
+            return (sum([ counts[0] for counts in self.bytes.values() ]),
+                    sum([ counts[1] for counts in self.bytes.values() ]))
+        finally:
+            self._lock.release()
+            
+    def clear(self):
+        """Forget everything recorded so far."""
+        self._lock.acquire()
+        try:
+            self.histograms = {}
+            self.bytes = {}
+        finally:
+            self._lock.release()
+            
+    def __str__(self):
+        self._lock.acquire()
+        try:
+            keys = self.histograms.keys()
+            keys.sort(key=lambda (action, phase): 
+                        (action, phase in _CALL_PHASES and 
+                                 _CALL_PHASES.index(phase) or 0, phase))
+            lines = [ "%s %s: %s" % (key + (self.histograms[key],)) 
+                      for key in keys ]
+            lines.extend([ "%s bytes: downloaded %i, expanded to %i" % \
+                           (action, self.bytes[action][0], 
+                            self.bytes[action][1]) 
+                           for action in sorted(self.bytes) ])
+        finally:
+            self._lock.release()
+        return '\n'.join(lines)
+        
+class CaptureFile:
+    
+    """An append-only file of the SOAP traffic of one or more proxies.
+    
+    Each call is written as a header line holding the time it completed, 
+    its SOAP action and the lengths of its request envelope and response 
+    body, followed by the envelope and the response body themselves. The 
+    response body is stored as it was handed to the parser, i.e. after any
+    decompression. A record cut short, e.g. by a crash, ends the file when
+    it is read back.
+    
+    A capture can be shared by several proxies and threads, and is opened for
+    writing when the first call is captured. The password in a login 
+    envelope is left out.
+    
+    A call the proxies can't capture, e.g. because the disk is full, is still
+    returned to the caller, as it has already been made; the error is kept in
+    lastError instead.
+    
+    Attributes:
+        path      -- the capture file
+        failures  -- the number of calls that couldn't be captured
+        lastError -- the exception raised by the last of them, or None
+        
+    """
+    def __init__(self, path):
+        """Initialise a new instance.
+        
+        path -- the capture file
+        
+        """
+        self.path = path
+        self.failures = 0
+        self.lastError = None
+        self._file = None
+        self._lock = threading.Lock()
+        
+    def write(self, action, envelope, responseBody, timestamp=None):
+        """Append a call to the capture."""
+        if timestamp is None: timestamp = time()
+        envelope = _redact_password(_encode_envelope(envelope))
+        responseBody = _encode_envelope(responseBody)
+        record = "%.6f %s %i %i\n%s%s\n" % (timestamp, action, len(envelope),
+                                            len(responseBody), envelope, 
+                                            responseBody)
+        self._lock.acquire()
+        try:
+            if self._file is None: self._file = open(self.path, 'ab')
+            self._file.write(record)
+            self._file.flush()
+        finally:
+            self._lock.release()
+            
+    def records(self):
+        """Read the capture back, yielding a (timestamp, action, envelope, 
+        responseBody) tuple for each call, oldest first."""
+        f = open(self.path, 'rb')
+        try:
+            while True:
+                header = f.readline()
+                fields = header.split()
+                if len(fields) != 4: return
+                
+                timestamp, action = float(fields[0]), fields[1]
+                envelope = f.read(int(fields[2]))
+                responseBody = f.read(int(fields[3]))
+                if len(responseBody) < int(fields[3]) or f.read(1) != '\n': 
+                    return
+                    
+                yield timestamp, action, envelope, responseBody
+        finally:
+            f.close()
+            
+    def close(self):
+        """Close the file, if it has been opened for writing."""
+        self._lock.acquire()
+        try:
+            if self._file: self._file.close()
+            self._file = None
+        finally:
+            self._lock.release()
+            
+def _redact_password(envelope):
+    """Return an envelope with the contents of its password element, if it 
+    has one, left out.
+    
+    >>> _redact_password('<username>u</username><password>p</password>')
+    '<username>u</username><password></password>'
     
     """
-    if handicap == 0: return '0'
-    elif handicap == floor(handicap): return "%.1f" % (handicap,)
-    else: return str(handicap)
+    start = envelope.find('<password>')
+    if start < 0: return envelope
+    end = envelope.find('</password>', start)
+    if end < 0: return envelope[:start]
+    return envelope[:start + len('<password>')] + envelope[end:]
     
-def _format_double_line_profit(from_, to, unit):
-    """Helper function for formatting Asian Handicap profit and loss data.
+class ReplayError(Exception):
     
-    >>> _format_double_line_profit(Decimal("-INF"), Decimal("-4"), "goal")
-    'lose by more than 3 goals'
-    >>> _format_double_line_profit(Decimal("-INF"), Decimal("-1"), "goal")
-    'lose'
-    >>> _format_double_line_profit(Decimal("-INF"), Decimal("0.0"), "goal")
-    'lose or draw'
-    >>> _format_double_line_profit(Decimal("-INF"), Decimal("2"), "goal")
-    'do not win by 3 goals or more'
-    >>> _format_double_line_profit(Decimal("0"), Decimal("INF"), "goal")
-    'win or draw'
-    >>> _format_double_line_profit(Decimal("1"), Decimal("INF"), "goal")
-    'win'
-    >>> _format_double_line_profit(Decimal("3"), Decimal("INF"), "goal")
-    'win by at least 3 goals'
-    >>> _format_double_line_profit(Decimal("0"), Decimal("0"), "goal")
-    'draw'
-    >>> _format_double_line_profit(Decimal("2"), Decimal("2"), "goal")
-    'win by 2 goals'
-    >>> _format_double_line_profit(Decimal("-1"), Decimal("-1"), "goal")
-    'lose by 1 goal'
+    """Raised by a ReplayTransport that has no response to a call.
     
+    Attributes:
+        action -- the SOAP action of the call
+        
     """
-    result = ""
-    if from_ == negInf:
-        handicap = abs(to + 1).to_integral()
-        myUnit = handicap == 1 and unit or unit + "s"
-        if to < 0:
-            if handicap > 0:
-                result = "lose by more than %i %s" % (handicap, myUnit)
-            else:
-                result = "lose"
-        elif to == 0: result = "lose or draw"
-        else: result = "do not win by %i %s or more" % (handicap, myUnit)
-    elif to == Inf:
-        if from_ == 0: result = "win or draw"
-        elif from_ == 1: result = "win"
-        else:
-            handicap = abs(from_).to_integral()
-            myUnit = handicap == 1 and unit or unit + "s"
-            result = "win by at least %i %s" % (handicap, myUnit)
-    elif from_ == to:
-        handicap = abs(to).to_integral()
-        myUnit = handicap == 1 and unit or unit + "s"
-        if from_ == 0: result = "draw"
-        elif from_ > 0: result = "win by %i %s" % (handicap, myUnit)
-        elif from_ < 0: result = "lose by %i %s" % (handicap, myUnit)
+    def __init__(self, action):
+        Exception.__init__(self, "No captured response left for %s" % \
+            (action,))
+        self.action = action
+        
+class ReplayTransport:
     
-    return result
+    """Serves the responses in a CaptureFile in place of the Betfair API.
     
+    The responses to each SOAP action are served in the order they were 
+    captured, whatever the request, and as fast as they are asked for. Once
+    the responses to an action run out, ReplayError is raised, unless loop 
+    is True, in which case they are served again from the start.
     
+    A proxy replays a capture when given one, e.g.
+    
+        replay = ReplayTransport(CaptureFile('incident.capture'))
+        exchange = BFExchangeService(replay=replay)
+        
+    """
+    def __init__(self, capture, loop=False):
+        """Initialise a new instance.
+        
+        capture -- the CaptureFile to replay
+        loop    -- serve the responses again once they run out (default 
+                   False)
+                   
+        """
+        self.loop = loop
+        
+        # action -> list of response bodies, and the index of the next one 
+        self._responses = {}
+        self._next = {}
+        for timestamp, action, envelope, responseBody in capture.records():
+            self._responses.setdefault(action, []).append(responseBody)
+            self._next[action] = 0
+        self._lock = threading.Lock()
+        
+    def getResponse(self, action):
+        """Return the next response body captured for action."""
+        self._lock.acquire()
+        try:
+            responses = self._responses.get(action)
+            if not responses: raise ReplayError(action)
+            
+            i = self._next[action]
+            if i == len(responses):
+                if not self.loop: raise ReplayError(action)
+                i = 0
+            self._next[action] = i + 1
+            return responses[i]
+        finally:
+            self._lock.release()
+            
 class HttpHelper:
     def __init__(self, debuglevel=0, hostname='api.betfair.com', secure=True,
-                compressed=False):
+                compressed=False, pool=None, parser='minidom', throttle=None,
+                metrics=None, capture=None, replay=None):
         self.debuglevel = debuglevel
         self.hostname = hostname
         self.secure = secure
         self.compressed = compressed
+        self.throttle = throttle
+        self.metrics = metrics
+        
+        # write the traffic to a CaptureFile, or serve it from a 
+        # ReplayTransport instead of Betfair
+        self.capture = capture
+        self.replay = replay
+        
+        # 'minidom' builds a full DOM, 'expat' a lighter indexed tree that the
+        # response classes can walk much more cheaply
+        if parser not in _PARSERS:
+            raise ValueError("Unknown parser '%s', expected one of %s" % \
+                (parser, _PARSERS.keys()))
+        self.parser = parser
+        self._parse = _PARSERS[parser]
         
         # if we have httplib2, we want to take advantage of HTTP persistence
-        # so we create a connection object to reuse. If we don't have httplib2
-        # we'll just create a new connection each time (painful)
+        # so we create a connection object to reuse (one per thread, as they 
+        # can't be shared). If we don't have httplib2 we check persistent 
+        # connections out of a pool instead
         if httplib2:
             httplib2.debuglevel = debuglevel
-            self.conn = None
+            self._local = threading.local()
+        else:
+            self.pool = pool or DEFAULT_CONNECTION_POOL
         
     def makeRequest(self, url, envelope, action):
         """Post specified SOAP envelope to Betfair.
         
-        Creates an HTTP(S) connection to the configured hostname and
-        performs an HTTP POST to submit the envelope. Returns the server
-        response parsed into an xml doc.
+        Creates an HTTP(S) connection to the configured hostname (or reuses
+        a pooled one) and performs an HTTP POST to submit the envelope. 
+        Returns the server response parsed into an xml doc. If the helper 
+        has a ReplayTransport, the response comes from that instead.
         
         env    -- the SOAP envelope to post
         action -- the SOAP action being performed
         
         """
-        # headers
+        metrics = self.metrics
+        envelope = _encode_envelope(envelope)
+        
+        # wait for the throttle to let the request through (replayed 
+        # requests never reach Betfair, so are not throttled)
+        if self.throttle and not self.replay: 
+            started = time()
+            self.throttle.acquire(action)
+            if metrics: metrics.record(action, 'queue', time() - started)
+        
+        headers = self._makeHeaders(action)
+        
+        # create connection (secure if necessary)
+        if self.replay:
+            responseBody = self.replay.getResponse(action)
+        elif httplib2:
+            conn = getattr(self._local, 'conn', None)
+            if not conn: conn = self._local.conn = httplib2.Http()
+            requestUrl = urljoin((self.secure and "https://" or "http://") +
+                                                            self.hostname, url)
+            started = time()
+            resp, responseBody = conn.request(requestUrl, "POST", 
+                                                            envelope, headers)
+            if metrics:
+                metrics.record(action, 'request', time() - started)
+                metrics.addBytes(action, len(responseBody), len(responseBody))
+        else:
+            responseBody = self._pooledRequest(url, envelope, headers, action)
+            
+        if self.capture: self._capture(action, envelope, responseBody)
+                
+        # create XML doc from response string
+        if self.debuglevel > 2: print responseBody
+        started = time()
+        x = self._parse(responseBody)
+        if metrics: metrics.record(action, 'parse', time() - started)
+        return x
+        
+    def _capture(self, action, envelope, responseBody):
+        """Write a call to the capture. The call has already been made, so 
+        a failure to capture it is kept on the capture rather than raised."""
+        try:
+            self.capture.write(action, envelope, responseBody)
+        except Exception, e:
+            self.capture.failures += 1
+            self.capture.lastError = e
+            
+    def _makeHeaders(self, action):
+        """Return the HTTP headers for a request performing action."""
         headers = {
             'Content-Type':'text/xml',
             'SOAPAction':'urn:%s' % (action,),
             'User-Agent':'pybetfair/%s' % (_VERSION,),
+            'Connection':'keep-alive',
         }
         if self.compressed: headers['Accept-Encoding'] = 'gzip, deflate'
+        return headers
         
-        # create connection (secure if necessary)
-        if httplib2:
-            if not self.conn: self.conn = httplib2.Http()
-            requestUrl = urljoin((self.secure and "https://" or "http://") +
-                                                            self.hostname, url)
-            resp, responseBody = self.conn.request(requestUrl, "POST", 
-                                                            envelope, headers)
-        else:
-            conn = self.secure and HTTPSConnection(self.hostname) or \
-                                    HTTPConnection(self.hostname)
-            conn.debuglevel = self.debuglevel
+    def _pooledRequest(self, url, envelope, headers, action=None):
+        """Post the envelope over a pooled connection and return the body.
+        
+        If the request can't be sent over a reused connection, which the 
+        server may have dropped, it is sent once more on a new connection. 
+        Once a request has been sent it is never sent again, as the server 
+        may already have acted on it (e.g. placed its bets), so any failure 
+        to read the response is raised to the caller, as are failures on a
+        new connection.
+        
+        """
+        metrics = self.metrics
+        retried = False
+        while True:
+            conn, reused = self.pool.getConnection(self.hostname, self.secure)
+            conn.set_debuglevel(self.debuglevel)
             
             # post the envelope
-            conn.request("POST", url, envelope, headers)
-            
-            # parse and return the server response, and close the connection
-            response = conn.getresponse()
-            responseBody = response.read()
+            try:
+                # connect first, so the handshake is timed apart from the send
+                started = time()
+                if conn.sock is None:
+                    _connect(conn)
+                    connected = time()
+                    if metrics: 
+                        metrics.record(action, 'connect', connected - started)
+                    started = connected
+                    
+                conn.request("POST", url, envelope, headers)
+            except (socket.error, HTTPException):
+                conn.close()
+                if reused and not retried:
+                    retried = True
+                    continue
+                raise
+            sent = time()
+                
+            try:
+                response = conn.getresponse()
+                waited = time()
+                responseBody = response.read()
+            except:
+                conn.close()
+                raise
+            read = time()
+                
+            # keep the connection for next time unless the server is closing it
+            if response.will_close: conn.close()
+            else: self.pool.releaseConnection(self.hostname, self.secure, conn)
     
             # decompress if necessary
-            if response.getheader('Content-Encoding') == "gzip":
-                compressedStream = StringIO(responseBody)
-                gzipper = GzipFile(fileobj=compressedStream)
-                responseBody = gzipper.read()
+            downloaded = len(responseBody)
+            compressed = response.getheader('Content-Encoding') == "gzip"
+            if compressed:
+                responseBody = _gunzip(responseBody)
+                
+            if metrics:
+                metrics.record(action, 'send', sent - started)
+                metrics.record(action, 'wait', waited - sent)
+                metrics.record(action, 'read', read - waited)
+                if compressed: metrics.record(action, 'inflate', time() - read)
+                metrics.addBytes(action, downloaded, len(responseBody))
+                
+            return responseBody
+            
+def _gunzip(data):
+    """Decompress a gzip encoded response body."""
+    compressedStream = StringIO(data)
+    gzipper = GzipFile(fileobj=compressedStream)
+    return gzipper.read()
+
+class AsyncResult:
+    
+    """The eventual result of an asynchronous call.
+    
+    Callbacks added with addCallback are called with the AsyncResult once the
+    call completes, either with a value or with the exception that stopped it
+    completing.
+    
+    """
+    def __init__(self):
+        self._callbacks = []
+        self._done = False
+        self._value = None
+        self._error = None
+        
+    def done(self):
+        """Return True if the call has completed."""
+        return self._done
+        
+    def result(self):
+        """Return the value of the call, or raise the exception that stopped
+        it completing."""
+        if not self._done: raise RuntimeError("The call has not completed")
+        if self._error is not None: raise self._error
+        return self._value
+        
+    def addCallback(self, func):
+        """Call func with this AsyncResult once the call has completed (or 
+        straight away if it already has)."""
+        if self._done: func(self)
+        else: self._callbacks.append(func)
+        
+    def setResult(self, value):
+        self._complete(value, None)
+        
+    def setError(self, error):
+        self._complete(None, error)
+        
+    def _complete(self, value, error):
+        if self._done: return
+        self._done = True
+        self._value = value
+        self._error = error
+        
+        callbacks = self._callbacks
+        self._callbacks = []
+        for func in callbacks: func(self)
+        
+def _chain(source, func):
+    """Return an AsyncResult for func applied to the value of source. If func
+    returns an AsyncResult, the one returned completes with it.
+    
+    >>> source = AsyncResult()
+    >>> result = _chain(source, int)
+    >>> source.setResult('42')
+    >>> result.result()
+    42
+    >>> inner = AsyncResult()
+    >>> result = _chain(source, lambda value: inner)
+    >>> result.done()
+    False
+    >>> inner.setResult(43)
+    >>> result.result()
+    43
+    
+    """
+    result = AsyncResult()
+    
+    def complete(source):
+        try:
+            value = func(source.result())
+        except Exception, e:
+            result.setError(e)
+        else:
+            if isinstance(value, AsyncResult):
+                value.addCallback(lambda value: 
+                                  result._complete(value._value, value._error))
+            else:
+                result.setResult(value)
+            
+    source.addCallback(complete)
+    return result
+    
+class Timer:
+    
+    """A call scheduled with EventLoop.callLater."""
+    
+    def __init__(self, when, func, args):
+        self.when = when
+        self.func = func
+        self.args = args
+        self.cancelled = False
+        
+    def cancel(self):
+        """Stop the call being made, if it hasn't been already."""
+        self.cancelled = True
+        
+    def _fire(self):
+        if not self.cancelled: self.func(*self.args)
+        
+class EventLoop:
+    
+    """Runs asynchronous requests and timers in the calling thread.
+    
+    The sockets of any number of asynchronous proxies are run by asyncore,
+    so thousands of requests can be in flight at once without a thread for
+    each.
+    
+    >>> loop = EventLoop()
+    >>> calls = []
+    >>> timer = loop.callLater(0.02, calls.append, 'later')
+    >>> timer = loop.callLater(0.01, calls.append, 'sooner')
+    >>> loop.runUntilComplete(loop.sleep(0.03))
+    >>> calls
+    ['sooner', 'later']
+    
+    """
+    def __init__(self):
+        # asyncore socket map, fileno -> dispatcher
+        self.map = {}
+        self._timers = []
+        self._sequence = 0
+        self._stopped = False
+        
+        # poll scales to many more sockets than select, where it's available
+        self._poll = hasattr(asyncore.select, 'poll') and asyncore.poll2 \
+            or asyncore.poll
+            
+    def callLater(self, delay, func, *args):
+        """Call func(*args) after delay seconds. Returns a Timer that can be
+        used to cancel the call."""
+        timer = Timer(time() + delay, func, args)
+        self._sequence += 1
+        heapq.heappush(self._timers, (timer.when, self._sequence, timer))
+        return timer
+        
+    def sleep(self, delay):
+        """Return an AsyncResult that completes after delay seconds."""
+        result = AsyncResult()
+        self.callLater(delay, result.setResult, None)
+        return result
+        
+    def gather(self, results):
+        """Return an AsyncResult for a list of the values of results.
+        
+        The list is in the same order as results, and is available once they
+        have all completed. If any of them fails, the returned AsyncResult 
+        fails with the same exception.
+        
+        >>> loop = EventLoop()
+        >>> first, second = AsyncResult(), AsyncResult()
+        >>> gathered = loop.gather([first, second])
+        >>> second.setResult(2); first.setResult(1)
+        >>> gathered.result()
+        [1, 2]
+        
+        """
+        results = list(results)
+        gathered = AsyncResult()
+        remaining = [len(results)]
+        
+        def complete(result):
+            if result._error is not None:
+                gathered.setError(result._error)
+                return
+                
+            remaining[0] -= 1
+            if not remaining[0]:
+                gathered.setResult([ result._value for result in results ])
+                
+        if not results: gathered.setResult([])
+        for result in results: result.addCallback(complete)
+        return gathered
+        
+    def spawn(self, generator):
+        """Run a generator as a coroutine.
+        
+        The generator yields AsyncResults (or lists of them, which are 
+        gathered) and is resumed with their values once they complete, or has
+        the exception thrown into it if they fail. Returns an AsyncResult that
+        completes when the generator finishes.
+        
+        >>> loop = EventLoop()
+        >>> def poll(count):
+        ...     for i in range(count):
+        ...         values = yield [ loop.sleep(0.001), loop.sleep(0.002) ]
+        ...         print i, values
+        >>> loop.runUntilComplete(loop.spawn(poll(2)))
+        0 [None, None]
+        1 [None, None]
+        
+        """
+        finished = AsyncResult()
+        
+        def resume(result):
+            step(result._value, result._error)
+            
+        def step(value, error):
+            try:
+                if error is not None: yielded = generator.throw(error)
+                else: yielded = generator.send(value)
+            except StopIteration:
+                finished.setResult(None)
+                return
+            except Exception, e:
+                finished.setError(e)
+                return
+                
+            if isinstance(yielded, list): yielded = self.gather(yielded)
+            
+            # don't recurse through results that have already completed
+            if yielded.done(): self.callLater(0, resume, yielded)
+            else: yielded.addCallback(resume)
+            
+        step(None, None)
+        return finished
+        
+    def runOnce(self, timeout=30.0):
+        """Make the timer calls that are due, then wait up to timeout seconds
+        (less if a timer is due sooner) for socket events and handle them."""
+        now = time()
+        last = self._sequence
+        while self._timers and self._timers[0][0] <= now \
+                                        and self._timers[0][1] <= last:
+            when, sequence, timer = heapq.heappop(self._timers)
+            timer._fire()
+            
+        if self._timers:
+            timeout = max(0, min(timeout, self._timers[0][0] - time()))
+            
+        if self.map: self._poll(timeout, self.map)
+        elif timeout: sleep(timeout)
+        
+    def run(self):
+        """Run the loop until stop is called."""
+        self._stopped = False
+        while not self._stopped: self.runOnce()
+        
+    def runUntilComplete(self, result):
+        """Run the loop until result completes, then return its value (or
+        raise its exception)."""
+        while not result.done(): self.runOnce()
+        return result.result()
+        
+    def stop(self):
+        """Stop the loop once the current iteration has finished."""
+        self._stopped = True
+        
+# shared by all asynchronous proxies that aren't given a loop of their own
+DEFAULT_EVENT_LOOP = EventLoop()
+
+class _AsyncRequest:
+    def __init__(self, data, action=None):
+        self.data = data
+        self.action = action
+        self.result = AsyncResult()
+        self.timer = None
+        self.queued = time()
+        
+class AsyncHttpConnection(asyncore.dispatcher):
+    
+    """A non-blocking persistent HTTP(S) connection, run by an EventLoop.
+    
+    Sends one request at a time and parses the response itself, as httplib
+    can't be used without blocking.
+    
+    """
+    def __init__(self, helper, address, secure):
+        asyncore.dispatcher.__init__(self, map=helper.loop.map)
+        self.helper = helper
+        self.secure = secure
+        self.reused = False
+        self.released = time()
+        self.closed = False
+        self._sent = False
+        self._handshaking = False
+        self._outbuf = ''
+        self._request = None
+        self._resetResponse()
+        
+        # when the last phase of the request in flight ended
+        self._mark = time()
+        
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.connect(address)
+        
+    def startRequest(self, request):
+        """Send a request, and read its response once it arrives."""
+        self._request = request
+        self._outbuf = request.data
+        self._sent = False
+        
+        metrics = self.helper.metrics
+        if metrics: 
+            metrics.record(request.action, 'queue', time() - request.queued)
+        
+        # don't wait for the next poll if the request can go straight away
+        if self.connected and not self._handshaking:
+            self._mark = time()
+            try:
+                self.handle_write()
+            except:
+                self.handle_error()
+                
+    def close(self):
+        self.closed = True
+        asyncore.dispatcher.close(self)
+        
+    def readable(self):
+        return True
+        
+    def writable(self):
+        return not self.connected or self._handshaking or len(self._outbuf) > 0
+        
+    def handle_connect(self):
+        if self.secure:
+            self.socket = ssl.wrap_socket(self.socket, 
+                                          do_handshake_on_connect=False)
+            self._handshaking = True
+            self._handshake()
+        else:
+            self._record('connect')
+            
+    def handle_write(self):
+        if self._handshaking:
+            self._handshake()
+        elif self._outbuf:
+            sent = self._send(self._outbuf)
+            if sent: self._sent = True
+            self._outbuf = self._outbuf[sent:]
+            if not self._outbuf: self._record('send')
+            
+    def handle_read(self):
+        if self._handshaking:
+            self._handshake()
+            return
+            
+        while True:
+            data = self._recv()
+            if data is None: break
+            if not data:
+                self.handle_close()
+                return
+                
+            if not self._received: self._record('wait')
+            self._inbuf += data
+            self._received = True
+            
+            # decrypted data waiting in the SSL layer won't wake up poll
+            if not (self.secure and self.socket.pending()): break
+            
+        self._parseResponse()
+        
+    def handle_close(self):
+        # poll can report a hang up after the read that found it
+        if self.closed: return
+        
+        # a response with no length is ended by the server closing
+        if self._request and self._headers is not None \
+                            and not self._chunked and self._length is None:
+            self._finish(self._inbuf)
+            return
+            
+        # a reused connection the server has dropped since it was last used 
+        # can close before the request is sent, in which case it can be sent
+        # again. Once any of it has been sent it never is, as the server may 
+        # already have acted on it
+        self.abandon(socket.error(errno.ECONNRESET, 'Connection closed'),
+                     self.reused and not self._sent)
+        
+    def handle_error(self):
+        self.abandon(sys.exc_info()[1], self.reused and not self._sent)
+        
+    def handle_expt(self):
+        self.handle_close()
+        
+    def abandon(self, error, retry=False):
+        """Close the connection, failing the request in flight with error (or
+        sending it again on another connection if retry is True)."""
+        request = self._request
+        self._request = None
+        self.close()
+        self.helper._lost(self, request, error, retry)
+        
+    def _handshake(self):
+        try:
+            self.socket.do_handshake()
+        except ssl.SSLError, err:
+            if err.args[0] in (ssl.SSL_ERROR_WANT_READ, 
+                               ssl.SSL_ERROR_WANT_WRITE):
+                return
+            raise
+        self._handshaking = False
+        self._record('connect')
+        
+    def _recv(self):
+        """Return the data read from the socket, '' if the connection has been
+        closed or None if there was nothing to read."""
+        try:
+            return self.socket.recv(65536)
+        except socket.error, err:
+            if ssl and isinstance(err, ssl.SSLError):
+                if err.args[0] == ssl.SSL_ERROR_WANT_READ: return None
+                if err.args[0] == ssl.SSL_ERROR_ZERO_RETURN: return ''
+                raise
+            if err.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN): return None
+            if err.args[0] in (errno.ECONNRESET, errno.ENOTCONN, 
+                               errno.ESHUTDOWN, errno.ECONNABORTED): return ''
+            raise
+            
+    def _send(self, data):
+        """Return the number of bytes of data written to the socket."""
+        try:
+            return self.socket.send(data)
+        except socket.error, err:
+            if ssl and isinstance(err, ssl.SSLError):
+                if err.args[0] == ssl.SSL_ERROR_WANT_WRITE: return 0
+                raise
+            if err.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN): return 0
+            raise
+            
+    def _record(self, phase):
+        """Record the time since the last phase ended as the given phase of 
+        the request in flight."""
+        now = time()
+        metrics = self.helper.metrics
+        if metrics and self._request: 
+            metrics.record(self._request.action, phase, now - self._mark)
+        self._mark = now
+        
+    def _resetResponse(self):
+        self._inbuf = ''
+        self._received = False
+        self._headers = None
+        self._willClose = False
+        self._length = None
+        self._chunked = False
+        self._chunks = []
+        
+    def _parseResponse(self):
+        # nothing should arrive on an idle connection, so give up on it
+        if self._request is None:
+            self.abandon(None)
+            return
+            
+        if self._headers is None:
+            end = self._inbuf.find('\r\n\r\n')
+            if end < 0: return
+            
+            lines = self._inbuf[:end].split('\r\n')
+            self._inbuf = self._inbuf[end + 4:]
+            
+            headers = {}
+            for line in lines[1:]:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+            self._headers = headers
+            
+            version = lines[0].split(None, 1)[0]
+            connection = headers.get('connection', '').lower()
+            self._willClose = connection == 'close' or \
+                (version == 'HTTP/1.0' and connection != 'keep-alive')
+                
+            if headers.get('transfer-encoding', '').lower() == 'chunked':
+                self._chunked = True
+            elif 'content-length' in headers:
+                self._length = int(headers['content-length'])
+            else:
+                self._willClose = True
+                
+        if self._chunked:
+            body = self._readChunks()
+            if body is None: return
+        elif self._length is not None:
+            if len(self._inbuf) < self._length: return
+            body = self._inbuf[:self._length]
+        else:
+            return
+            
+        self._finish(body)
+        
+    def _readChunks(self):
+        """Return the body of a chunked response, or None if it hasn't all
+        arrived yet."""
+        while True:
+            end = self._inbuf.find('\r\n')
+            if end < 0: return None
+            
+            size = int(self._inbuf[:end].split(';')[0], 16)
+            if size == 0:
+                # skip any trailers
+                end = self._inbuf.find('\r\n\r\n', end)
+                if end < 0: return None
+                return ''.join(self._chunks)
+                
+            if len(self._inbuf) < end + size + 4: return None
+            self._chunks.append(self._inbuf[end + 2:end + size + 2])
+            self._inbuf = self._inbuf[end + size + 4:]
+            
+    def _finish(self, body):
+        request = self._request
+        self._record('read')
+        
+        downloaded = len(body)
+        if self._headers.get('content-encoding') == 'gzip':
+            body = _gunzip(body)
+            self._record('inflate')
+            
+        metrics = self.helper.metrics
+        if metrics: metrics.addBytes(request.action, downloaded, len(body))
+            
+        if self._willClose: self.close()
+        self._request = None
+        self._resetResponse()
+        self.helper._release(self, request, body)
+        
+class AsyncHttpHelper(HttpHelper):
+    
+    """Posts SOAP envelopes to Betfair without blocking.
+    
+    makeRequest returns an AsyncResult for the parsed response instead of the
+    response itself, and the request is run by an EventLoop over a pool of
+    persistent connections. At most maxConnections requests are in flight at
+    once; any more are queued until a connection is free.
+    
+    """
+    def __init__(self, loop=None, debuglevel=0, hostname='api.betfair.com', 
+                secure=True, compressed=False, parser='minidom', 
+                maxConnections=64, timeout=30, idleTimeout=60, throttle=None,
+                metrics=None, capture=None, replay=None):
+        HttpHelper.__init__(self, debuglevel, hostname, secure, compressed,
+                            None, parser, throttle, metrics, capture, replay)
+        if secure and not ssl:
+            raise ValueError("Secure asynchronous connections need the ssl " 
+                             "module (Python 2.6 or later)")
+                             
+        self.loop = loop or DEFAULT_EVENT_LOOP
+        self.maxConnections = maxConnections
+        self.timeout = timeout
+        self.idleTimeout = idleTimeout
+        
+        if ':' in hostname:
+            host, port = hostname.split(':')
+            self._address = (host, int(port))
+        else:
+            self._address = (hostname, secure and 443 or 80)
+            
+        self._idle = []
+        self._active = 0
+        self._queue = deque()
+        
+    def makeRequest(self, url, envelope, action):
+        """Post specified SOAP envelope to Betfair.
+        
+        Returns an AsyncResult for the server response parsed into an xml 
+        doc.
+        
+        env    -- the SOAP envelope to post
+        action -- the SOAP action being performed
+        
+        """
+        envelope = _encode_envelope(envelope)
+        
+        def parse(responseBody):
+            if self.capture: self._capture(action, envelope, responseBody)
+            return self._parseBody(responseBody, action)
+            
+        # replayed responses are ready straight away
+        if self.replay:
+            result = AsyncResult()
+            try:
+                result.setResult(self.replay.getResponse(action))
+            except ReplayError, e:
+                result.setError(e)
+            return _chain(result, parse)
+            
+        headers = self._makeHeaders(action)
+        headers['Host'] = self.hostname
+        headers['Content-Length'] = str(len(envelope))
+        
+        request = _AsyncRequest('POST %s HTTP/1.1\r\n%s\r\n%s' % (url, 
+            ''.join([ '%s: %s\r\n' % header for header in headers.items() ]),
+            envelope), action)
+        self._submit(request, action)
+        
+        return _chain(request.result, parse)
+        
+    def _submit(self, request, action):
+        """Queue a request once the throttle lets it through."""
+        if self.throttle:
+            try:
+                delay = self.throttle.tryAcquire(action)
+            except ThrottleExceeded, e:
+                request.result.setError(e)
+                return
+                
+            if delay:
+                self.loop.callLater(delay, self._submit, request, action)
+                return
                 
-            conn.close()
+            # bets go to the front of the queue for a connection
+            if self.throttle.isPriority(action):
+                self._queue.appendleft(request)
+                self._dispatch()
+                return
                 
+        self._queue.append(request)
+        self._dispatch()
+        
+    def closeAll(self):
+        """Close all idle connections."""
+        idle = self._idle
+        self._idle = []
+        for conn in idle: conn.close()
+        
+    def _parseBody(self, responseBody, action=None):
         # create XML doc from response string
         if self.debuglevel > 2: print responseBody
-        x = parseString(responseBody)
+        started = time()
+        x = self._parse(responseBody)
+        if self.metrics: self.metrics.record(action, 'parse', time() - started)
         return x
+        
+    def _dispatch(self):
+        """Start as many of the queued requests as there are connections 
+        for."""
+        now = time()
+        while self._queue:
+            conn = None
+            while self._idle and conn is None:
+                conn = self._idle.pop()
+                
+                # a request is never sent twice once it has gone out, so a 
+                # connection the server has dropped must be found now
+                if now - conn.released > self.idleTimeout or \
+                                            _is_socket_dropped(conn.socket):
+                    conn.close()
+                    conn = None
+                    
+            if conn is None and self._active >= self.maxConnections: return
+            
+            request = self._queue.popleft()
+            if conn is None:
+                try:
+                    conn = AsyncHttpConnection(self, self._address, 
+                                               self.secure)
+                except socket.error, e:
+                    request.result.setError(e)
+                    continue
+                    
+            self._active += 1
+            request.timer = self.loop.callLater(self.timeout, self._timedOut,
+                                                conn, request)
+            conn.startRequest(request)
+            
+    def _release(self, conn, request, body):
+        """Called by a connection once it has read a response."""
+        self._active -= 1
+        request.timer.cancel()
+        
+        if not conn.closed:
+            conn.reused = True
+            conn.released = time()
+            self._idle.append(conn)
+            
+        request.result.setResult(body)
+        self._dispatch()
+        
+    def _lost(self, conn, request, error, retry):
+        """Called by a connection that has been closed or has failed."""
+        if conn in self._idle: self._idle.remove(conn)
+        if request is None: return
+        
+        self._active -= 1
+        request.timer.cancel()
+        
+        if retry: self._queue.appendleft(request)
+        else: request.result.setError(error)
+        self._dispatch()
+        
+    def _timedOut(self, conn, request):
+        if conn._request is request: conn.abandon(socket.timeout('timed out'))
+        
+    
+def _build_response(metrics, response, action, respClass, started, 
+                    keepXml=None):
+    """Return a parsed response wrapped in respClass, recording the time that
+    took and the time taken by the whole call. The response keeps its xml if
+    keepXml is True, or if it is None and KEEP_RESPONSE_XML is set."""
+    built = time()
+    result = respClass(response)
+    if keepXml is None: keepXml = KEEP_RESPONSE_XML
+    if not keepXml: _discard_xml(result)
+    
+    if metrics:
+        now = time()
+        metrics.record(action, 'build', now - built)
+        if started: metrics.record(action, 'total', now - started)
+    return result
+    
+def _compact_envelope(template, namespace=None):
+    """Strip the layout whitespace from an envelope template, and fill in the 
+    namespace of its request element.
+    
+    >>> _compact_envelope('''
+    ...     <m:keepAlive xmlns:m="%s">
+    ...         <sessionToken>%s</sessionToken>
+    ...     </m:keepAlive>''', 'urn:x')
+    '<m:keepAlive xmlns:m="urn:x"><sessionToken>%s</sessionToken></m:keepAlive>'
+    
+    """
+    template = ' '.join(template.split()).replace('> <', '><')
+    if namespace:
+        template = template.replace('xmlns:m="%s"', 
+                                    'xmlns:m="%s"' % (namespace,))
+    return template
     
 class BFGlobalService:
     
@@ -263,109 +2847,125 @@ class BFGlobalService:
     
     """
     
+    # SOAP request envelopes, shared by every instance. The layout whitespace
+    # is stripped and the namespace filled in once, when the class is defined
+    _getActiveEventTypesEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getActiveEventTypes xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <locale>%s</locale>
+                    </m:request>
+                </m:getActiveEventTypes>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getEventsEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getEvents xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <eventParentId>%i</eventParentId>
+                        <locale>%s</locale>
+                    </m:request>
+                </m:getEvents>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _keepAliveEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:keepAlive xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                    </m:request>
+                </m:keepAlive>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _loginEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:login xmlns:m="%s">
+                    <m:request>
+                        <locationId>0</locationId>
+                        <password>%s</password>
+                        <productId>%i</productId>
+                        <username>%s</username>
+                        <vendorSoftwareId>0</vendorSoftwareId>
+                    </m:request>
+                </m:login>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getSubscriptionInfoEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getSubscriptionInfo xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                    </m:request>
+                </m:getSubscriptionInfo>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
     def __init__(self, debuglevel=0, hostname='api.betfair.com',
                 url='/global/v3/BFGlobalService', secure=True, 
-                compressed=False):
+                compressed=False, pool=None, parser='minidom', throttle=None,
+                metrics=None, capture=None, replay=None, keepXml=None):
                     
         # connection info
-        self.http_helper = HttpHelper(debuglevel, hostname, secure, compressed)
+        self.http_helper = HttpHelper(debuglevel, hostname, secure, compressed,
+                                      pool, parser, throttle, metrics, capture,
+                                      replay)
         self.url = url
+        self.keepXml = keepXml
+        
+    def _call(self, env, action, respClass, started=None):
+        """Post a configured envelope to the service and return the response 
+        wrapped in respClass. started is when the call began, if the time
+        taken should be recorded."""
+        metrics = self.http_helper.metrics
+        if metrics and started: 
+            metrics.record(action, 'format', time() - started)
+        response = self.http_helper.makeRequest(self.url, env, action)
+        return _build_response(metrics, response, action, respClass, started,
+                               self.keepXml)
         
-        # SOAP request envelopes
-        self._getActiveEventTypesEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:getActiveEventTypes xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <locale>%s</locale>
-                        </m:request>
-                    </m:getActiveEventTypes>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-
-        self._getEventsEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:getEvents xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <eventParentId>%i</eventParentId>
-                            <locale>%s</locale>
-                        </m:request>
-                    </m:getEvents>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-        
-        self._keepAliveEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:keepAlive xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                        </m:request>
-                    </m:keepAlive>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-
-        self._loginEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:login xmlns:m="%s">
-                        <m:request>
-                            <locationId>0</locationId>
-                            <password>%s</password>
-                            <productId>%i</productId>
-                            <username>%s</username>
-                            <vendorSoftwareId>0</vendorSoftwareId>
-                        </m:request>
-                    </m:login>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-
-        self._getSubscriptionInfoEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:getSubscriptionInfo xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                        </m:request>
-                    </m:getSubscriptionInfo>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-
     def getActiveEventTypes(self, sessionToken, locale="en_GB"):
         """Retrieve all sports which have at least one associated active or 
         suspended market.
@@ -378,13 +2978,12 @@ class BFGlobalService:
         locale       -- controls the output language (default en_GB)
         
         """
+        started = time()
         # configure the template envelope and make the request
-        env = self._getActiveEventTypesEnvelope % (_EXCHANGE_SOAP_NAMESPACE, 
-                                                   sessionToken, 
+        env = self._getActiveEventTypesEnvelope % (sessionToken, 
                                                    locale)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getActiveEventTypes')
-        return GetEventTypesResp(response)
+        return self._call(env, 'getActiveEventTypes', GetEventTypesResp,
+                          started)
 
     def getEvents(self, sessionToken, eventParentId, locale="en_GB"):
         """Retrieve all events or markets which have the input event id as a parent.
@@ -397,14 +2996,12 @@ class BFGlobalService:
         locale        -- controls the output language (default en_GB)
         
         """
+        started = time()
         # configure the template envelope and make the request
-        env = self._getEventsEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                         sessionToken,
+        env = self._getEventsEnvelope % (sessionToken,
                                          eventParentId,
                                          locale)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getEvents')
-        return GetEventsResp(response)
+        return self._call(env, 'getEvents', GetEventsResp, started)
 
     def keepAlive(self, sessionToken):
         """Sends a heartbeat to prevent a login session expiring.
@@ -415,11 +3012,10 @@ class BFGlobalService:
         sessionToken -- session identifier
         
         """
+        started = time()
         # configure the template envelope and make the request
-        env = self._keepAliveEnvelope % (_EXCHANGE_SOAP_NAMESPACE, sessionToken,)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'keepAlive')
-        return KeepAliveResp(response)
+        env = self._keepAliveEnvelope % (sessionToken,)
+        return self._call(env, 'keepAlive', KeepAliveResp, started)
         
     def login(self, username, password, productId=82):
         """Logs in to the API service and initiates a secure session for the 
@@ -433,14 +3029,12 @@ class BFGlobalService:
         productId -- the API product ID with which to login to the API for a 
                      new session. This is provided when you sign up
         """
+        started = time()
         # configure the template envelope and make the request
-        env = self._loginEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                     password,
+        env = self._loginEnvelope % (password,
                                      productId,
                                      username)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'login')
-        return LoginResp(response)
+        return self._call(env, 'login', LoginResp, started)
 
     def getSubscriptionInfo(self, sessionToken):
         """Retrieves information on your API subscription.
@@ -451,12 +3045,11 @@ class BFGlobalService:
         sessionToken -- session identifier
         
         """
+        started = time()
         # configure the template envelope and make the request
-        env = self._getSubscriptionInfoEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                                   sessionToken,)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getSubscriptionInfo')
-        return GetSubscriptionInfoResp(response)
+        env = self._getSubscriptionInfoEnvelope % (sessionToken,)
+        return self._call(env, 'getSubscriptionInfo', GetSubscriptionInfoResp,
+                          started)
         
 class BFExchangeService:
     
@@ -468,9 +3061,547 @@ class BFExchangeService:
     
     """
     
+    # SOAP request envelopes, shared by every instance. The layout whitespace
+    # is stripped and the namespace filled in once, when the class is defined
+    _getMarketEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getMarket xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <locale>%s</locale>
+                        <marketId>%i</marketId>
+                    </m:request>
+                </m:getMarket>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getInPlayMarketsEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getInPlayMarkets xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <locale>%s</locale>
+                    </m:request>
+                </m:getInPlayMarkets>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getAllMarketsEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema" 
+        xmlns:m0="http://www.betfair.com/publicapi/types/">
+            <SOAP-ENV:Body>
+                <m:getAllMarkets xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <locale>%s</locale>
+                        %s
+                    </m:request>
+                </m:getAllMarkets>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getMarketPricesEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getMarketPrices xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <currencyCode>%s</currencyCode>
+                        <marketId>%i</marketId>
+                    </m:request>
+                </m:getMarketPrices>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getMarketPricesCompressedEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getMarketPricesCompressed xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <currencyCode>%s</currencyCode>
+                        <marketId>%i</marketId>
+                    </m:request>
+                </m:getMarketPricesCompressed>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getCompleteMarketPricesCompressedEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getCompleteMarketPricesCompressed xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <currencyCode>%s</currencyCode>
+                        <marketId>%i</marketId>
+                    </m:request>
+                </m:getCompleteMarketPricesCompressed>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getSilksEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getSilks xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <locale>%s</locale>
+                        <markets xmlns="">
+                            %s
+                        </markets>
+                    </m:request>
+                </m:getSilks>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getSilksV2Envelope = _getSilksEnvelope.replace('getSilks', 'getSilksV2')
+
+    _getCurrentBetsEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getCurrentBets xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <betStatus>%s</betStatus>
+                        <detailed>%i</detailed>
+                        <locale>%s</locale>
+                        <timezone>%s</timezone>
+                        <marketId>%i</marketId>
+                        <orderBy>%s</orderBy>
+                        <recordCount>%i</recordCount>
+                        <startRecord>%i</startRecord>
+                        <noTotalRecordCount>%i</noTotalRecordCount>
+                    </m:request>
+                </m:getCurrentBets>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getMUBetsEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getMUBets xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <betStatus>%s</betStatus>
+                        <marketId>%i</marketId>
+                        <betIds>
+                            %s
+                        </betIds>
+                        <orderBy>%s</orderBy>
+                        <sortOrder>%s</sortOrder>
+                        <recordCount>%i</recordCount>
+                        <startRecord>%i</startRecord>
+                        <matchedSince>%s</matchedSince>
+                    </m:request>
+                </m:getMUBets>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getCurrentBetsLiteEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getCurrentBetsLite xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <betStatus>%s</betStatus>
+                        <marketId>%i</marketId>
+                        <orderBy>%s</orderBy>
+                        <recordCount>%i</recordCount>
+                        <startRecord>%i</startRecord>
+                        <noTotalRecordCount>%i</noTotalRecordCount>
+                    </m:request>
+                </m:getCurrentBetsLite>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getMUBetsLiteEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getMUBetsLite xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <betStatus>%s</betStatus>
+                        <marketId>%i</marketId>
+                        <betIds>
+                            %s
+                        </betIds>
+                        <orderBy>%s</orderBy>
+                        <sortOrder>%s</sortOrder>
+                        <recordCount>%i</recordCount>
+                        <startRecord>%i</startRecord>
+                        <matchedSince>%s</matchedSince>
+                        <excludeLastSecond>%i</excludeLastSecond>
+                    </m:request>
+                </m:getMUBetsLite>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getMarketProfitAndLossEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getMarketProfitAndLoss xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <includeSettledBets>%i</includeSettledBets>
+                        <marketID>%i</marketID>
+                        <netOfCommission>%i</netOfCommission>
+                    </m:request>
+                </m:getMarketProfitAndLoss>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getMarketTradedVolumeEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getMarketTradedVolume xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <asianLineId>%i</asianLineId>
+                        <currencyCode>%s</currencyCode>
+                        <marketId>%i</marketId>
+                        <selectionId>%i</selectionId>
+                    </m:request>
+                </m:getMarketTradedVolume>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getMarketTradedVolumeCompressedEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getMarketTradedVolumeCompressed xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <currencyCode>%s</currencyCode>
+                        <marketId>%i</marketId>
+                    </m:request>
+                </m:getMarketTradedVolumeCompressed>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getDetailAvailableMktDepthEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getDetailAvailableMktDepth xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <asianLineId>%i</asianLineId>
+                        <currencyCode>%s</currencyCode>
+                        <locale>%s</locale>
+                        <marketId>%i</marketId>
+                        <selectionId>%i</selectionId>
+                    </m:request>
+                </m:getDetailAvailableMktDepth>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getAccountFundsEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getAccountFunds xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                    </m:request>
+                </m:getAccountFunds>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getBetHistoryEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema" 
+        xmlns:m0="http://www.betfair.com/publicapi/types/">
+            <SOAP-ENV:Body>
+                <m:getBetHistory xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <betTypesIncluded>%s</betTypesIncluded>
+                        <detailed>%i</detailed>
+                        <eventTypeIds>
+                            %s
+                        </eventTypeIds>
+                        <marketId>%i</marketId>
+                        <locale>%s</locale>
+                        <timezone>%s</timezone>
+                        <marketTypesIncluded>
+                            %s
+                        </marketTypesIncluded>
+                        <placedDateFrom>%s</placedDateFrom>
+                        <placedDateTo>%s</placedDateTo>
+                        <recordCount>%i</recordCount>
+                        <sortBetsBy>%s</sortBetsBy>
+                        <startRecord>%i</startRecord>
+                    </m:request>
+                </m:getBetHistory>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getAccountStatementEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getAccountStatement xmlns:m="%s">
+                    <m:req>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <endDate>%s</endDate>
+                        <itemsIncluded>%s</itemsIncluded>
+                        <recordCount>%i</recordCount>
+                        <startDate>%s</startDate>
+                        <startRecord>%i</startRecord>
+                        <locale>%s</locale>
+                    </m:req>
+                </m:getAccountStatement>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _placeBetsEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema" 
+        xmlns:m0="http://www.betfair.com/publicapi/types/">
+            <SOAP-ENV:Body>
+                <m:placeBets xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <bets>
+                            %s
+                        </bets>
+                    </m:request>
+                </m:placeBets>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _cancelBetsEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema" 
+        xmlns:m0="http://www.betfair.com/publicapi/types/">
+            <SOAP-ENV:Body>
+                <m:cancelBets xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <bets>
+                            %s
+                        </bets>
+                    </m:request>
+                </m:cancelBets>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _updateBetsEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema" 
+        xmlns:m0="http://www.betfair.com/publicapi/types/">
+            <SOAP-ENV:Body>
+                <m:updateBets xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <bets>
+                            %s
+                        </bets>
+                    </m:request>
+                </m:updateBets>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    # elements repeated in the lists of some requests
+    _silksMarketElement = _compact_envelope('''
+        <int xmlns="http://www.betfair.com/publicapi/types/exchange/v5/">
+            %i
+        </int>''')
+        
+    _placeBetElement = _compact_envelope('''
+        <m0:PlaceBets>
+            <asianLineId>%i</asianLineId>
+            <betType>%s</betType>
+            <marketId>%i</marketId>
+            <price>%.2f</price>
+            <selectionId>%i</selectionId>
+            <size>%.2f</size>
+        </m0:PlaceBets>''')
+        
+    _updateBetElement = _compact_envelope('''
+        <m0:UpdateBets>
+            <betId>%i</betId>
+            <newPrice>%.2f</newPrice>
+            <newSize>%.2f</newSize>
+            <oldPrice>%.2f</oldPrice>
+            <oldSize>%.2f</oldSize>
+        </m0:UpdateBets>''')
+        
+    _cancelBetElement = _compact_envelope('''
+        <m0:CancelBets>
+            <betId>%i</betId>
+        </m0:CancelBets>''')
+        
+    _getBetEnvelope = _compact_envelope('''
+        <SOAP-ENV:Envelope 
+        xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
+        xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
+        xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+        xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+            <SOAP-ENV:Body>
+                <m:getBet xmlns:m="%s">
+                    <m:request>
+                        <header>
+                            <clientStamp>0</clientStamp>
+                            <sessionToken>%s</sessionToken>
+                        </header>
+                        <betId>%i</betId>
+                    </m:request>
+                </m:getBet>
+            </SOAP-ENV:Body>
+        </SOAP-ENV:Envelope>''', _EXCHANGE_SOAP_NAMESPACE)
+
+    _getBetLiteEnvelope = _getBetEnvelope.replace('getBet', 'getBetLite')
+    
+    _getBetMatchesLiteEnvelope = _getBetEnvelope.replace('getBet', 
+                                                         'getBetMatchesLite')
+
     def __init__(self, debuglevel=0, hostname='api.betfair.com', 
                 url='/exchange/v5/BFExchangeService', secure=True,
-                compressed=False):
+                compressed=False, pool=None, parser='minidom',
+                workerPool=None, throttle=None, metrics=None, capture=None,
+                replay=None, keepXml=None, orderLane=None):
         """Initialises an http(s) connection to the Betfair API.
         
         debuglevel -- configures httplib's wiredump (default 0)
@@ -480,416 +3611,73 @@ class BFExchangeService:
         compressed -- use gzip compression to reduce bandwidth (defaults to
                       False, but it is recommended you switch it on in 
                       production code)
+        pool       -- ConnectionPool to take connections from when httplib2
+                      is not installed (defaults to DEFAULT_CONNECTION_POOL,
+                      shared with all other proxies)
+        parser     -- 'minidom' (default) or 'expat'. The expat backend is
+                      considerably faster for large responses such as market
+                      prices and bet lists
+        workerPool -- WorkerPool that runs the batch calls (defaults to 
+                      DEFAULT_WORKER_POOL)
+        throttle   -- ThrottleScheduler to keep requests within the 
+                      subscription's limits (default None, not throttled)
+        metrics    -- CallMetrics to record the time taken by each phase of
+                      every call in (default None, not recorded)
+        capture    -- CaptureFile to write every call to (default None)
+        replay     -- ReplayTransport to serve responses from instead of 
+                      Betfair (default None)
+        keepXml    -- keep the xml of each response, so it can be printed by 
+                      __repr__, or drop it so the parsed document can be 
+                      freed straight away (defaults to KEEP_RESPONSE_XML)
+        orderLane  -- OrderLane to send placeBets, updateBets and cancelBets
+                      over, apart from all other calls (default None, they
+                      share the connections of the other calls)
         
         """
         # connection info
-        self.http_helper = HttpHelper(debuglevel, hostname, secure, compressed)
+        self.http_helper = HttpHelper(debuglevel, hostname, secure, compressed,
+                                      pool, parser, throttle, metrics, capture,
+                                      replay)
         self.url = url
-        
-        # SOAP request envelopes
-        self._getMarketEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:getMarket xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <locale>%s</locale>
-                            <marketId>%i</marketId>
-                        </m:request>
-                    </m:getMarket>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-
-        self._getMarketPricesEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:getMarketPrices xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <currencyCode>%s</currencyCode>
-                            <marketId>%i</marketId>
-                        </m:request>
-                    </m:getMarketPrices>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-
-        self._getMarketPricesCompressedEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:getMarketPricesCompressed xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <currencyCode>%s</currencyCode>
-                            <marketId>%i</marketId>
-                        </m:request>
-                    </m:getMarketPricesCompressed>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-
-        self._getCompleteMarketPricesCompressedEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:getCompleteMarketPricesCompressed xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <currencyCode>%s</currencyCode>
-                            <marketId>%i</marketId>
-                        </m:request>
-                    </m:getCompleteMarketPricesCompressed>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-
-        self._getSilksEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:getSilks xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <locale>%s</locale>
-                            <markets xmlns="">
-                                %s
-                            </markets>
-                        </m:request>
-                    </m:getSilks>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-
-        self._getSilksV2Envelope = self._getSilksEnvelope.replace('getSilks',
-                'getSilksV2')
-
-        self._getMarketPricesCompressedEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:getMarketPricesCompressed xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <currencyCode>%s</currencyCode>
-                            <marketId>%i</marketId>
-                        </m:request>
-                    </m:getMarketPricesCompressed>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-
-        self._getCompleteMarketPricesCompressedEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:getCompleteMarketPricesCompressed xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <currencyCode>%s</currencyCode>
-                            <marketId>%i</marketId>
-                        </m:request>
-                    </m:getCompleteMarketPricesCompressed>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-
-        self._getCurrentBetsEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:getCurrentBets xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <betStatus>%s</betStatus>
-                            <detailed>%i</detailed>
-                            <locale>%s</locale>
-                            <timezone>%s</timezone>
-                            <marketId>%i</marketId>
-                            <orderBy>%s</orderBy>
-                            <recordCount>%i</recordCount>
-                            <startRecord>%i</startRecord>
-                            <noTotalRecordCount>%i</noTotalRecordCount>
-                        </m:request>
-                    </m:getCurrentBets>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-
-        self._getMUBetsEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:getMUBets xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <betStatus>%s</betStatus>
-                            <marketId>%i</marketId>
-                            <betIds>
-                                %s
-                            </betIds>
-                            <orderBy>%s</orderBy>
-                            <sortOrder>%s</sortOrder>
-                            <recordCount>%i</recordCount>
-                            <startRecord>%i</startRecord>
-                            <matchedSince>%s</matchedSince>
-                        </m:request>
-                    </m:getMUBets>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-
-        self._getMarketProfitAndLossEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:getMarketProfitAndLoss xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <includeSettledBets>%i</includeSettledBets>
-                            <marketID>%i</marketID>
-                            <netOfCommission>%i</netOfCommission>
-                        </m:request>
-                    </m:getMarketProfitAndLoss>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-            
-        self._getMarketTradedVolumeEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:getMarketTradedVolume xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <asianLineId>%i</asianLineId>
-                            <currencyCode>%s</currencyCode>
-                            <marketId>%i</marketId>
-                            <selectionId>%i</selectionId>
-                        </m:request>
-                    </m:getMarketTradedVolume>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-
-        self._getAccountFundsEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:getAccountFunds xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                        </m:request>
-                    </m:getAccountFunds>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-            
-        self._getBetHistoryEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema" 
-            xmlns:m0="http://www.betfair.com/publicapi/types/">
-                <SOAP-ENV:Body>
-                    <m:getBetHistory xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <betTypesIncluded>%s</betTypesIncluded>
-                            <detailed>%i</detailed>
-                            <eventTypeIds>
-                                %s
-                            </eventTypeIds>
-                            <marketId>%i</marketId>
-                            <locale>%s</locale>
-                            <timezone>%s</timezone>
-                            <marketTypesIncluded>
-                                %s
-                            </marketTypesIncluded>
-                            <placedDateFrom>%s</placedDateFrom>
-                            <placedDateTo>%s</placedDateTo>
-                            <recordCount>%i</recordCount>
-                            <sortBetsBy>%s</sortBetsBy>
-                            <startRecord>%i</startRecord>
-                        </m:request>
-                    </m:getBetHistory>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-        
-        self._getAccountStatementEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:getAccountStatement xmlns:m="%s">
-                        <m:req>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <endDate>%s</endDate>
-                            <itemsIncluded>%s</itemsIncluded>
-                            <recordCount>%i</recordCount>
-                            <startDate>%s</startDate>
-                            <startRecord>%i</startRecord>
-                            <locale>%s</locale>
-                        </m:req>
-                    </m:getAccountStatement>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-        
-        self._placeBetsEnvelope = '''
-            <SOAP-ENV:Envelope xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema" 
-            xmlns:m0="http://www.betfair.com/publicapi/types/">
-                <SOAP-ENV:Body>
-                    <m:placeBets xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <bets>
-                                %s
-                            </bets>
-                        </m:request>
-                    </m:placeBets>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-            
-        self._cancelBetsEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema" 
-            xmlns:m0="http://www.betfair.com/publicapi/types/">
-                <SOAP-ENV:Body>
-                    <m:cancelBets xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <bets>
-                                %s
-                            </bets>
-                        </m:request>
-                    </m:cancelBets>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-
-        self._updateBetsEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema" 
-            xmlns:m0="http://www.betfair.com/publicapi/types/">
-                <SOAP-ENV:Body>
-                    <m:updateBets xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <bets>
-                                %s
-                            </bets>
-                        </m:request>
-                    </m:updateBets>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
-            
-        self._getBetEnvelope = '''
-            <SOAP-ENV:Envelope 
-            xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" 
-            xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" 
-            xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-            xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-                <SOAP-ENV:Body>
-                    <m:getBet xmlns:m="%s">
-                        <m:request>
-                            <header>
-                                <clientStamp>0</clientStamp>
-                                <sessionToken>%s</sessionToken>
-                            </header>
-                            <betId>%i</betId>
-                        </m:request>
-                    </m:getBet>
-                </SOAP-ENV:Body>
-            </SOAP-ENV:Envelope>'''
+        self.keepXml = keepXml
+        self.workerPool = workerPool or DEFAULT_WORKER_POOL
+        self._batchPool = None
+        
+        # orders get a helper of their own, so they never wait for a 
+        # connection behind a data request
+        self.orderLane = orderLane
+        self.order_http_helper = orderLane and HttpHelper(debuglevel, 
+                                      hostname, secure, compressed, 
+                                      orderLane.pool, parser, throttle, 
+                                      orderLane.metrics, capture, replay) \
+                                 or None
+        
+    def _call(self, env, action, respClass, started=None):
+        """Post a configured envelope to the service and return the response 
+        wrapped in respClass. started is when the call began, if the time
+        taken should be recorded."""
+        helper = self._helperFor(action)
+        metrics = helper.metrics
+        if metrics and started: 
+            metrics.record(action, 'format', time() - started)
+        response = helper.makeRequest(self.url, env, action)
+        return _build_response(metrics, response, action, respClass, started,
+                               self.keepXml)
+        
+    def _helperFor(self, action):
+        if self.order_http_helper and action in _ORDER_ACTIONS:
+            return self.order_http_helper
+        return self.http_helper
+        
+    def warmOrderLane(self):
+        """Open connections for the OrderLane until it has as many as it 
+        should keep, and return the number opened. Does nothing if the 
+        proxy has no OrderLane, or is making its requests through httplib2 or
+        a ReplayTransport."""
+        helper = self.order_http_helper
+        if not helper or httplib2 or helper.replay: return 0
+        return helper.pool.warm(helper.hostname, helper.secure, 
+                                self.orderLane.connections)
         
     def getAccountFunds(self, sessionToken):
         """Retrieve financial information about an account.
@@ -900,11 +3688,10 @@ class BFExchangeService:
         sessionToken -- session identifier
         
         """
+        started = time()
         # configure the template envelope and make the request
-        env = self._getAccountFundsEnvelope % (_EXCHANGE_SOAP_NAMESPACE, sessionToken,)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getAccountFunds')
-        return GetAccountFundsResp(response)
+        env = self._getAccountFundsEnvelope % (sessionToken,)
+        return self._call(env, 'getAccountFunds', GetAccountFundsResp, started)
         
     def getAccountStatement(self, 
                             sessionToken, 
@@ -928,18 +3715,17 @@ class BFExchangeService:
         recordCount   -- maximum number of records to return
         
         """
+        started = time()
         # configure the template envelope and make the request
-        env = self._getAccountStatementEnvelope % (_EXCHANGE_SOAP_NAMESPACE, 
-                                                   sessionToken, 
+        env = self._getAccountStatementEnvelope % (sessionToken, 
                                                    endDate.isoformat(), 
                                                    itemsIncluded, 
                                                    recordCount, 
                                                    startDate.isoformat(), 
                                                    startRecord,
                                                    locale)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getAccountStatement')
-        return GetAccountStatementResp(response)
+        return self._call(env, 'getAccountStatement', GetAccountStatementResp,
+                          started)
         
     def getBetHistory(self, 
                       sessionToken,
@@ -981,6 +3767,7 @@ class BFExchangeService:
         startRecord         -- first record number to return (supports paging)
         
         """
+        started = time()
         # create elements for the required sports
         sports = ''
         for eventTypeId in eventTypeIds:
@@ -996,21 +3783,20 @@ class BFExchangeService:
                 "<m0:MarketTypeEnum>%s</m0:MarketTypeEnum>" % (marketType,)
             
         # configure the template envelope and make the request
-        env = self._getBetHistoryEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                             sessionToken,
+        env = self._getBetHistoryEnvelope % (sessionToken,
                                              betTypesIncluded,
                                              includeDetail,
                                              sports,
-                                             language,
+                                             marketId,
+                                             locale,
+                                             timezone,
                                              marketTypes, 
                                              placedDateFrom.isoformat(),
                                              placedDateTo.isoformat(), 
                                              recordCount,
                                              sortBetsBy,
                                              startRecord)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getBetHistory')
-        return GetBetHistoryResp(response)
+        return self._call(env, 'getBetHistory', GetBetHistoryResp, started)
         
     def getCurrentBets(self,
                        sessionToken,
@@ -1042,13 +3828,13 @@ class BFExchangeService:
         noTotalRecordCount  -- exclude total record count field in response
                                (faster if you do not need it for paging)
         """
+        started = time()
         # send 1 or 0 instead of true/false
         detail_ = detailed and 1 or 0
         noTotalRecordCount_ = noTotalRecordCount and 1 or 0
         
         # configure the template envelope and make the request
-        env = self._getCurrentBetsEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                              sessionToken,
+        env = self._getCurrentBetsEnvelope % (sessionToken,
                                               betStatus,
                                               detail_,
                                               locale,
@@ -1058,9 +3844,7 @@ class BFExchangeService:
                                               recordCount,
                                               startRecord,
                                               noTotalRecordCount_)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getCurrentBets')
-        return GetCurrentBetsResp(response)
+        return self._call(env, 'getCurrentBets', GetCurrentBetsResp, started)
         
     def getMUBets(self,
                   sessionToken,
@@ -1089,26 +3873,113 @@ class BFExchangeService:
         startRecord  -- first record number to return (supports paging)
         matchedSince -- return only bets matched since this time
         """
+        started = time()
+        
+        betIds_ = ""
+        if betIds != None:
+            for betId in betIds:
+                betIds_ = betIds_ + "<betId>%i</betId>" % (betId,)
+            
+        # configure the template envelope and make the request
+        env = self._getMUBetsEnvelope % (sessionToken,
+                                         betStatus,
+                                         marketId,
+                                         betIds_,
+                                         orderBy,
+                                         sortOrder,
+                                         recordCount,
+                                         startRecord,
+                                         matchedSince.isoformat())
+        return self._call(env, 'getMUBets', GetMUBetsResp, started)
+        
+    def getCurrentBetsLite(self,
+                           sessionToken,
+                           betStatus="U",
+                           marketId=0,
+                           orderBy="NONE",
+                           recordCount=10,
+                           startRecord=0,
+                           noTotalRecordCount=False):
+        """Retrieve the status and sizes of bets that have been placed.
+        
+        The lite version of getCurrentBets: each BetLite has the bet's status
+        and matched and remaining sizes, but none of its dates, names or 
+        matches, so is much quicker to send and parse when polling.
+        
+        sessionToken        -- session identifier
+        betStatus           -- ('C')ancelled, ('L')apsed, ('M')atched,
+                               ('S')ettled, ('U')nmatched, ('V')oided
+        marketId            -- id of the market (0 for all markets)
+        orderBy             -- 'BET_ID', 'CANCELLED_DATE', 'MARKET_NAME',
+                               'NONE', 'PLACED_DATE'
+        recordCount         -- maximum number of records to return
+        startRecord         -- first record number to return (supports paging)
+        noTotalRecordCount  -- exclude total record count field in response
+                               (faster if you do not need it for paging)
+        """
+        started = time()
+        # send 1 or 0 instead of true/false
+        noTotalRecordCount_ = noTotalRecordCount and 1 or 0
+        
+        # configure the template envelope and make the request
+        env = self._getCurrentBetsLiteEnvelope % (sessionToken,
+                                                  betStatus,
+                                                  marketId,
+                                                  orderBy,
+                                                  recordCount,
+                                                  startRecord,
+                                                  noTotalRecordCount_)
+        return self._call(env, 'getCurrentBetsLite', GetCurrentBetsLiteResp, 
+                          started)
+        
+    def getMUBetsLite(self,
+                      sessionToken,
+                      betStatus="U",
+                      marketId=0,
+                      betIds=None,
+                      orderBy="NONE", 
+                      sortOrder="DESC",
+                      recordCount=10,
+                      startRecord=0,
+                      matchedSince=datetime(1, 1, 1, 0, 0, 0),
+                      excludeLastSecond=False):
+        """Retrieve the status and size of matched and unmatched bets.
+        
+        The lite version of getMUBets: each MUBetLite has the bet's status,
+        size and transaction ID, but not its price, selection or dates.
+        
+        sessionToken      -- session identifier
+        betStatus         -- ('M')atched, ('U')nmatched or 'MU' for both
+        marketId          -- id of the market (0 for all markets)
+        betIds            -- the bets to retreive data for
+        orderBy           -- 'BET_ID', 'CANCELLED_DATE', 'MARKET_NAME', 
+                             'NONE', 'PLACED_DATE'
+        sortOrder         -- 'DESC', 'ASC'
+        recordCount       -- maximum number of records to return
+        startRecord       -- first record number to return (supports paging)
+        matchedSince      -- return only bets matched since this time
+        excludeLastSecond -- leave out bets matched in the last second, which
+                             may still be changing
+        """
+        started = time()
         
         betIds_ = ""
         if betIds != None:
-            for betId in betIds:
-                betIds_ = betIds_ + "<betId>%i</betId>" % (betId,)
+            betIds_ = ''.join([ "<betId>%i</betId>" % (betId,)
+                                for betId in betIds ])
             
         # configure the template envelope and make the request
-        env = self._getMUBetsEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                         sessionToken,
-                                         betStatus,
-                                         marketId,
-                                         betIds_,
-                                         orderBy,
-                                         sortOrder,
-                                         recordCount,
-                                         startRecord,
-                                         matchedSince.isoformat())
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getMUBets')
-        return GetMUBetsResp(response)
+        env = self._getMUBetsLiteEnvelope % (sessionToken,
+                                             betStatus,
+                                             marketId,
+                                             betIds_,
+                                             orderBy,
+                                             sortOrder,
+                                             recordCount,
+                                             startRecord,
+                                             matchedSince.isoformat(),
+                                             excludeLastSecond and 1 or 0)
+        return self._call(env, 'getMUBetsLite', GetMUBetsLiteResp, started)
         
     def getMarket(self, sessionToken, marketId, locale="en_GB"):
         """Retrieve all static market data for the specified market.
@@ -1123,14 +3994,71 @@ class BFExchangeService:
         locale       -- controls the output language (default en_GB)
 
         """
+        started = time()
         # configure the template envelope and make the request
-        env = self._getMarketEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                         sessionToken,
+        env = self._getMarketEnvelope % (sessionToken,
                                          locale,
                                          marketId)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getMarket')
-        return GetMarketResp(response)
+        return self._call(env, 'getMarket', GetMarketResp, started)
+        
+    def getAllMarkets(self, sessionToken, eventTypeIds=None, countries=None,
+                      fromDate=None, toDate=None, locale="en_GB"):
+        """Retrieve a summary of every market available on the exchange.
+        
+        Performs a getAllMarkets call against the Betfair API, and returns a
+        GetAllMarketsResp object. Its markets are best loaded into a 
+        MarketCatalogue, which can then be searched without further calls.
+        Each argument left as None doesn't restrict the markets returned.
+        
+        sessionToken -- session identifier
+        eventTypeIds -- list of event types (sports) to return
+        countries    -- list of ISO3 codes of the countries to return
+        fromDate     -- markets with an event date on or after this date
+        toDate       -- markets with an event date on or before this date
+        locale       -- controls the output language (default en_GB)
+        
+        """
+        started = time()
+        # create elements for the filters given
+        filters = []
+        if eventTypeIds is not None:
+            filters.append('<eventTypeIds>%s</eventTypeIds>' % \
+                (''.join([ '<m0:int>%i</m0:int>' % (eventTypeId,) 
+                           for eventTypeId in eventTypeIds ]),))
+        if countries is not None:
+            filters.append('<countries>%s</countries>' % \
+                (''.join([ '<m0:Country>%s</m0:Country>' % (country,) 
+                           for country in countries ]),))
+        if fromDate is not None:
+            filters.append('<fromDate>%s</fromDate>' % (fromDate.isoformat(),))
+        if toDate is not None:
+            filters.append('<toDate>%s</toDate>' % (toDate.isoformat(),))
+            
+        # configure the template envelope and make the request
+        env = self._getAllMarketsEnvelope % (sessionToken,
+                                             locale,
+                                             ''.join(filters))
+        return self._call(env, 'getAllMarkets', GetAllMarketsResp, started)
+        
+    def getInPlayMarkets(self, sessionToken, locale="en_GB"):
+        """Retrieve a summary of the markets that are in-play, or due to 
+        turn in-play within the next 24 hours.
+        
+        Performs a getInPlayMarkets call against the Betfair API, and returns
+        a GetInPlayMarketsResp object. Pass its markets to an InPlayTracker 
+        to find out which markets have gone in-play, or left it, since the 
+        last call.
+        
+        sessionToken -- session identifier
+        locale       -- controls the output language (default en_GB)
+        
+        """
+        started = time()
+        # configure the template envelope and make the request
+        env = self._getInPlayMarketsEnvelope % (sessionToken,
+                                                locale)
+        return self._call(env, 'getInPlayMarkets', GetInPlayMarketsResp, 
+                          started)
 
     def getMarketPrices(self,
                         sessionToken,
@@ -1148,14 +4076,75 @@ class BFExchangeService:
         locale       -- controls the output language (default en_GB)
 
         """
+        started = time()
         # configure the template envelope and make the request
-        env = self._getMarketPricesEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                               sessionToken,
+        env = self._getMarketPricesEnvelope % (sessionToken,
                                                currencyCode,
                                                marketId)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getMarketPrices')
-        return GetMarketPricesResp(response)
+        return self._call(env, 'getMarketPrices', GetMarketPricesResp, started)
+        
+    def iterMarketPricesMany(self, sessionToken, marketIds, currencyCode="GBP", 
+                             maxWorkers=8):
+        """Retrieve dynamic market data for many markets concurrently.
+        
+        Performs a getMarketPrices call for each market, at most maxWorkers at
+        a time, and yields (marketId, response, error) tuples in the order 
+        the calls complete. response is a GetMarketPricesResp, or None if the
+        call raised an exception, in which case error is the exception. A 
+        market listed more than once is only requested once.
+        
+        Every call is made with the same sessionToken; use the token from the 
+        newest response header for the next request.
+        
+        sessionToken -- session identifier
+        marketIds    -- the market IDs
+        currencyCode -- three letter ISO 4217 code (default GBP)
+        maxWorkers   -- the most calls to have in flight at once (default 8)
+        
+        """
+        self._reserveConnections(maxWorkers)
+        
+        def getMarketPrices(marketId):
+            return self.getMarketPrices(sessionToken, marketId, currencyCode)
+            
+        return self.workerPool.imapUnordered(getMarketPrices, 
+                                             _unique(marketIds), maxWorkers)
+        
+    def getMarketPricesMany(self, sessionToken, marketIds, currencyCode="GBP", 
+                            maxWorkers=8):
+        """Retrieve dynamic market data for many markets concurrently.
+        
+        Performs a getMarketPrices call for each market, at most maxWorkers at
+        a time, and returns a BatchResults dict of GetMarketPricesResp keyed 
+        by marketId. Its sessionToken is the token from the newest response, 
+        and calls that raised an exception are in its errors dict. A market
+        listed more than once is only requested once.
+        
+        sessionToken -- session identifier
+        marketIds    -- the market IDs
+        currencyCode -- three letter ISO 4217 code (default GBP)
+        maxWorkers   -- the most calls to have in flight at once (default 8)
+        
+        """
+        results = BatchResults()
+        for marketId, response, error in self.iterMarketPricesMany(
+                        sessionToken, marketIds, currencyCode, maxWorkers):
+            results._add(marketId, response, error)
+        return results
+        
+    def _reserveConnections(self, maxWorkers):
+        # keep a connection per worker between batches. The helper's pool may
+        # be shared with other proxies, so rather than grow it the proxy 
+        # moves to a pool of its own
+        helper = self.http_helper
+        pool = getattr(helper, 'pool', None)
+        if pool is None or pool.maxsize >= maxWorkers: return
+        
+        if pool is self._batchPool:
+            pool.maxsize = maxWorkers
+        else:
+            self._batchPool = helper.pool = ConnectionPool(maxWorkers, 
+                                        pool.idleTimeout, pool.debuglevel)
 
     def getMarketPricesCompressed(self,
                         sessionToken,
@@ -1173,14 +4162,13 @@ class BFExchangeService:
         locale       -- controls the output language (default en_GB)
 
         """
+        started = time()
         # configure the template envelope and make the request
-        env = self._getMarketPricesCompressedEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                               sessionToken,
+        env = self._getMarketPricesCompressedEnvelope % (sessionToken,
                                                currencyCode,
                                                marketId)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getMarketPricesCompressed')
-        return GetMarketPricesCompressedResp(response)
+        return self._call(env, 'getMarketPricesCompressed', GetMarketPricesCompressedResp,
+                          started)
 
     def getCompleteMarketPricesCompressed(self,
                         sessionToken,
@@ -1198,14 +4186,13 @@ class BFExchangeService:
         locale       -- controls the output language (default en_GB)
 
         """
+        started = time()
         # configure the template envelope and make the request
-        env = self._getCompleteMarketPricesCompressedEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                                       sessionToken,
+        env = self._getCompleteMarketPricesCompressedEnvelope % (sessionToken,
                                                        currencyCode,
                                                        marketId)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getCompleteMarketPricesCompressed')
-        return GetCompleteMarketPricesCompressedResp(response)
+        return self._call(env, 'getCompleteMarketPricesCompressed', GetCompleteMarketPricesCompressedResp,
+                          started)
 
     def getSilks(self, sessionToken, marketIds, locale="en"):
         """Retrieve static runner data for the specified market.
@@ -1220,22 +4207,15 @@ class BFExchangeService:
         locale       -- controls the output language (default en_GB)
 
         """
+        started = time()
 
-        ids = ''
-        for marketId in marketIds:
-            ids = ids + '''
-                <int xmlns="http://www.betfair.com/publicapi/types/exchange/v5/">
-                    %i
-                </int>
-            ''' % (marketId,)
+        ids = ''.join([ self._silksMarketElement % (marketId,) 
+                        for marketId in marketIds ])
         # configure the template envelope and make the request
-        env = self._getSilksEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                        sessionToken,
+        env = self._getSilksEnvelope % (sessionToken,
                                         locale,
                                         ids)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getSilks')
-        return GetSilksResp(response)
+        return self._call(env, 'getSilks', GetSilksResp, started)
 
     def getSilksV2(self, sessionToken, marketIds, locale="en"):
         """Retrieve static runner data for the specified market.
@@ -1251,20 +4231,13 @@ class BFExchangeService:
         locale       -- controls the output language (default en_GB)
 
         """
-        ids = ''
-        for marketId in marketIds:
-            ids = ids + '''
-            <int xmlns="http://www.betfair.com/publicapi/types/exchange/v5/">
-            %i
-            </int>
-            ''' % (marketId,)
-        env = self._getSilksV2Envelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                          sessionToken,
+        started = time()
+        ids = ''.join([ self._silksMarketElement % (marketId,) 
+                        for marketId in marketIds ])
+        env = self._getSilksV2Envelope % (sessionToken,
                                           locale,
                                           ids)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getSilksV2')
-        return GetSilksResp(response)
+        return self._call(env, 'getSilksV2', GetSilksResp, started)
 
     def getMarketPricesCompressed(self,
                         sessionToken,
@@ -1282,14 +4255,13 @@ class BFExchangeService:
         locale       -- controls the output language (default en_GB)
 
         """
+        started = time()
         # configure the template envelope and make the request
-        env = self._getMarketPricesCompressedEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                               sessionToken,
+        env = self._getMarketPricesCompressedEnvelope % (sessionToken,
                                                currencyCode,
                                                marketId)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getMarketPricesCompressed')
-        return GetMarketPricesCompressedResp(response)
+        return self._call(env, 'getMarketPricesCompressed', GetMarketPricesCompressedResp,
+                          started)
 
     def getCompleteMarketPricesCompressed(self,
                         sessionToken,
@@ -1307,14 +4279,13 @@ class BFExchangeService:
         locale       -- controls the output language (default en_GB)
 
         """
+        started = time()
         # configure the template envelope and make the request
-        env = self._getCompleteMarketPricesCompressedEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                                       sessionToken,
+        env = self._getCompleteMarketPricesCompressedEnvelope % (sessionToken,
                                                        currencyCode,
                                                        marketId)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getCompleteMarketPricesCompressed')
-        return GetCompleteMarketPricesCompressedResp(response)
+        return self._call(env, 'getCompleteMarketPricesCompressed', GetCompleteMarketPricesCompressedResp,
+                          started)
 
     def getMarketProfitAndLoss(self,
                                sessionToken,
@@ -1336,16 +4307,16 @@ class BFExchangeService:
                               (default False)
         
         """
+        started = time()
         # send 1 or 0 instead of true/false
         settled = includeSettledBets and 1 or 0
         comm = netOfCommission and 1 or 0
 
         # configure the template envelope and make the request
-        env = self._getMarketProfitAndLossEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-            sessionToken, settled, marketId, comm)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getMarketProfitAndLoss')
-        return GetMarketProfitAndLossResp(response)
+        env = self._getMarketProfitAndLossEnvelope % (sessionToken, settled, 
+                                                      marketId, comm)
+        return self._call(env, 'getMarketProfitAndLoss', GetMarketProfitAndLossResp,
+                          started)
         
     def getMarketTradedVolume(self,
                               sessionToken,
@@ -1367,16 +4338,81 @@ class BFExchangeService:
         currencyCode -- three letter ISO 4217 code (default GBP)
         
         """
+        started = time()
         # configure the template envelope and make the request
-        env = self._getMarketTradedVolumeEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                                     sessionToken,
+        env = self._getMarketTradedVolumeEnvelope % (sessionToken,
                                                      asianLineId,
                                                      currencyCode,
                                                      marketId,
                                                      selectionId)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getMarketTradedVolume')
-        return GetMarketTradedVolumeResp(response)
+        return self._call(env, 'getMarketTradedVolume', GetMarketTradedVolumeResp,
+                          started)
+        
+    def getMarketTradedVolumeCompressed(self, sessionToken, marketId, 
+                                        currencyCode="GBP"):
+        """Retrieve the volume traded at each price on every runner in a 
+        market.
+        
+        Performs a getMarketTradedVolumeCompressed call against the Betfair 
+        API, and returns a GetMarketTradedVolumeCompressedResp object. Its 
+        MarketTradedVolume has the same data that getMarketTradedVolume 
+        returns for a single runner, for all of the market's runners at once,
+        along with their Betfair SP totals.
+        
+        sessionToken -- session identifier
+        marketId     -- the market ID
+        currencyCode -- three letter ISO 4217 code (default GBP)
+        
+        """
+        started = time()
+        # configure the template envelope and make the request
+        env = self._getMarketTradedVolumeCompressedEnvelope % (sessionToken,
+                                                               currencyCode,
+                                                               marketId)
+        return self._call(env, 'getMarketTradedVolumeCompressed', 
+                          GetMarketTradedVolumeCompressedResp, started)
+        
+    def getDetailAvailableMktDepth(self, sessionToken, marketId, selectionId,
+                                   asianLineId=0, currencyCode="GBP", 
+                                   locale="en_GB"):
+        """Retrieve the amounts available at every price on a selection.
+        
+        Performs a getDetailAvailableMktDepth call against the Betfair API, 
+        and returns a GetDetailAvailableMktDepthResp object. Unlike the best
+        three prices returned by getMarketPrices, its RunnerDepth holds the 
+        whole of the market on the selection, in arrays rather than a Price 
+        per level.
+        
+        sessionToken -- session identifier
+        marketId     -- the market ID
+        selectionId  -- the selection ID
+        asianLineId  -- the asian line ID (default 0, for markets that aren't
+                        Asian Handicap)
+        currencyCode -- three letter ISO 4217 code (default GBP)
+        locale       -- controls the output language (default en_GB)
+        
+        """
+        started = time()
+        # configure the template envelope and make the request
+        env = self._getDetailAvailableMktDepthEnvelope % (sessionToken,
+                                                          asianLineId,
+                                                          currencyCode,
+                                                          locale,
+                                                          marketId,
+                                                          selectionId)
+        resp = self._call(env, 'getDetailAvailableMktDepth', 
+                          GetDetailAvailableMktDepthResp, started)
+        
+        # the response doesn't say what it's for
+        def identify(resp):
+            if resp.depth:
+                resp.depth.marketId = marketId
+                resp.depth.selectionId = selectionId
+                resp.depth.asianLineId = asianLineId
+            return resp
+            
+        if isinstance(resp, AsyncResult): return _chain(resp, identify)
+        return identify(resp)
         
     def placeBets(self, sessionToken, bets):
         """Allows you to place multiple (1 to 60) bets on a single market. 
@@ -1391,31 +4427,20 @@ class BFExchangeService:
         bets         -- list of PlaceBet objects
         
         """
+        started = time()
         # create elements for the new bets
-        newBets = ''
-        for bet in bets:
-            newBets = newBets + '''
-                <m0:PlaceBets>
-                    <asianLineId>%i</asianLineId>
-                    <betType>%s</betType>
-                    <marketId>%i</marketId>
-                    <price>%.2f</price>
-                    <selectionId>%i</selectionId>
-                    <size>%.2f</size>
-                </m0:PlaceBets>''' % (bet.asianLineId,
-                                      bet.betType,
-                                      bet.marketId,
-                                      bet.price,
-                                      bet.selectionId,
-                                      bet.size)
+        newBets = ''.join([ self._placeBetElement % (bet.asianLineId,
+                                                     bet.betType,
+                                                     bet.marketId,
+                                                     bet.price,
+                                                     bet.selectionId,
+                                                     bet.size) 
+                            for bet in bets ])
         
         # configure the template envelope and make the request
-        env = self._placeBetsEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                         sessionToken,
+        env = self._placeBetsEnvelope % (sessionToken,
                                          newBets)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'placeBets')
-        return PlaceBetsResp(response)
+        return self._call(env, 'placeBets', PlaceBetsResp, started)
 
     def updateBets(self, sessionToken, bets):
         """Allows you to edit multiple (1 to 15) bets on a single market.
@@ -1430,29 +4455,19 @@ class BFExchangeService:
         bets         -- list of UpdateBets objects
         
         """
+        started = time()
         # create elements for the update requests
-        updates = ''
-        for bet in bets:
-            updates = updates + '''
-                <m0:UpdateBets>
-                    <betId>%i</betId>
-                    <newPrice>%.2f</newPrice>
-                    <newSize>%.2f</newSize>
-                    <oldPrice>%.2f</oldPrice>
-                    <oldSize>%.2f</oldSize>
-                </m0:UpdateBets>''' % (bet.betId,
-                                       bet.newPrice,
-                                       bet.newSize, 
-                                       bet.oldPrice,
-                                       bet.oldSize)
+        updates = ''.join([ self._updateBetElement % (bet.betId,
+                                                      bet.newPrice,
+                                                      bet.newSize, 
+                                                      bet.oldPrice,
+                                                      bet.oldSize)
+                            for bet in bets ])
 
         # configure the template envelope and make the request
-        env = self._updateBetsEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                          sessionToken,
+        env = self._updateBetsEnvelope % (sessionToken,
                                           updates)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'updateBets')
-        return UpdateBetsResp(response)
+        return self._call(env, 'updateBets', UpdateBetsResp, started)
         
     def cancelBets(self, sessionToken, bets):
         """Allows you to cancel multiple (1 to 40) bets placed on a single market.
@@ -1468,21 +4483,96 @@ class BFExchangeService:
         bets         -- list of betIds
         
         """
+        started = time()
         # create elements for the cancel requests
-        cancellations = ''
-        for betId in bets:
-            cancellations = cancellations + '''
-                <m0:CancelBets>
-                    <betId>%i</betId>
-                </m0:CancelBets>''' % (betId,)
+        cancellations = ''.join([ self._cancelBetElement % (betId,) 
+                                  for betId in bets ])
 
         # configure the template envelope and make the request
-        env = self._cancelBetsEnvelope % (_EXCHANGE_SOAP_NAMESPACE,
-                                          sessionToken,
+        env = self._cancelBetsEnvelope % (sessionToken,
                                           cancellations)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'cancelbets')
-        return CancelBetsResp(response)
+        return self._call(env, 'cancelbets', CancelBetsResp, started)
+        
+    def armBets(self, marketId, runners, betType="B"):
+        """Format a placeBets request for a market's runners ahead of time.
+        
+        Returns an ArmedBets, whose fire method places bets on any of the 
+        runners with only their prices and stakes left to fill in.
+        
+        marketId -- id of the market to place the bets on
+        runners  -- list of the runners to arm, e.g. market.runners. Anything
+                    with selectionId and asianLineId attributes will do
+        betType  -- (B)ack or (L)ay (default B)
+        
+        """
+        return ArmedBets(self, marketId, runners, betType)
+        
+    def placeBetsMany(self, sessionToken, bets, maxWorkers=8):
+        """Place any number of bets, on any number of markets.
+        
+        Groups the bets by market and splits them into placeBets requests of 
+        up to MAX_PLACE_BETS, sending at most maxWorkers at a time, and 
+        returns a BulkResults list of the BetPlacementResult for each bet in
+        the order the bets were given.
+        
+        sessionToken -- session identifier
+        bets         -- list of PlaceBet objects
+        maxWorkers   -- the most requests to have in flight at once (default 8)
+        
+        """
+        return self._bulkCall(self.placeBets, sessionToken, bets, 
+                              MAX_PLACE_BETS, maxWorkers, 
+                              lambda bet: bet.marketId)
+        
+    def updateBetsMany(self, sessionToken, bets, maxWorkers=8):
+        """Edit any number of bets.
+        
+        Splits the bets into updateBets requests of up to MAX_UPDATE_BETS, 
+        sending at most maxWorkers at a time, and returns a BulkResults list
+        of the UpdateBetsResult for each bet in the order the bets were given.
+        
+        sessionToken -- session identifier
+        bets         -- list of UpdateBets objects
+        maxWorkers   -- the most requests to have in flight at once (default 8)
+        
+        """
+        return self._bulkCall(self.updateBets, sessionToken, bets,
+                              MAX_UPDATE_BETS, maxWorkers, 
+                              betId=lambda bet: int(bet.betId))
+        
+    def cancelBetsMany(self, sessionToken, bets, maxWorkers=8):
+        """Cancel any number of bets.
+        
+        Splits the betIds into cancelBets requests of up to MAX_CANCEL_BETS, 
+        sending at most maxWorkers at a time, and returns a BulkResults list
+        of the CancelBetsResult for each bet in the order the betIds were 
+        given.
+        
+        sessionToken -- session identifier
+        bets         -- list of betIds
+        maxWorkers   -- the most requests to have in flight at once (default 8)
+        
+        """
+        return self._bulkCall(self.cancelBets, sessionToken, bets,
+                              MAX_CANCEL_BETS, maxWorkers, betId=int)
+        
+    def _bulkCall(self, method, sessionToken, items, chunkSize, maxWorkers, 
+                  key=None, betId=None):
+        items = list(items)
+        betIds = None
+        if betId: betIds = [ betId(item) for item in items ]
+        results = BulkResults(len(items), 
+                              _chunk_indices(items, chunkSize, key), betIds)
+        self._reserveConnections(maxWorkers)
+        
+        def call(chunk):
+            return method(sessionToken, 
+                          [ items[index] for index in results.chunks[chunk] ])
+            
+        for chunk, response, error in self.workerPool.imapUnordered(call, 
+                                    range(len(results.chunks)), maxWorkers):
+            results._add(chunk, response, error)
+        return results
         
     def getBet(self, sessionToken, betId):
         """Retrieves a single bet.
@@ -1491,12 +4581,498 @@ class BFExchangeService:
         object. Each request will retrieve all components of the desired bet.
         
         """
+        started = time()
+        # configure the template envelope and make the request
+        env = self._getBetEnvelope % (sessionToken, betId)
+        return self._call(env, 'getBet', GetBetResp, started)
+        
+    def getBetLite(self, sessionToken, betId):
+        """Retrieves the status and sizes of a single bet.
+        
+        Performs a getBetLite call against the Betfair API, and returns a 
+        GetBetLiteResp object, whose BetLite leaves out the dates, names and
+        matches that getBet returns.
+        
+        """
+        started = time()
+        # configure the template envelope and make the request
+        env = self._getBetLiteEnvelope % (sessionToken, betId)
+        return self._call(env, 'getBetLite', GetBetLiteResp, started)
+        
+    def getBetMatchesLite(self, sessionToken, betId):
+        """Retrieves the matched portions of a single bet.
+        
+        Performs a getBetMatchesLite call against the Betfair API, and returns
+        a GetBetMatchesLiteResp object with a MatchLite for each portion.
+        
+        """
+        started = time()
         # configure the template envelope and make the request
-        env = self._getBetEnvelope % (_EXCHANGE_SOAP_NAMESPACE, sessionToken, betId)
-        response = self.http_helper.makeRequest(self.url, env, 
-                                                'getBet')
-        return GetBetResp(response)
+        env = self._getBetMatchesLiteEnvelope % (sessionToken, betId)
+        return self._call(env, 'getBetMatchesLite', GetBetMatchesLiteResp, 
+                          started)
+        
+class AsyncBFGlobalService(BFGlobalService):
+    
+    """Asynchronous proxy class for the Betfair Global API.
+    
+    Has the same methods as BFGlobalService, but each returns an AsyncResult
+    for the response object instead of the response itself. The requests are 
+    run by an EventLoop, so any number can be in flight at once from a 
+    single thread.
+    
+    """
+    
+    def __init__(self, loop=None, debuglevel=0, hostname='api.betfair.com',
+                url='/global/v3/BFGlobalService', secure=True, 
+                compressed=False, parser='minidom', maxConnections=64,
+                timeout=30, throttle=None, metrics=None, capture=None,
+                replay=None, keepXml=None):
+        """Initialises a proxy to the Betfair API.
+        
+        loop           -- the EventLoop to run requests in (defaults to 
+                          DEFAULT_EVENT_LOOP)
+        maxConnections -- the most requests to have in flight at once 
+                          (default 64)
+        timeout        -- seconds to wait for a response (default 30)
+        
+        The other arguments are as for BFGlobalService.
+        
+        """
+        BFGlobalService.__init__(self, debuglevel, hostname, url, secure, 
+                                 compressed, parser=parser, keepXml=keepXml)
+        self.http_helper = AsyncHttpHelper(loop, debuglevel, hostname, secure,
+                                           compressed, parser, maxConnections,
+                                           timeout, throttle=throttle, 
+                                           metrics=metrics, capture=capture,
+                                           replay=replay)
+        self.loop = self.http_helper.loop
+        
+    def _call(self, env, action, respClass, started=None):
+        metrics = self.http_helper.metrics
+        if metrics and started: 
+            metrics.record(action, 'format', time() - started)
+        return _chain(self.http_helper.makeRequest(self.url, env, action), 
+                      lambda response: _build_response(metrics, response, 
+                                    action, respClass, started, self.keepXml))
+        
+class ArmedBets:
+    
+    """A placeBets request for a market's runners, formatted ahead of time.
+    
+    Everything but the session token, prices and stakes is filled in when 
+    the bets are armed, so that when an opportunity is found only those have
+    to be formatted before the request goes out, e.g.
+    
+        armed = exchangeProxy.armBets(market.marketId, market.runners)
+        ...
+        detected = time()
+        ...
+        resp = session.call(armed.fire, [ (runner.selectionId, 
+                                           runner.asianLineId, price, stake) 
+                                          for runner, price, stake in bets ],
+                            detected=detected)
+                            
+    Attributes:
+        proxy    -- the BFExchangeService the bets are placed through
+        marketId -- id of the market the bets are placed on
+        betType  -- (B)ack or (L)ay
+        
+    """
+    def __init__(self, proxy, marketId, runners, betType="B"):
+        self.proxy = proxy
+        self.marketId = marketId
+        self.betType = betType
+        
+        # (selectionId, asianLineId) -> element with the price and size left
+        # to fill in
+        template = proxy._placeBetElement.replace('%.2f', '%%.2f')
+        self._elements = {}
+        for runner in runners:
+            self._elements[(runner.selectionId, runner.asianLineId)] = \
+                template % (runner.asianLineId, betType, marketId, 
+                            runner.selectionId)
+                            
+    def fire(self, sessionToken, bets, detected=None):
+        """Place bets on armed runners.
+        
+        Performs a placeBets call against the Betfair API, and returns a 
+        PlaceBetsResp object as BFExchangeService.placeBets does. Raises 
+        KeyError if a bet is on a runner that wasn't armed.
+        
+        sessionToken -- session identifier
+        bets         -- list of (selectionId, asianLineId, price, size) 
+                        tuples
+        detected     -- the time() the opportunity was detected, to record 
+                        the detect phase from in the proxy's metrics 
+                        (default None, not recorded)
+                        
+        """
+        started = time()
+        elements = self._elements
+        newBets = ''.join([ elements[(selectionId, asianLineId)] % (price, 
+                                                                    size)
+                            for selectionId, asianLineId, price, size 
+                            in bets ])
+        env = self.proxy._placeBetsEnvelope % (sessionToken, newBets)
+        
+        metrics = self.proxy._helperFor('placeBets').metrics
+        if metrics and detected: 
+            metrics.record('placeBets', 'detect', time() - detected)
+        return self.proxy._call(env, 'placeBets', PlaceBetsResp, started)
+        
+class AsyncBFExchangeService(BFExchangeService):
+    
+    """Asynchronous proxy class for the Betfair Exchange API.
+    
+    Has the same methods as BFExchangeService, but each returns an 
+    AsyncResult for the response object instead of the response itself. The
+    requests are run by an EventLoop, so any number can be in flight at once
+    from a single thread, e.g.
+    
+        exchange = AsyncBFExchangeService()
+        prices = exchange.loop.gather([ exchange.getMarketPrices(token, id)
+                                        for id in marketIds ])
+        for resp in exchange.loop.runUntilComplete(prices):
+            ...
+            
+    """
+    
+    def __init__(self, loop=None, debuglevel=0, hostname='api.betfair.com', 
+                url='/exchange/v5/BFExchangeService', secure=True,
+                compressed=False, parser='minidom', maxConnections=64,
+                timeout=30, throttle=None, metrics=None, capture=None,
+                replay=None, keepXml=None):
+        """Initialises a proxy to the Betfair API.
+        
+        loop           -- the EventLoop to run requests in (defaults to 
+                          DEFAULT_EVENT_LOOP)
+        maxConnections -- the most requests to have in flight at once 
+                          (default 64)
+        timeout        -- seconds to wait for a response (default 30)
+        
+        The other arguments are as for BFExchangeService.
+        
+        """
+        BFExchangeService.__init__(self, debuglevel, hostname, url, secure, 
+                                   compressed, parser=parser, 
+                                   keepXml=keepXml)
+        self.http_helper = AsyncHttpHelper(loop, debuglevel, hostname, secure,
+                                           compressed, parser, maxConnections,
+                                           timeout, throttle=throttle, 
+                                           metrics=metrics, capture=capture,
+                                           replay=replay)
+        self.loop = self.http_helper.loop
+        
+    def _call(self, env, action, respClass, started=None):
+        metrics = self.http_helper.metrics
+        if metrics and started: 
+            metrics.record(action, 'format', time() - started)
+        return _chain(self.http_helper.makeRequest(self.url, env, action), 
+                      lambda response: _build_response(metrics, response, 
+                                    action, respClass, started, self.keepXml))
+        
+    def iterMarketPricesMany(self, sessionToken, marketIds, currencyCode="GBP", 
+                             maxWorkers=None):
+        """Retrieve dynamic market data for many markets concurrently.
+        
+        Yields (marketId, response, error) tuples in the order the calls 
+        complete, as BFExchangeService.iterMarketPricesMany does, running the
+        proxy's EventLoop while it waits for them. It can't be used from a 
+        coroutine or callback already running in the loop; use 
+        getMarketPricesMany there instead. maxWorkers is ignored, as for 
+        getMarketPricesMany.
+        
+        """
+        completed = deque()
+        marketIds = _unique(marketIds)
+        for marketId in marketIds:
+            self.getMarketPrices(sessionToken, marketId, currencyCode) \
+                .addCallback(lambda result, marketId=marketId: 
+                    completed.append((marketId, result._value, result._error)))
+                    
+        for i in range(len(marketIds)):
+            while not completed: self.loop.runOnce()
+            yield completed.popleft()
+        
+    def getMarketPricesMany(self, sessionToken, marketIds, currencyCode="GBP", 
+                            maxWorkers=None):
+        """Retrieve dynamic market data for many markets concurrently.
+        
+        Returns an AsyncResult for a BatchResults, as returned by
+        BFExchangeService.getMarketPricesMany. maxWorkers is ignored; the 
+        number of requests in flight is limited by maxConnections instead.
+        
+        """
+        batch = AsyncResult()
+        results = BatchResults()
+        marketIds = _unique(marketIds)
+        remaining = [len(marketIds)]
+        
+        def complete(marketId, result):
+            results._add(marketId, result._value, result._error)
+            remaining[0] -= 1
+            if not remaining[0]: batch.setResult(results)
+            
+        if not marketIds: batch.setResult(results)
+        for marketId in marketIds:
+            self.getMarketPrices(sessionToken, marketId, currencyCode) \
+                .addCallback(lambda result, marketId=marketId: 
+                             complete(marketId, result))
+        return batch
+        
+    def _bulkCall(self, method, sessionToken, items, chunkSize, maxWorkers, 
+                  key=None, betId=None):
+        # as for getMarketPricesMany, the place/update/cancelBetsMany 
+        # methods return an AsyncResult and ignore maxWorkers
+        bulk = AsyncResult()
+        items = list(items)
+        betIds = None
+        if betId: betIds = [ betId(item) for item in items ]
+        results = BulkResults(len(items), 
+                              _chunk_indices(items, chunkSize, key), betIds)
+        remaining = [len(results.chunks)]
+        
+        def complete(chunk, result):
+            results._add(chunk, result._value, result._error)
+            remaining[0] -= 1
+            if not remaining[0]: bulk.setResult(results)
+            
+        if not results.chunks: bulk.setResult(results)
+        for chunk in range(len(results.chunks)):
+            method(sessionToken, 
+                   [ items[index] for index in results.chunks[chunk] ]) \
+                .addCallback(lambda result, chunk=chunk: 
+                             complete(chunk, result))
+        return bulk
+        
+class LoginError(Exception):
+    
+    """Raised when a BFSession fails to log in.
+    
+    Attributes:
+        errorCode -- the errorCode of the login response
+        
+    """
+    def __init__(self, errorCode):
+        Exception.__init__(self, "Login failed: %s" % (errorCode,))
+        self.errorCode = errorCode
+        
+class BFSession:
+    
+    """Owns the session token for a login, so that calls can be made from
+    many threads at once.
+    
+    Every response carries a new session token. Calls made through call() 
+    use the current token and update it from the response header, the 
+    newest header winning, so they don't have to be serialised through one
+    variable. A call that fails with NO_SESSION logs in again and is retried
+    once, and a background thread sends a keepAlive whenever the session has
+    been idle for keepAliveInterval seconds, e.g.
+    
+        session = BFSession(globalProxy, username, password)
+        session.login()
+        prices = session.call(exchangeProxy.getMarketPrices, marketId)
+        
+    """
+    
+    def __init__(self, globalService, username, password, productId=82,
+                 keepAliveInterval=600):
+        """Initialise a new session. Call login to start it.
+        
+        globalService     -- the BFGlobalService to log in and keep alive 
+                             through
+        username          -- account username
+        password          -- account password
+        productId         -- the API product ID to log in with (default 82)
+        keepAliveInterval -- seconds of inactivity after which a keepAlive is
+                             sent (default 600, as sessions expire after 20 
+                             minutes). None disables keepAlive
+                             
+        """
+        self.globalService = globalService
+        self.username = username
+        self.password = password
+        self.productId = productId
+        self.keepAliveInterval = keepAliveInterval
+        
+        self._lock = threading.Lock()
+        self._loginLock = threading.Lock()
+        self._sessionToken = None
+        self._timestamp = None
+        self._lastActivity = time()
+        
+        # incremented by each login, so that threads which all see NO_SESSION
+        # for the same login only log in again once
+        self._generation = 0
+        
+        self._stopped = threading.Event()
+        self._keepAliveThread = None
+        
+    def getSessionToken(self):
+        """Return the current session token."""
+        self._lock.acquire()
+        try:
+            return self._sessionToken
+        finally:
+            self._lock.release()
+            
+    def login(self):
+        """Log in, replacing any current session, and start sending 
+        keepAlives. Returns the LoginResp, or raises LoginError if the login
+        fails."""
+        resp = self.globalService.login(self.username, self.password, 
+                                        self.productId)
+        if resp.errorCode != "OK": raise LoginError(resp.errorCode)
+        
+        self._lock.acquire()
+        try:
+            self._sessionToken = resp.header.sessionToken
+            self._timestamp = resp.header.timestamp
+            self._lastActivity = time()
+            self._generation += 1
+        finally:
+            self._lock.release()
+            
+        if self.keepAliveInterval: self._startKeepAlive()
+        return resp
+        
+    def update(self, header):
+        """Update the session token from an APIResponseHeader. Headers older
+        than the newest one seen are ignored."""
+        self._take(header.sessionToken, header.timestamp)
+        
+
+    def call(self, method, *args, **kwargs):
+        """Call a proxy method with the current session token and return the
+        response, updating the token from its header.
+        
+        method is a bound proxy method that takes the session token as its 
+        first argument, e.g. exchangeProxy.getMarketPrices, and the other 
+        arguments are passed on to it. If the response reports NO_SESSION, 
+        logs in again and retries the call once.
+        
+        Batch methods such as getMarketPricesMany and the bulk bet methods 
+        return a BatchResults or BulkResults, whose sessionToken is taken 
+        instead, and only the entries or orders that came back NO_SESSION are
+        retried, so the ids or orders must be passed as a list in the first 
+        argument after the session token. Methods of an AsyncBFExchangeService return
+        an AsyncResult, and so does call, the token being updated and any 
+        retry made once the response arrives.
+        
+        """
+        generation, sessionToken = self._current()
+        resp = method(sessionToken, *args, **kwargs)
+        if isinstance(resp, AsyncResult):
+            return _chain(resp, lambda resp: 
+                          self._settle(resp, generation, method, args, kwargs))
+        return self._settle(resp, generation, method, args, kwargs)
+        
+    def keepAlive(self):
+        """Send a keepAlive for the session and return the KeepAliveResp."""
+        return self.call(self.globalService.keepAlive)
+        
+    def stop(self):
+        """Stop sending keepAlives."""
+        self._stopped.set()
+        thread = self._keepAliveThread
+        if thread: thread.join()
+        self._keepAliveThread = None
+        
+    def _current(self):
+        self._lock.acquire()
+        try:
+            return self._generation, self._sessionToken
+        finally:
+            self._lock.release()
+            
+    def _take(self, sessionToken, timestamp):
+        if not sessionToken: return
+        
+        self._lock.acquire()
+        try:
+            if self._timestamp is None or timestamp >= self._timestamp:
+                self._sessionToken = sessionToken
+                self._timestamp = timestamp
+            self._lastActivity = time()
+        finally:
+            self._lock.release()
+            
+    def _takeFrom(self, resp):
+        if isinstance(resp, (BatchResults, BulkResults)):
+            self._take(resp.sessionToken, resp._timestamp)
+        else:
+            self.update(resp.header)
+            
+    def _settle(self, resp, generation, method, args, kwargs):
+        # update the token from a response and retry what came back 
+        # NO_SESSION, returning the response (or an AsyncResult for it)
+        self._takeFrom(resp)
+        if isinstance(resp, BatchResults):
+            expired = [ key for key in resp 
+                        if resp[key].header.errorCode == "NO_SESSION" ]
+        elif isinstance(resp, BulkResults):
+            expired = []
+            for chunk in range(len(resp.chunks)):
+                response = resp.responses[chunk]
+                if response and response.header.errorCode == "NO_SESSION":
+                    expired.extend(resp.chunks[chunk])
+        else:
+            expired = resp.header.errorCode == "NO_SESSION"
+        if not expired: return resp
+        
+        self._relogin(generation)
+        generation, sessionToken = self._current()
+        if isinstance(resp, BatchResults):
+            retried = method(sessionToken, expired, *args[1:], **kwargs)
+        elif isinstance(resp, BulkResults):
+            retried = method(sessionToken, 
+                             [ args[0][index] for index in expired ], 
+                             *args[1:], **kwargs)
+        else:
+            retried = method(sessionToken, *args, **kwargs)
+            
+        def complete(retried):
+            self._takeFrom(retried)
+            if isinstance(resp, BatchResults): return resp._merge(retried)
+            if isinstance(resp, BulkResults): 
+                return resp._merge(retried, expired)
+            return retried
+            
+        if isinstance(retried, AsyncResult): return _chain(retried, complete)
+        return complete(retried)
         
+    def _relogin(self, generation):
+        self._loginLock.acquire()
+        try:
+            if self._generation == generation: self.login()
+        finally:
+            self._loginLock.release()
+            
+    def _startKeepAlive(self):
+        if self._keepAliveThread and self._keepAliveThread.isAlive(): return
+        
+        self._stopped.clear()
+        self._keepAliveThread = threading.Thread(target=self._keepAliveLoop)
+        self._keepAliveThread.setDaemon(True)
+        self._keepAliveThread.start()
+        
+    def _keepAliveLoop(self):
+        while not self._stopped.isSet():
+            idle = time() - self._lastActivity
+            if idle < self.keepAliveInterval:
+                self._stopped.wait(self.keepAliveInterval - idle)
+                continue
+                
+            try:
+                self.keepAlive()
+            except Exception:
+                pass
+                
+            # if that didn't renew the session, try again shortly
+            if time() - self._lastActivity >= self.keepAliveInterval:
+                self._stopped.wait(min(60, self.keepAliveInterval))
+                
 class APIResponseHeader:
     
     """The APIResponseHeader contains the user's session token and client stamp
@@ -1545,7 +5121,7 @@ class APIResponseHeader:
             
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
         return '(%s, %s, %s)' % (self.errorCode, self.sessionToken, 
@@ -1638,7 +5214,7 @@ class LoginResp:
             tag('validUntil')[0].childNodes[0].nodeValue)
         
     def __repr__(self):
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
         return '''LoginResp
@@ -1707,7 +5283,7 @@ class GetEventTypesResp:
         
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
         return '''GetEventTypesResp
@@ -1794,7 +5370,7 @@ class GetEventsResp:
         
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
         return '''GetEventsResp
@@ -1859,7 +5435,7 @@ class GetMarketResp:
         
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
 
     def __str__(self):
         return '''GetMarketResp
@@ -1922,7 +5498,7 @@ class GetMarketPricesResp:
         
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
         return '''GetMarketPricesResp
@@ -1933,28 +5509,105 @@ class GetMarketPricesResp:
             
 class GetMarketPricesCompressedResp:
     
-    """Encapsulates a getMarketPricesCompressed response from the API.
+    """Encapsulates a getMarketPricesCompressed response from the API.
+    
+    Attributes:
+        header         -- APIResponseHeader
+        errorCode      -- if not 'OK', indicates a non service specific error 
+                          has occurred. See below.
+        marketPrices   -- MarketPrices, parsed from the compressed data, so
+                          the same as that returned by getMarketPrices. Also
+                          has removedRunners (list of RemovedRunner) and 
+                          bspMarket attributes, and each RunnerPrices has
+                          farBSP, nearBSP and actualBSP
+        marketPricesData -- the compressed market prices string
+        minorErrorCode -- reserved for future use - currently always null
+
+    Error codes:        
+        API_ERROR
+            General API Error
+        INVALID_CURRENCY
+            Currency code not a valid 3 letter ISO 4217 currency abbreviation
+        INVALID_MARKET
+            Invalid market ID supplied
+        MARKET_TYPE_NOT_SUPPORTED
+            The market ID supplied refers to a market that is not supported by
+            the API. Currently, this includes Line and Range markets.
+
+    """
+
+    def __init__(self, doc):
+        """Initialise a new instance.
+        
+        doc -- the Xml doc to initialise from
+        
+        """
+        
+        # store the xml in case we want to see the raw data
+        self.node = doc.getElementsByTagNameNS(_EXCHANGE_SOAP_NAMESPACE,
+                                               'getMarketPricesCompressedResponse')[0]
+            
+        tag = self.node.getElementsByTagName
+
+        self.header = APIResponseHeader(tag('header')[0])
+        self.errorCode = tag('errorCode')[0].childNodes[0].nodeValue
+        
+        # market prices (might be null)
+        marketPrices = tag('marketPrices')[0]
+        self.marketPricesData = marketPrices.hasChildNodes() \
+            and str(marketPrices.childNodes[0].nodeValue) \
+            or None
+        self.marketPrices = self.marketPricesData \
+            and _parse_compressed_market_prices(self.marketPricesData) \
+            or None
+        
+        # minor error code (might be null)
+        minorErrorCode = tag('minorErrorCode')[0]
+        self.minorErrorCode = minorErrorCode.hasChildNodes() \
+            and minorErrorCode.childNodes[0].nodeValue \
+            or None
+        
+    def __repr__(self):
+        """Returns formatted XML representing the object."""
+        return _node_xml(self)
+        
+    def __str__(self):
+        return '''GetMarketPricesCompressedResp
+            header: %s
+            marketPrices: %s
+            errorCode: %s
+            ''' % (str(self.header), str(self.marketPrices), self.errorCode)
+
+class GetAllMarketsResp:
+    
+    """Encapsulates a getAllMarkets response from the API.
+    
+    The markets aren't parsed until they are asked for, as there can be tens
+    of thousands of them. Pass iterMarkets() to a MarketCatalogue to load 
+    them into one without building an intermediate list.
     
     Attributes:
         header         -- APIResponseHeader
         errorCode      -- if not 'OK', indicates a non service specific error 
                           has occurred. See below.
-        marketPrices   -- MarketPrices
+        marketData     -- the compressed market data string
         minorErrorCode -- reserved for future use - currently always null
 
     Error codes:        
         API_ERROR
             General API Error
-        INVALID_CURRENCY
-            Currency code not a valid 3 letter ISO 4217 currency abbreviation
-        INVALID_MARKET
-            Invalid market ID supplied
-        MARKET_TYPE_NOT_SUPPORTED
-            The market ID supplied refers to a market that is not supported by
-            the API. Currently, this includes Line and Range markets.
+        INVALID_COUNTRY_CODE
+            A country code is not a valid ISO3 code
+        INVALID_EVENT_TYPE_ID
+            An event type ID is not valid
+        INVALID_LOCALE
+            The locale is not valid
 
     """
 
+    # the response element, which differs for GetInPlayMarketsResp
+    _responseElement = 'getAllMarketsResponse'
+    
     def __init__(self, doc):
         """Initialise a new instance.
         
@@ -1964,33 +5617,67 @@ class GetMarketPricesCompressedResp:
         
         # store the xml in case we want to see the raw data
         self.node = doc.getElementsByTagNameNS(_EXCHANGE_SOAP_NAMESPACE,
-                                               'getMarketPricesCompressedResponse')[0]
+                                               self._responseElement)[0]
             
         tag = self.node.getElementsByTagName
 
         self.header = APIResponseHeader(tag('header')[0])
         self.errorCode = tag('errorCode')[0].childNodes[0].nodeValue
         
-        # market prices (might be null)
-        marketPrices = tag('marketPrices')[0].childNodes[0].nodeValue or None
-        self.marketPrices = str(marketPrices)
+        # market data (might be null). The payload can be long enough for 
+        # the parser to split it into several text nodes
+        marketData = tag('marketData')[0]
+        self.marketData = marketData.hasChildNodes() \
+            and ''.join([ node.nodeValue for node in marketData.childNodes ]) \
+            or None
         
         # minor error code (might be null)
         minorErrorCode = tag('minorErrorCode')[0]
         self.minorErrorCode = minorErrorCode.hasChildNodes() \
             and minorErrorCode.childNodes[0].nodeValue \
             or None
+            
+    def iterMarkets(self):
+        """Yield a MarketData for each market in the response."""
+        if self.marketData: return _iter_all_markets(self.marketData)
+        return iter(())
         
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
-        return '''GetMarketPricesCompressedResp
+        return '''%s
             header: %s
-            marketPrices: %s
+            markets: %i
             errorCode: %s
-            ''' % (str(self.header), str(self.marketPrices), self.errorCode)
+            ''' % (self.__class__.__name__, str(self.header), 
+                   len(list(self.iterMarkets())), self.errorCode)
+
+class GetInPlayMarketsResp(GetAllMarketsResp):
+    
+    """Encapsulates a getInPlayMarkets response from the API.
+    
+    The markets are in the same format as those of getAllMarkets. They 
+    include markets due to turn in-play within the next 24 hours, which 
+    have no bet delay until they do.
+    
+    Attributes:
+        header         -- APIResponseHeader
+        errorCode      -- if not 'OK', indicates a non service specific error 
+                          has occurred. See below.
+        marketData     -- the compressed market data string
+        minorErrorCode -- reserved for future use - currently always null
+
+    Error codes:        
+        API_ERROR
+            General API Error
+        INVALID_LOCALE
+            The locale is not valid
+
+    """
+    
+    _responseElement = 'getInPlayMarketsResponse'
 
 class GetCompleteMarketPricesCompressedResp:
     
@@ -2000,7 +5687,9 @@ class GetCompleteMarketPricesCompressedResp:
         header                 -- APIResponseHeader
         errorCode              -- if not 'OK', indicates a non service specific error 
                                   has occurred. See below.
-        completeMarketPrices   -- CompleteMarketPrices
+        completeMarketPrices   -- CompleteMarketPrices, parsed from the 
+                                  compressed data
+        completeMarketPricesData -- the compressed market prices string
         minorErrorCode         -- reserved for future use - currently always null
 
     Error codes:        
@@ -2039,8 +5728,13 @@ class GetCompleteMarketPricesCompressedResp:
         self.errorCode = tag('errorCode')[0].childNodes[0].nodeValue
         
         # market prices (might be null)
-        marketPrices = tag('completeMarketPrices')[0].childNodes[0].nodeValue or None
-        self.marketPrices = str(marketPrices)
+        completeMarketPrices = tag('completeMarketPrices')[0]
+        self.completeMarketPricesData = completeMarketPrices.hasChildNodes() \
+            and str(completeMarketPrices.childNodes[0].nodeValue) \
+            or None
+        self.completeMarketPrices = self.completeMarketPricesData \
+            and _parse_complete_market_prices(self.completeMarketPricesData) \
+            or None
         
         # minor error code (might be null)
         minorErrorCode = tag('minorErrorCode')[0]
@@ -2050,14 +5744,15 @@ class GetCompleteMarketPricesCompressedResp:
         
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
         return '''GetCompleteMarketPricesCompressedResp
             header: %s
-            marketPrices: %s
+            completeMarketPrices: %s
             errorCode: %s
-            ''' % (str(self.header), str(self.marketPrices), self.errorCode)
+            ''' % (str(self.header), str(self.completeMarketPrices), 
+                   self.errorCode)
 
 class GetSilksResp:
     
@@ -2116,7 +5811,7 @@ class GetSilksResp:
         
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
 
     def __str__(self):
         return '''GetSilksResp
@@ -2196,7 +5891,7 @@ class GetCurrentBetsResp:
        
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
         return '''GetCurrentBetsResp
@@ -2276,7 +5971,7 @@ class GetMUBetsResp:
        
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
         return '''GetMUBetsResp
@@ -2288,6 +5983,126 @@ class GetMUBetsResp:
                     [ str(bet) for bet in self.bets ], \
                     self.errorCode)
                     
+class GetCurrentBetsLiteResp:
+    
+    """Encapsulates a getCurrentBetsLite response from the API.
+    
+    Attributes:
+        header           -- APIResponseHeader
+        betLites         -- list of BetLite
+        errorCode        -- if not 'OK', indicates a non service specific error 
+                            has occurred. See GetCurrentBetsResp for the codes.
+        minorErrorCode   -- reserved for future use - currently always null
+        totalRecordCount -- total number of records available
+
+    """
+
+    def __init__(self, doc):
+        """Initialise a new instance.
+        
+        doc -- the Xml doc to initialise from
+        
+        """
+        
+        # store the xml in case we want to see the raw data
+        self.node = doc.getElementsByTagNameNS(_EXCHANGE_SOAP_NAMESPACE,
+                                               'getCurrentBetsLiteResponse')[0]
+            
+        tag = self.node.getElementsByTagName
+
+        self.header = APIResponseHeader(tag('header')[0])
+        
+        # bets (might be null)
+        betLites = tag('betLites')[0]
+        self.betLites = betLites.hasChildNodes() \
+            and [ BetLite(node) for node in betLites.childNodes ] \
+            or []
+            
+        self.errorCode = tag('errorCode')[0].childNodes[0].nodeValue
+        
+        # minor error code (might be null)
+        minorErrorCode = tag('minorErrorCode')[0]
+        self.minorErrorCode = minorErrorCode.hasChildNodes() \
+            and minorErrorCode.childNodes[0].nodeValue \
+            or None
+            
+        self.totalRecordCount = int(tag('totalRecordCount')[0] \
+            .childNodes[0].nodeValue)
+       
+    def __repr__(self):
+        """Returns formatted XML representing the object."""
+        return _node_xml(self)
+        
+    def __str__(self):
+        return '''GetCurrentBetsLiteResp
+            header: %s
+            totalRecordCount: %i
+            betLites: %s
+            errorCode: %s
+            ''' % (str(self.header), self.totalRecordCount, \
+                    [ str(bet) for bet in self.betLites ], \
+                    self.errorCode)
+                    
+class GetMUBetsLiteResp:
+    
+    """Encapsulates a getMUBetsLite response from the API.
+    
+    Attributes:
+        header           -- APIResponseHeader
+        betLites         -- list of MUBetLite
+        errorCode        -- if not 'OK', indicates a non service specific error 
+                            has occurred. See GetMUBetsResp for the codes.
+        minorErrorCode   -- reserved for future use - currently always null
+        totalRecordCount -- total number of records available
+
+    """
+
+    def __init__(self, doc):
+        """Initialise a new instance.
+        
+        doc -- the Xml doc to initialise from
+        
+        """
+        
+        # store the xml in case we want to see the raw data
+        self.node = doc.getElementsByTagNameNS(_EXCHANGE_SOAP_NAMESPACE,
+                                               'getMUBetsLiteResponse')[0]
+            
+        tag = self.node.getElementsByTagName
+
+        self.header = APIResponseHeader(tag('header')[0])
+        
+        # bets (might be null)
+        betLites = tag('betLites')[0]
+        self.betLites = betLites.hasChildNodes() \
+            and [ MUBetLite(node) for node in betLites.childNodes ] \
+            or []
+            
+        self.errorCode = tag('errorCode')[0].childNodes[0].nodeValue
+        
+        # minor error code (might be null)
+        minorErrorCode = tag('minorErrorCode')[0]
+        self.minorErrorCode = minorErrorCode.hasChildNodes() \
+            and minorErrorCode.childNodes[0].nodeValue \
+            or None
+            
+        self.totalRecordCount = int(tag('totalRecordCount')[0] \
+            .childNodes[0].nodeValue)
+       
+    def __repr__(self):
+        """Returns formatted XML representing the object."""
+        return _node_xml(self)
+        
+    def __str__(self):
+        return '''GetMUBetsLiteResp
+            header: %s
+            totalRecordCount: %i
+            betLites: %s
+            errorCode: %s
+            ''' % (str(self.header), self.totalRecordCount, \
+                    [ str(bet) for bet in self.betLites ], \
+                    self.errorCode)
+                    
 class GetMarketProfitAndLossResp:
     
     """Encapsulates a getMarketProfitAndLoss response from the API.
@@ -2364,27 +6179,162 @@ class GetMarketProfitAndLossResp:
             
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
+        
+    def __str__(self):
+        return '''GetMarketProfitAndLossResp
+            header: %s
+            annotations: %s
+            errorCode: %s
+            ''' % (str(self.header), [ str(pl) for pl in self.annotations ], \
+                    self.errorCode)
+                    
+class KeepAliveResp:
+    
+    """Encapsulates a keepAlive response from the API.
+    
+    Attributes:
+        header         -- APIResponseHeader
+        apiVersion     -- list of ProfitAndLoss
+        minorErrorCode -- reserved for future use - currently always null
+                               
+    """
+    
+    def __init__(self, doc):
+        """Initialise a new instance.
+        
+        doc -- the Xml doc to initialise from
+        
+        """
+        
+        # store the xml in case we want to see the raw data
+        self.node = doc.getElementsByTagNameNS(_GLOBAL_SOAP_NAMESPACE,
+                                               'keepAliveResponse')[0]
+            
+        tag = self.node.getElementsByTagName
+
+        self.header = APIResponseHeader(tag('header')[0])
+        
+        # api version (might be null)
+        apiVersion = tag('apiVersion')[0]
+        self.apiVersion = apiVersion.hasChildNodes() \
+            and apiVersion.childNodes[0].nodeValue \
+            or None
+            
+        # minor error code (might be null)
+        minorErrorCode = tag('minorErrorCode')[0]
+        self.minorErrorCode = minorErrorCode.hasChildNodes() \
+            and minorErrorCode.childNodes[0].nodeValue \
+            or None
+            
+    def __repr__(self):
+        """Returns formatted XML representing the object."""
+        return _node_xml(self)
+        
+    def __str__(self):
+        return '''KeepAliveResp
+            header: %s
+            apiVersion: %s
+            ''' % (str(self.header), self.apiVersion)
+
+class GetMarketTradedVolumeResp:
+    
+    """Encapsulates a getMarketTradedVolume response from the API.
+    
+    Attributes:
+        header         -- APIResponseHeader
+        errorCode      -- if not 'OK', indicates a non service specific 
+                          error has occurred. See below.
+        minorErrorCode -- reserved for future use - currently always null
+        priceItems     -- list of VolumeInfo
+
+    Error codes:
+        API_ERROR
+            General API Error
+        NO_RESULTS
+            No results where returned for the request arguments
+        INVALID_MARKET
+            The market ID specified does not exist
+        INVALID_RUNNER
+            The runner ID specified does not exist
+        INVALID_ASIAN_LINE
+            The asian line specified does not exist
+        MARKET_CLOSED
+            Market closed
+        MARKET_TYPE_NOT_SUPPORTED
+            The specified market ID corresponds to a market that is not 
+            supported for this service
+        INVALID_CURRENCY
+            The currency code is not valid
+    
+    """
+
+    def __init__(self, doc):
+        """Initialise a new instance.
+        
+        doc -- the Xml doc to initialise from
+        
+        """
+        
+        # store the xml in case we want to see the raw data
+        self.node = doc.getElementsByTagNameNS(_EXCHANGE_SOAP_NAMESPACE,
+                                             'getMarketTradedVolumeResponse')[0]
+            
+        tag = self.node.getElementsByTagName
+
+        self.header = APIResponseHeader(tag('header')[0])
+        self.errorCode = tag('errorCode')[0].childNodes[0].nodeValue
+        
+        # minor error code (might be null)
+        minorErrorCode = tag('minorErrorCode')[0]
+        self.minorErrorCode = minorErrorCode.hasChildNodes() \
+            and minorErrorCode.childNodes[0].nodeValue \
+            or None
+            
+        # prices (might be null)
+        priceItems = tag('priceItems')[0]
+        self.priceItems = priceItems.hasChildNodes() \
+            and [ VolumeInfo(price) for price in priceItems.childNodes ] \
+            or []
+    
+    def __repr__(self):
+        """Returns formatted XML representing the object."""
+        return _node_xml(self)
         
     def __str__(self):
-        return '''GetMarketProfitAndLossResp
+        return '''GetMarketTradedVolumeResp
             header: %s
-            annotations: %s
-            errorCode: %s
-            ''' % (str(self.header), [ str(pl) for pl in self.annotations ], \
-                    self.errorCode)
-                    
-class KeepAliveResp:
+            priceItems: %s
+            ''' % (str(self.header), [ str(item) for item in self.priceItems ])
+
+class GetMarketTradedVolumeCompressedResp:
     
-    """Encapsulates a keepAlive response from the API.
+    """Encapsulates a getMarketTradedVolumeCompressed response from the API.
     
     Attributes:
-        header         -- APIResponseHeader
-        apiVersion     -- list of ProfitAndLoss
-        minorErrorCode -- reserved for future use - currently always null
-                               
-    """
+        header           -- APIResponseHeader
+        errorCode        -- if not 'OK', indicates a non service specific 
+                            error has occurred. See below.
+        currencyCode     -- three letter ISO 4217 code of the amounts
+        marketId         -- id of the market
+        minorErrorCode   -- reserved for future use - currently always null
+        tradedVolume     -- MarketTradedVolume, parsed from the compressed 
+                            data (None if there was none)
+        tradedVolumeData -- the compressed traded volume string
+
+    Error codes:
+        API_ERROR
+            General API Error
+        INVALID_CURRENCY
+            The currency code is not valid
+        INVALID_MARKET
+            The market ID specified does not exist
+        MARKET_TYPE_NOT_SUPPORTED
+            The specified market ID corresponds to a market that is not 
+            supported for this service
     
+    """
+
     def __init__(self, doc):
         """Initialise a new instance.
         
@@ -2393,66 +6343,85 @@ class KeepAliveResp:
         """
         
         # store the xml in case we want to see the raw data
-        self.node = doc.getElementsByTagNameNS(_GLOBAL_SOAP_NAMESPACE,
-                                               'keepAliveResponse')[0]
+        self.node = doc.getElementsByTagNameNS(_EXCHANGE_SOAP_NAMESPACE,
+                                    'getMarketTradedVolumeCompressedResponse')[0]
             
         tag = self.node.getElementsByTagName
 
         self.header = APIResponseHeader(tag('header')[0])
+        self.errorCode = tag('errorCode')[0].childNodes[0].nodeValue
+        self.marketId = int(tag('marketId')[0].childNodes[0].nodeValue)
         
-        # api version (might be null)
-        apiVersion = tag('apiVersion')[0]
-        self.apiVersion = apiVersion.hasChildNodes() \
-            and apiVersion.childNodes[0].nodeValue \
+        # currency code (might be null)
+        currencyCode = tag('currencyCode')[0]
+        self.currencyCode = currencyCode.hasChildNodes() \
+            and currencyCode.childNodes[0].nodeValue \
             or None
-            
+        
         # minor error code (might be null)
         minorErrorCode = tag('minorErrorCode')[0]
         self.minorErrorCode = minorErrorCode.hasChildNodes() \
             and minorErrorCode.childNodes[0].nodeValue \
             or None
             
+        # traded volume (might be null)
+        tradedVolume = tag('tradedVolume')[0]
+        self.tradedVolumeData = tradedVolume.hasChildNodes() \
+            and str(''.join([ node.nodeValue 
+                              for node in tradedVolume.childNodes ])) \
+            or None
+        self.tradedVolume = self.tradedVolumeData \
+            and MarketTradedVolume(self.marketId, self.currencyCode, 
+                    _parse_market_traded_volume(self.tradedVolumeData)) \
+            or None
+    
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
-        return '''KeepAliveResp
+        return '''GetMarketTradedVolumeCompressedResp
             header: %s
-            apiVersion: %s
-            ''' % (str(self.header), self.apiVersion)
+            tradedVolume: %s
+            errorCode: %s
+            ''' % (str(self.header), str(self.tradedVolume), self.errorCode)
 
-class GetMarketTradedVolumeResp:
+class GetDetailAvailableMktDepthResp:
     
-    """Encapsulates a getMarketTradedVolume response from the API.
+    """Encapsulates a getDetailAvailableMktDepth response from the API.
     
     Attributes:
         header         -- APIResponseHeader
         errorCode      -- if not 'OK', indicates a non service specific 
                           error has occurred. See below.
+        depth          -- RunnerDepth of the amounts available at each price 
+                          (None if there were none)
         minorErrorCode -- reserved for future use - currently always null
-        priceItems     -- list of VolumeInfo
 
     Error codes:
         API_ERROR
             General API Error
-        NO_RESULTS
-            No results where returned for the request arguments
+        INVALID_ASIAN_LINE
+            The asian line specified does not exist
+        INVALID_CURRENCY
+            The currency code is not valid
         INVALID_MARKET
             The market ID specified does not exist
         INVALID_RUNNER
             The runner ID specified does not exist
-        INVALID_ASIAN_LINE
-            The asian line specified does not exist
-        MARKET_CLOSED
-            Market closed
         MARKET_TYPE_NOT_SUPPORTED
             The specified market ID corresponds to a market that is not 
             supported for this service
-        INVALID_CURRENCY
-            The currency code is not valid
+        NO_RESULTS
+            No results where returned for the request arguments
+        SUSPENDED_MARKET
+            The market is suspended
     
     """
+    
+    # the AvailabilityInfo fields, in the order of the PriceLadder columns
+    _columns = ('odds', 'totalAvailableBackAmount', 'totalAvailableLayAmount',
+                'totalBspBackAmount', 'totalBspLayAmount')
 
     def __init__(self, doc):
         """Initialise a new instance.
@@ -2463,7 +6432,7 @@ class GetMarketTradedVolumeResp:
         
         # store the xml in case we want to see the raw data
         self.node = doc.getElementsByTagNameNS(_EXCHANGE_SOAP_NAMESPACE,
-                                             'getMarketTradedVolumeResponse')[0]
+                                    'getDetailAvailableMktDepthResponse')[0]
             
         tag = self.node.getElementsByTagName
 
@@ -2476,21 +6445,27 @@ class GetMarketTradedVolumeResp:
             and minorErrorCode.childNodes[0].nodeValue \
             or None
             
-        # prices (might be null)
+        # prices (might be null). Each field is read for all the prices at 
+        # once, straight into the ladder's columns
         priceItems = tag('priceItems')[0]
-        self.priceItems = priceItems.hasChildNodes() \
-            and [ VolumeInfo(price) for price in priceItems.childNodes ] \
-            or []
+        self.depth = None
+        if priceItems.hasChildNodes():
+            items = priceItems.getElementsByTagName
+            self.depth = RunnerDepth()
+            _set_ladder(self.depth, [ [ float(node.childNodes[0].nodeValue)
+                                        for node in items(name) ] 
+                                      for name in self._columns ])
     
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
-        return '''GetMarketTradedVolumeResp
+        return '''GetDetailAvailableMktDepthResp
             header: %s
-            priceItems: %s
-            ''' % (str(self.header), [ str(item) for item in self.priceItems ])
+            depth: %s
+            errorCode: %s
+            ''' % (str(self.header), str(self.depth), self.errorCode)
 
 class GetAccountFundsResp:
     
@@ -2562,7 +6537,7 @@ class GetAccountFundsResp:
             
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
         return '''GetAccountFundsResp
@@ -2615,7 +6590,7 @@ class GetSubscriptionInfoResp:
             
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
         return '''GetSubscriptionInfoResp
@@ -2687,7 +6662,7 @@ class GetAccountStatementResp:
             
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
         return '''GetAccountStatementResp
@@ -2766,7 +6741,7 @@ class GetBetHistoryResp:
        
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
         return '''GetBetHistoryResp
@@ -2858,7 +6833,7 @@ class PlaceBetsResp:
             
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
 class CancelBetsResp:
     
@@ -2918,7 +6893,7 @@ class CancelBetsResp:
             
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
 class UpdateBetsResp:
     
@@ -2985,7 +6960,7 @@ class UpdateBetsResp:
             
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
 class GetBetResp:
     
@@ -3031,7 +7006,7 @@ class GetBetResp:
        
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
         return '''GetBetResp
@@ -3040,6 +7015,98 @@ class GetBetResp:
             errorCode: %s
             ''' % (str(self.header), str(self.bet), self.errorCode)
                     
+class GetBetLiteResp:
+    
+    """Encapsulates a getBetLite response from the API.
+    
+    Attributes:
+        header           -- APIResponseHeader
+        betLite          -- a BetLite
+        errorCode        -- if not 'OK', indicates a non service specific error 
+                            has occurred. See GetBetResp for the codes.
+
+    """
+
+    def __init__(self, doc):
+        """Initialise a new instance.
+        
+        doc -- the Xml doc to initialise from
+        
+        """
+        
+        # store the xml in case we want to see the raw data
+        self.node = doc.getElementsByTagNameNS(_EXCHANGE_SOAP_NAMESPACE,
+                                               'getBetLiteResponse')[0]
+            
+        tag = self.node.getElementsByTagName
+
+        self.header = APIResponseHeader(tag('header')[0])
+        
+        # bet (might be null)
+        betLite = tag('betLite')[0]
+        self.betLite = betLite.hasChildNodes() and BetLite(betLite) or None
+            
+        self.errorCode = tag('errorCode')[0].childNodes[0].nodeValue
+       
+    def __repr__(self):
+        """Returns formatted XML representing the object."""
+        return _node_xml(self)
+        
+    def __str__(self):
+        return '''GetBetLiteResp
+            header: %s
+            betLite: %s
+            errorCode: %s
+            ''' % (str(self.header), str(self.betLite), self.errorCode)
+                    
+class GetBetMatchesLiteResp:
+    
+    """Encapsulates a getBetMatchesLite response from the API.
+    
+    Attributes:
+        header           -- APIResponseHeader
+        matchLites       -- list of MatchLite
+        errorCode        -- if not 'OK', indicates a non service specific error 
+                            has occurred. See GetBetResp for the codes.
+
+    """
+
+    def __init__(self, doc):
+        """Initialise a new instance.
+        
+        doc -- the Xml doc to initialise from
+        
+        """
+        
+        # store the xml in case we want to see the raw data
+        self.node = doc.getElementsByTagNameNS(_EXCHANGE_SOAP_NAMESPACE,
+                                               'getBetMatchesLiteResponse')[0]
+            
+        tag = self.node.getElementsByTagName
+
+        self.header = APIResponseHeader(tag('header')[0])
+        
+        # matches (might be null)
+        matchLites = tag('matchLites')[0]
+        self.matchLites = matchLites.hasChildNodes() \
+            and [ MatchLite(node) for node in matchLites.childNodes ] \
+            or []
+            
+        self.errorCode = tag('errorCode')[0].childNodes[0].nodeValue
+       
+    def __repr__(self):
+        """Returns formatted XML representing the object."""
+        return _node_xml(self)
+        
+    def __str__(self):
+        return '''GetBetMatchesLiteResp
+            header: %s
+            matchLites: %s
+            errorCode: %s
+            ''' % (str(self.header), 
+                   [ str(match) for match in self.matchLites ], 
+                   self.errorCode)
+                    
 class EventType:
     
     """Represents an event type (sport, or top-level event) on Betfair.
@@ -3059,7 +7126,7 @@ class EventType:
         
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
 
     def __str__(self):
         return '(%i: %s)' % (self.id, self.name)
@@ -3095,7 +7162,7 @@ class BFEvent:
                     
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
     
     def __str__(self):
         return '(%i, %s)' % (self.eventId, self.eventName)
@@ -3138,13 +7205,288 @@ class MarketSummary:
 
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
 
     def __str__(self):
         return '(%i, %s, %s)' % (self.marketId, 
                                  self.exchangeId == 1 and "UK" or "AUS",
                                  self.marketName)
         
+class MarketData(object):
+    
+    """Summarises a market, as returned by getAllMarkets.
+    
+    Attributes:
+        marketId           -- the id of the market
+        marketName         -- the name of the market
+        marketType         -- (O)dds, (L)ine, (R)ange, (A)sian Handicap
+        marketStatus       -- ACTIVE, CLOSED, INACTIVE, SUSPENDED
+        eventDate          -- the scheduled start time of the market (UTC)
+        menuPath           -- the path to the market through the events
+        eventHierarchy     -- tuple of the ids of the events on the way to 
+                              the market, starting with the event type
+        eventTypeId        -- the id of the top-level sport for this market
+        delay              -- the number of seconds delay for in-play bets
+        exchangeId         -- the id of the exchange server that hosts this
+                              market
+        countryISO3        -- ISO code for the country in which the market 
+                              takes place (None if it has none)
+        lastRefresh        -- the time the market information was last read 
+                              from the database, in milliseconds since the 
+                              epoch
+        numberOfRunners    -- the number of runners in the market
+        numberOfWinners    -- the number of winners in the market
+        totalAmountMatched -- the amount matched on the market
+        bspMarket          -- True if the market supports Betfair SP bets
+        turningInPlay      -- True if the market is scheduled to go in-play
+        
+    """
+    __slots__ = ('marketId', 'marketName', 'marketType', 'marketStatus',
+                 'eventDate', 'menuPath', 'eventHierarchy', 'delay',
+                 'exchangeId', 'countryISO3', 'lastRefresh', 
+                 'numberOfRunners', 'numberOfWinners', 'totalAmountMatched',
+                 'bspMarket', 'turningInPlay')
+    
+    def __init__(self, fields):
+        """Initialise a new instance from the fields of a getAllMarkets 
+        payload, with the escaped separators replaced by 
+        _sanitize_compressed."""
+        self.marketId = int(fields[0])
+        self.marketName = _desanitize_compressed(fields[1])
+        self.marketType = fields[2]
+        self.marketStatus = fields[3]
+        self.eventDate = datetime.utcfromtimestamp(int(fields[4]) / 1000.0)
+        self.menuPath = _desanitize_compressed(fields[5])
+        self.eventHierarchy = tuple([ int(eventId) for eventId 
+                                      in fields[6].split('/') if eventId ])
+        self.delay = int(fields[7])
+        self.exchangeId = int(fields[8])
+        self.countryISO3 = fields[9] or None
+        self.lastRefresh = int(fields[10])
+        self.numberOfRunners = int(fields[11])
+        self.numberOfWinners = int(fields[12])
+        self.totalAmountMatched = _float_or_none(fields[13]) or 0.0
+        self.bspMarket = fields[14] == "Y"
+        self.turningInPlay = fields[15] == "Y"
+        
+    def _get_eventTypeId(self):
+        return self.eventHierarchy and self.eventHierarchy[0] or None
+        
+    eventTypeId = property(_get_eventTypeId)
+        
+    def __str__(self):
+        return '(%i, %s, %s, %s)' % (self.marketId, self.menuPath, 
+                                     self.marketName, self.marketStatus)
+        
+class MarketCatalogue:
+    
+    """An in-memory catalogue of markets that can be searched without 
+    further API calls.
+    
+    The catalogue is usually loaded from getAllMarkets, and can be reloaded
+    from it to pick up new markets and changes of status, e.g.
+    
+        catalogue = MarketCatalogue()
+        resp = exchangeProxy.getAllMarkets(sessionToken, eventTypeIds=[7])
+        catalogue.update(resp.iterMarkets())
+        for market in catalogue.find(country='GBR', status='ACTIVE', 
+                                     fromDate=datetime.utcnow()):
+            ...
+            
+    The text repeated from one market to the next, such as menu paths and 
+    statuses, is shared between the markets, and the indexes searched are 
+    built the first time they are needed after an update.
+    
+    """
+    def __init__(self, markets=()):
+        """Initialise a new catalogue.
+        
+        markets -- MarketData to load into it
+        
+        """
+        self._markets = {}
+        self._strings = {}
+        self._indexes = None
+        self.update(markets)
+        
+    def update(self, markets):
+        """Add markets to the catalogue, replacing any already in it with 
+        the same marketId, and return the number added or replaced."""
+        strings = self._strings
+        catalogue = self._markets
+        count = 0
+        for market in markets:
+            market.marketName = strings.setdefault(market.marketName, 
+                                                   market.marketName)
+            market.marketType = strings.setdefault(market.marketType, 
+                                                   market.marketType)
+            market.marketStatus = strings.setdefault(market.marketStatus, 
+                                                     market.marketStatus)
+            market.menuPath = strings.setdefault(market.menuPath, 
+                                                 market.menuPath)
+            market.countryISO3 = strings.setdefault(market.countryISO3, 
+                                                    market.countryISO3)
+            catalogue[market.marketId] = market
+            count += 1
+            
+        if count: self._indexes = None
+        return count
+        
+    def remove(self, marketId):
+        """Remove a market from the catalogue, if it is in it."""
+        if self._markets.pop(marketId, None) is not None: 
+            self._indexes = None
+            
+    def get(self, marketId):
+        """Return the MarketData for marketId, or None if it isn't in the 
+        catalogue."""
+        return self._markets.get(marketId)
+        
+    def __len__(self):
+        return len(self._markets)
+        
+    def __contains__(self, marketId):
+        return marketId in self._markets
+        
+    def __iter__(self):
+        return iter(self._markets.values())
+        
+    def find(self, eventTypeId=None, country=None, status=None, 
+             fromDate=None, toDate=None):
+        """Return the markets matching all of the criteria given, in order 
+        of their event date.
+        
+        eventTypeId -- id of the event type (sport)
+        country     -- ISO3 code of the country
+        status      -- market status, e.g. ACTIVE
+        fromDate    -- markets with an event date on or after this (UTC)
+        toDate      -- markets with an event date on or before this (UTC)
+        
+        >>> catalogue = MarketCatalogue(_iter_all_markets(
+        ...     ':1~A~O~ACTIVE~1164223800000~\\Soccer~/1/1~0~1~GBR~0~2~1~0.0~N~N'
+        ...     ':2~B~O~ACTIVE~1164227400000~\\Soccer~/1/2~0~1~GBR~0~2~1~0.0~N~N'))
+        >>> [ market.marketId for market in catalogue.find(eventTypeId=1) ]
+        [1, 2]
+        >>> catalogue.find(toDate=datetime(2000, 1, 1))
+        []
+        >>> catalogue.find(status='ACTIVE', fromDate=datetime(2020, 1, 1))
+        []
+        
+        """
+        byEventType, byCountry, byStatus, dates, byDate = self._index()
+        
+        lo = 0
+        if fromDate is not None: lo = bisect_left(dates, fromDate)
+        hi = len(dates)
+        if toDate is not None: hi = bisect_right(dates, toDate)
+        
+        matches = [ index.get(key, _NO_MARKETS) for index, key in 
+                    ((byEventType, eventTypeId), (byCountry, country), 
+                     (byStatus, status)) if key is not None ]
+        if not matches: return byDate[lo:hi]
+        
+        # start from whichever of the matches and the date range is smaller
+        matches.sort(key=len)
+        if len(matches[0]) < hi - lo:
+            markets = [ self._markets[marketId] for marketId in matches[0] ]
+            markets = [ market for market in markets 
+                        if (fromDate is None or market.eventDate >= fromDate)
+                        and (toDate is None or market.eventDate <= toDate) ]
+            markets.sort(key=_market_date_order)
+            matches = matches[1:]
+        else:
+            markets = byDate[lo:hi]
+            
+        for marketIds in matches:
+            markets = [ market for market in markets 
+                        if market.marketId in marketIds ]
+        return markets
+        
+    def _index(self):
+        indexes = self._indexes
+        if indexes is None:
+            byEventType = {}
+            byCountry = {}
+            byStatus = {}
+            for market in self._markets.itervalues():
+                marketId = market.marketId
+                byEventType.setdefault(market.eventTypeId, set()).add(marketId)
+                byCountry.setdefault(market.countryISO3, set()).add(marketId)
+                byStatus.setdefault(market.marketStatus, set()).add(marketId)
+                
+            byDate = self._markets.values()
+            byDate.sort(key=_market_date_order)
+            dates = [ market.eventDate for market in byDate ]
+            
+            indexes = self._indexes = (byEventType, byCountry, byStatus, 
+                                       dates, byDate)
+        return indexes
+        
+# an empty set of marketIds, for criteria that match no markets
+_NO_MARKETS = frozenset()
+
+def _market_date_order(market):
+    return (market.eventDate, market.marketId)
+    
+class InPlayTracker:
+    
+    """Follows which markets are in-play from one getInPlayMarkets call to 
+    the next, so that only the markets that are actually live need polling.
+    
+    A market counts as in-play while it has a bet delay and hasn't closed,
+    since getInPlayMarkets also lists the markets due to turn in-play later
+    in the day, e.g.
+    
+        tracker = InPlayTracker()
+        while True:
+            resp = exchangeProxy.getInPlayMarkets(sessionToken)
+            if resp.errorCode == "OK":
+                wentInPlay, leftInPlay = tracker.update(resp.iterMarkets())
+                ...
+            sleep(interval)
+            
+    Attributes:
+        markets -- dict of the MarketData of the markets in-play, keyed by 
+                   marketId
+                   
+    """
+    def __init__(self):
+        self.markets = {}
+        
+    def update(self, markets):
+        """Replace the markets in-play with those in markets, and return a
+        (wentInPlay, leftInPlay) tuple of lists of MarketData.
+        
+        markets -- MarketData of every market listed by a getInPlayMarkets 
+                   call, e.g. from the iterMarkets of its response
+                   
+        wentInPlay holds the markets that weren't in-play before the update,
+        and leftInPlay the markets that were, as they were last seen.
+        
+        """
+        previous = self.markets
+        current = {}
+        for market in markets:
+            if market.delay > 0 and market.marketStatus != "CLOSED":
+                current[market.marketId] = market
+        self.markets = current
+        
+        wentInPlay = [ market for marketId, market in current.iteritems() 
+                       if marketId not in previous ]
+        leftInPlay = [ market for marketId, market in previous.iteritems() 
+                       if marketId not in current ]
+        return wentInPlay, leftInPlay
+        
+    def isInPlay(self, marketId):
+        """Return True if the market was in-play at the last update."""
+        return marketId in self.markets
+        
+    def __contains__(self, marketId):
+        return marketId in self.markets
+        
+    def __len__(self):
+        return len(self.markets)
+        
 class Market:
     
     """Contains static information for a market on Betfair.
@@ -3217,6 +7559,7 @@ class Market:
         self.parentEventId = int(tag('parentEventId')[0] \
             .childNodes[0].nodeValue)
         self.runners = [ Runner(node) for node in tag('runners')[0].childNodes ]
+        self._runnerIndex = _index_runners(self.runners)
         self.runnersMayBeAdded = tag('runnersMayBeAdded')[0] \
             .childNodes[0].nodeValue == "true"                    
         self.timezone = tag('timezone')[0].childNodes[0].nodeValue
@@ -3227,19 +7570,33 @@ class Market:
 
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
         return '(%i, %s, %s, %s)' % (self.marketId, self.name, \
             self.marketStatus, [ str(runner) for runner in self.runners ])
         
     def findRunner(self, selectionId, asianLineId):
-        for runner in self.runners:
-            if runner.selectionId == selectionId \
-                and runner.asianLineId == asianLineId:
-                return runner
+        """Return the Runner for a selection, or None if it isn't in the 
+        market."""
+        return self._runnerIndex.get((selectionId, asianLineId))
+        
+    def pairRunnerPrices(self, marketPrices):
+        """Pair the runners of the market with their prices.
+        
+        Returns a list of (Runner, RunnerPrices) tuples, in the order of 
+        marketPrices.runnerPrices. marketPrices can be a MarketPrices or 
+        CompleteMarketPrices for the market. The Runner is None for prices on
+        a selection that isn't in the market, e.g. if it was added since the 
+        market was read.
+        
+        """
+        index = self._runnerIndex
+        return [ (index.get((runnerPrices.selectionId, 
+                             runnerPrices.asianLineId)), runnerPrices) 
+                 for runnerPrices in marketPrices.runnerPrices ]
     
-class Runner:
+class Runner(object):
     
     """Represents a runner in a Betfair market.
     
@@ -3254,11 +7611,14 @@ class Runner:
         selectionId         -- runner id
         
     """
+    __slots__ = ('node', 'asianLineId', 'handicap', 'name',
+                 'asianDoubleLineName', 'selectionId')
+    
     def __init__(self, node):
-        # store the xml in case we want to see the raw data
-        self.node = node
+        # store the xml if we want to see the raw data
+        self.node = KEEP_DOMAIN_XML and node or None
         
-        tag = self.node.getElementsByTagName
+        tag = node.getElementsByTagName
                     
         self.asianLineId = int(tag('asianLineId')[0].childNodes[0].nodeValue)
         self.handicap = float(tag('handicap')[0].childNodes[0].nodeValue)
@@ -3272,8 +7632,8 @@ class Runner:
         self.selectionId = int(tag('selectionId')[0].childNodes[0].nodeValue)
             
     def __repr__(self):
-        """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        """Returns formatted XML representing the object, if it was kept."""
+        return _node_xml(self)
         
     def __str__(self):
         return '(%i-%i, %s)' % (self.asianLineId, self.selectionId, self.name)
@@ -3304,10 +7664,17 @@ class MarketPrices:
         runnerPrices    -- list of RunnerPrices, empty if market is not active
         
     """
-    def __init__(self, node):
+    # (selectionId, asianLineId) -> RunnerPrices, built when the runner prices
+    # are read
+    _runnerPricesIndex = None
+    
+    def __init__(self, node=None):
         # store the xml in case we want to see the raw data
         self.node = node
         
+        # instances built from compressed data are populated by the parser
+        if node is None: return
+        
         tag = self.node.getElementsByTagName
         
         self.currencyCode = tag('currencyCode')[0].childNodes[0].nodeValue
@@ -3333,17 +7700,17 @@ class MarketPrices:
         
         # sort runner list
         self.runnerPrices.sort(lambda x,y: x.sortOrder - y.sortOrder)
+        self._runnerPricesIndex = _index_runners(self.runnerPrices)
                 
     def getRunnerPrices(self, selectionId, asianLineId=0):
-        for runnerPrices in self.runnerPrices:
-            if runnerPrices.asianLineId == asianLineId \
-                                and runnerPrices.selectionId == selectionId:
-                return runnerPrices
-        return None
+        """Return the RunnerPrices for a selection, or None."""
+        if self._runnerPricesIndex is None:
+            self._runnerPricesIndex = _index_runners(self.runnerPrices)
+        return self._runnerPricesIndex.get((selectionId, asianLineId))
         
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
         return '(%i, %s, %s)' % (self.marketId, self.marketStatus, \
@@ -3376,7 +7743,7 @@ class MarketPrices:
             
         return (back, lay)
         
-class RunnerPrices:
+class RunnerPrices(object):
     
     """Represents the prices available on a runner.
     
@@ -3399,11 +7766,19 @@ class RunnerPrices:
                               runners in greyhound markets
 
     """
-    def __init__(self, node):
-        # store the xml in case we want to see the raw data
-        self.node = node
+    __slots__ = ('node', 'asianLineId', 'bestPricesToBack', 'bestPricesToLay',
+                 'handicap', 'lastPriceMatched', 'reductionFactor',
+                 'selectionId', 'sortOrder', 'totalAmountMatched', 'vacant',
+                 'farBSP', 'nearBSP', 'actualBSP')
+    
+    def __init__(self, node=None):
+        # store the xml if we want to see the raw data
+        self.node = KEEP_DOMAIN_XML and node or None
         
-        tag = self.node.getElementsByTagName
+        # instances built from compressed data are populated by the parser
+        if node is None: return
+        
+        tag = node.getElementsByTagName
         
         self.asianLineId = int(tag('asianLineId')[0].childNodes[0].nodeValue)
             
@@ -3439,40 +7814,278 @@ class RunnerPrices:
         self.vacant = tag('vacant')[0].childNodes[0].nodeValue == "true"
             
     def __repr__(self):
-        """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        """Returns formatted XML representing the object, if it was kept."""
+        return _node_xml(self)
+        
+    def __str__(self):
+        return '(%i-%i, backPrices %s, layPrices %s)' % \
+            (self.asianLineId, self.selectionId, \
+            [ str(price) for price in self.bestPricesToBack ], \
+            [ str(price) for price in self.bestPricesToLay ])
+            
+    def backPricePercentage(self):
+        """Return the best available back price as a percentage chance of the 
+        runner being settled as a winner.
+        
+        For example, if the best available back price is 1.01, the percentage
+        is calculated as 100/1.01 == 99% chance of victory. Returns 0 if
+        there is no money available to back.
+        
+        """
+        if self.bestPricesToBack[0].amountAvailable == 0: return 0
+        else: return 100 / self.bestPricesToBack[0].price
+        
+    def layPricePercentage(self):
+        """Return the best available lay price as a percentage chance of the 
+        runner being settled as a winner.
+        
+        For example, if the best available lay price is 5, the percentage
+        is calculated as 100/5 == 20% chance of victory. Returns 0 if there 
+        is no money available to lay
+        
+        """
+        if self.bestPricesToLay[0].amountAvailable == 0: return 0
+        else: return 100 / self.bestPricesToLay[0].price
+        
+class CompleteMarketPrices:
+    
+    """Contains the complete price ladder for a market on Betfair.
+    
+    Attributes:
+        delay          -- the number of seconds delay between submission and a
+                          bet actually getting placed. This is greater than 0 
+                          if and only if the market is in-play
+        marketId       -- id of the market
+        removedRunners -- list of RemovedRunner
+        runnerPrices   -- list of CompleteRunnerPrices, empty if market is not
+                          active
+        
+    """
+    # (selectionId, asianLineId) -> CompleteRunnerPrices, built when the 
+    # runner prices are read
+    _runnerPricesIndex = None
+    
+    def getRunnerPrices(self, selectionId, asianLineId=0):
+        """Return the CompleteRunnerPrices for a selection, or None."""
+        if self._runnerPricesIndex is None:
+            self._runnerPricesIndex = _index_runners(self.runnerPrices)
+        return self._runnerPricesIndex.get((selectionId, asianLineId))
+        
+    def __str__(self):
+        return '(%i, %s)' % (self.marketId, \
+            [ str(price) for price in self.runnerPrices ])
+            
+    def calculateTotalMatched(self):
+        return sum([price.totalAmountMatched for price in self.runnerPrices])
+        
+class PriceLadder(object):
+    
+    """The amounts available at every price on a runner.
+    
+    The ladder is held as parallel arrays, sorted by ascending price, so 
+    the amounts at prices[i] are backAmounts[i], layAmounts[i] and so on.
+    
+    >>> ladder = PriceLadder()
+    >>> _set_ladder(ladder, [[2.0, 2.5, 3.0, 3.5], [50.0, 20.0, 0.0, 0.0],
+    ...                      [0.0, 0.0, 10.0, 30.0], [0.0] * 4, [0.0] * 4])
+    >>> ladder.cumulativeBackAmounts().tolist()
+    [70.0, 20.0, 0.0, 0.0]
+    >>> ladder.estimateBackFill(40.0)
+    (40.0, 2.25, 2.0)
+    >>> ladder.estimateLayFill(50.0)
+    (40.0, 3.375, 3.5)
+    
+    Attributes:
+        backAmounts    -- amount available to back at each price
+        bspBackAmounts -- amount of BSP back bets at each price
+        bspLayAmounts  -- amount of BSP lay bets at each price
+        layAmounts     -- amount available to lay at each price
+        prices         -- the prices in the ladder
         
-    def __str__(self):
-        return '(%i-%i, backPrices %s, layPrices %s)' % \
-            (self.asianLineId, self.selectionId, \
-            [ str(price) for price in self.bestPricesToBack ], \
-            [ str(price) for price in self.bestPricesToLay ])
+    """
+    __slots__ = ('backAmounts', 'bspBackAmounts', 'bspLayAmounts', 
+                 'layAmounts', 'prices')
+    
+    def getBestPricesToBack(self, depth=3):
+        """Return the best prices available to back, as a list of Price.
+        
+        The list is padded with empty prices to the depth requested, the same 
+        as RunnerPrices.bestPricesToBack.
+        
+        """
+        prices = []
+        i = len(self.prices) - 1
+        while i >= 0 and len(prices) < depth:
+            if self.backAmounts[i] > 0:
+                price = Price(betType="L", depth=len(prices) + 1)
+                price.price = self.prices[i]
+                price.amountAvailable = self.backAmounts[i]
+                prices.append(price)
+            i -= 1
             
-    def backPricePercentage(self):
-        """Return the best available back price as a percentage chance of the 
-        runner being settled as a winner.
+        while len(prices) < depth:
+            prices.append(Price(betType="L", depth=len(prices) + 1))
+            
+        return prices
         
-        For example, if the best available back price is 1.01, the percentage
-        is calculated as 100/1.01 == 99% chance of victory. Returns 0 if
-        there is no money available to back.
+    def getBestPricesToLay(self, depth=3):
+        """Return the best prices available to lay, as a list of Price.
+        
+        The list is padded with empty prices to the depth requested, the same 
+        as RunnerPrices.bestPricesToLay.
         
         """
-        if self.bestPricesToBack[0].amountAvailable == 0: return 0
-        else: return 100 / self.bestPricesToBack[0].price
+        prices = []
+        i = 0
+        while i < len(self.prices) and len(prices) < depth:
+            if self.layAmounts[i] > 0:
+                price = Price(betType="B", depth=len(prices) + 1)
+                price.price = self.prices[i]
+                price.amountAvailable = self.layAmounts[i]
+                prices.append(price)
+            i += 1
+            
+        while len(prices) < depth:
+            prices.append(Price(betType="B", depth=len(prices) + 1))
+            
+        return prices
+        
+    def amountAvailableToBack(self, price):
+        """Return the total amount available to back at odds of price or 
+        better (i.e. higher)."""
+        return sum(self.backAmounts[bisect_left(self.prices, price):])
+        
+    def amountAvailableToLay(self, price):
+        """Return the total amount available to lay at odds of price or 
+        better (i.e. lower)."""
+        return sum(self.layAmounts[:bisect_right(self.prices, price)])
+        
+    def cumulativeBackAmounts(self):
+        """Return an array of the total amount available to back at each 
+        price or better, i.e. amountAvailableToBack(prices[i])."""
+        cumulative = array('d', self.backAmounts)
+        for i in range(len(cumulative) - 2, -1, -1):
+            cumulative[i] += cumulative[i + 1]
+        return cumulative
+        
+    def cumulativeLayAmounts(self):
+        """Return an array of the total amount available to lay at each 
+        price or better, i.e. amountAvailableToLay(prices[i])."""
+        cumulative = array('d', self.layAmounts)
+        for i in range(1, len(cumulative)):
+            cumulative[i] += cumulative[i - 1]
+        return cumulative
+        
+    def estimateBackFill(self, stake):
+        """Estimate how a back bet of stake would be matched against the 
+        ladder, taking the best (highest) prices first.
+        
+        Returns a (sizeMatched, averagePrice, worstPrice) tuple. sizeMatched
+        is less than stake if there isn't enough available, and the prices 
+        are None if nothing would be matched.
         
-    def layPricePercentage(self):
-        """Return the best available lay price as a percentage chance of the 
-        runner being settled as a winner.
+        """
+        return self._estimateFill(stake, self.backAmounts, 
+                                  range(len(self.prices) - 1, -1, -1))
         
-        For example, if the best available lay price is 5, the percentage
-        is calculated as 100/5 == 20% chance of victory. Returns 0 if there 
-        is no money available to lay
+    def estimateLayFill(self, stake):
+        """Estimate how a lay bet of stake (the backer's stake) would be 
+        matched against the ladder, taking the best (lowest) prices first.
+        
+        Returns a (sizeMatched, averagePrice, worstPrice) tuple, as for 
+        estimateBackFill.
         
         """
-        if self.bestPricesToLay[0].amountAvailable == 0: return 0
-        else: return 100 / self.bestPricesToLay[0].price
+        return self._estimateFill(stake, self.layAmounts, 
+                                  range(len(self.prices)))
+        
+    def _estimateFill(self, stake, amounts, order):
+        prices = self.prices
+        matched = 0.0
+        total = 0.0
+        worstPrice = None
+        for i in order:
+            if matched >= stake: break
+            if amounts[i] <= 0: continue
+            size = min(amounts[i], stake - matched)
+            matched += size
+            total += size * prices[i]
+            worstPrice = prices[i]
+            
+        if not matched: return 0.0, None, None
+        return matched, total / matched, worstPrice
+        
+class CompleteRunnerPrices(PriceLadder):
+    
+    """Represents the complete price ladder on a runner.
+    
+    The ladder is held as parallel arrays, sorted by ascending price, so 
+    the amounts at prices[i] are backAmounts[i], layAmounts[i] and so on.
+    See PriceLadder for the methods that search it.
+    
+    Attributes:
+        actualBSP          -- the actual Betfair Starting Price, or None
+        asianLineId        -- id of the selection (this will be the same for the
+                              same selection across markets)
+        backAmounts        -- amount available to back at each price
+        bspBackAmounts     -- amount of BSP back bets at each price
+        bspLayAmounts      -- amount of BSP lay bets at each price
+        farBSP             -- the far Betfair Starting Price, or None
+        handicap           -- handicap of the market (applicable to Asian 
+                              Handicap markets)
+        lastPriceMatched   -- last price at which this selection was matched
+        layAmounts         -- amount available to lay at each price
+        nearBSP            -- the near Betfair Starting Price, or None
+        prices             -- the prices in the ladder
+        reductionFactor    -- reduction in the odds that applies in case this 
+                              runner does not participate
+        selectionId        -- id of the selection (this will be the same for the
+                              same selection across markets)
+        sortOrder          -- order in which the items are displayed on Betfair
+        totalAmountMatched -- total amount matched on this selection (regardless
+                              of price)
+        vacant             -- used to indicate a Vacant Trap for withdrawn 
+                              runners in greyhound markets
+
+    """
+    __slots__ = ('actualBSP', 'asianLineId', 'farBSP', 'handicap', 
+                 'lastPriceMatched', 'nearBSP', 'reductionFactor',
+                 'selectionId', 'sortOrder', 'totalAmountMatched', 'vacant')
+    
+    def __str__(self):
+        return '(%i-%i, backPrices %s, layPrices %s)' % \
+            (self.asianLineId, self.selectionId, \
+            [ str(price) for price in self.getBestPricesToBack() ], \
+            [ str(price) for price in self.getBestPricesToLay() ])
+            
+class RunnerDepth(PriceLadder):
+    
+    """Represents the full depth of the market on a runner, as returned by 
+    getDetailAvailableMktDepth.
+    
+    See PriceLadder for the methods that search it.
+    
+    Attributes:
+        asianLineId    -- id of the asian line, 0 if the market isn't Asian 
+                          Handicap
+        backAmounts    -- amount available to back at each price
+        bspBackAmounts -- amount of BSP back bets at each price
+        bspLayAmounts  -- amount of BSP lay bets at each price
+        layAmounts     -- amount available to lay at each price
+        marketId       -- id of the market
+        prices         -- the prices in the ladder
+        selectionId    -- id of the selection
+        
+    """
+    __slots__ = ('asianLineId', 'marketId', 'selectionId')
+    
+    def __str__(self):
+        return '(%i-%i, backPrices %s, layPrices %s)' % \
+            (self.asianLineId, self.selectionId, \
+            [ str(price) for price in self.getBestPricesToBack() ], \
+            [ str(price) for price in self.getBestPricesToLay() ])
         
-class Price:
+class Price(object):
     
     """Represents a single price (back or lay) on a runner.
     
@@ -3484,12 +8097,14 @@ class Price:
         price           -- odds
 
     """
+    __slots__ = ('node', 'amountAvailable', 'betType', 'depth', 'price')
+    
     def __init__(self, node=None, betType="B", depth=1):
-        # store the xml in case we want to see the raw data
-        self.node = node
+        # store the xml if we want to see the raw data
+        self.node = KEEP_DOMAIN_XML and node or None
         
         if node:
-            tag = self.node.getElementsByTagName
+            tag = node.getElementsByTagName
             
             self.amountAvailable = float(tag('amountAvailable')[0] \
                 .childNodes[0].nodeValue)
@@ -3503,15 +8118,32 @@ class Price:
             self.price = 0.0
             
     def __repr__(self):
-        """Returns formatted XML representing the object."""
-        if self.node:
-            return self.node.toprettyxml()
-        else: return ""
-            
+        """Returns formatted XML representing the object, if it was kept."""
+        return _node_xml(self)
+        
     def __str__(self):
         return '(%.2f @ %.2f)' % (self.amountAvailable, self.price)
         
-class Bet:
+class RemovedRunner:
+    """Represents a runner that has been removed from a market.
+    
+    Attributes:
+        name             -- the name of the runner
+        timeRemoved      -- the time at which the runner was removed (HH:MM)
+        adjustmentFactor -- the reduction factor applied to the market as a 
+                            result of the removal, as a percentage
+                            
+    """
+    def __init__(self, name, timeRemoved, adjustmentFactor):
+        self.name = name
+        self.timeRemoved = timeRemoved
+        self.adjustmentFactor = adjustmentFactor
+        
+    def __str__(self):
+        return '(%s, %s, %.1f%%)' % (self.name, self.timeRemoved, 
+                                     self.adjustmentFactor)
+        
+class Bet(object):
     """Represents a single bet on Betfair.
     
     Attributes:
@@ -3548,11 +8180,18 @@ class Bet:
                           applicable)
 
     """
+    __slots__ = ('node', 'asianLineId', 'avgPrice', 'betId', 'betStatus',
+                 'betType', 'cancelledDate', 'lapsedDate', 'marketId',
+                 'marketName', 'marketType', 'matchedDate', 'matchedSize',
+                 'matches', 'placedDate', 'price', 'profitAndLoss',
+                 'selectionId', 'selectionName', 'settledDate',
+                 'remainingSize', 'requestedSize', 'voidedDate')
+    
     def __init__(self, node):
-        # store the xml in case we want to see the raw data
-        self.node = node
+        # store the xml if we want to see the raw data
+        self.node = KEEP_DOMAIN_XML and node or None
         
-        tag = self.node.getElementsByTagName
+        tag = node.getElementsByTagName
         
         self.asianLineId = int(tag('asianLineId')[0].childNodes[0].nodeValue)
         self.avgPrice = float(tag('avgPrice')[0].childNodes[0].nodeValue)
@@ -3593,9 +8232,9 @@ class Bet:
             tag('voidedDate')[0].childNodes[0].nodeValue)
         
     def __repr__(self):
-        """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
-            
+        """Returns formatted XML representing the object, if it was kept."""
+        return _node_xml(self)
+        
     def __str__(self):
         if self.betStatus == "S":
             return '%i (%i %s %s, %.2f)' % (self.betId, self.marketId,
@@ -3617,7 +8256,7 @@ class Bet:
             return '%i (%i %s %s)' % (self.betId, self.marketId, self.betType, 
                                         self.selectionName)
      
-class Match:
+class Match(object):
     """Represents a matched portion of a bet.
     
     Attributes:
@@ -3635,10 +8274,15 @@ class Match:
                          applicable)
 
     """
+    __slots__ = ('node', 'betStatus', 'matchedDate', 'priceMatched',
+                 'profitLoss', 'settledDate', 'sizeMatched', 'transactionId',
+                 'voidedDate')
+    
     def __init__(self, node):
-        self.node = node
+        # store the xml if we want to see the raw data
+        self.node = KEEP_DOMAIN_XML and node or None
         
-        tag = self.node.getElementsByTagName
+        tag = node.getElementsByTagName
         
         self.betStatus = tag('betStatus')[0].childNodes[0].nodeValue
         self.matchedDate = _convert_iso_time(
@@ -3653,13 +8297,13 @@ class Match:
             tag('voidedDate')[0].childNodes[0].nodeValue)
         
     def __repr__(self):
-        """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        """Returns formatted XML representing the object, if it was kept."""
+        return _node_xml(self)
         
     def __str__(self):
         return '(%i, %s)' % (self.transactionId, self.betStatus)
         
-class MUBet:
+class MUBet(object):
     """Represents a matched or unmatched on Betfair.
     
     Attributes:
@@ -3680,11 +8324,15 @@ class MUBet:
                           placed
 
     """
+    __slots__ = ('node', 'asianLineId', 'betId', 'betStatus', 'betType',
+                 'marketId', 'matchedDate', 'size', 'placedDate', 'price',
+                 'selectionId', 'handicap')
+    
     def __init__(self, node):
-        # store the xml in case we want to see the raw data
-        self.node = node
+        # store the xml if we want to see the raw data
+        self.node = KEEP_DOMAIN_XML and node or None
         
-        tag = self.node.getElementsByTagName
+        tag = node.getElementsByTagName
         
         self.asianLineId = int(tag('asianLineId')[0].childNodes[0].nodeValue)
         self.betId = int(tag('betId')[0].childNodes[0].nodeValue)
@@ -3701,15 +8349,161 @@ class MUBet:
         self.handicap = float(tag('handicap')[0].childNodes[0].nodeValue)
         
     def __repr__(self):
-        """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
-            
+        """Returns formatted XML representing the object, if it was kept."""
+        return _node_xml(self)
+        
     def __str__(self):
         return '(%i %s %s, %.2f @ %.2f)' % (self.marketId, self.betType,
                                     self.selectionId, self.size,
                                     self.price)
         
-class ProfitAndLoss:
+class BetLite(object):
+    """Represents the status and sizes of a bet on Betfair, as returned by
+    getCurrentBetsLite and getBetLite.
+    
+    Attributes:
+        betCategoryType    -- (E)xchange, (M)arket on close or (L)imit on close
+        betId              -- unique identifier generated for every bet 
+                              placement
+        betPersistenceType -- (NONE), (IP) persist in-play or (SP) take the 
+                              starting price
+        betStatus          -- (C)ancelled, (L)apsed, (M)atched, (S)ettled, 
+                              (U)nmatched, (V)oided
+        bspLiability       -- liability of a BSP bet (None if not applicable)
+        marketId           -- id of the market
+        matchedSize        -- amount matched
+        remainingSize      -- remaining unmatched, lapsed or cancelled amount
+                              of the bet
+
+    """
+    __slots__ = ('node', 'betCategoryType', 'betId', 'betPersistenceType',
+                 'betStatus', 'bspLiability', 'marketId', 'matchedSize',
+                 'remainingSize')
+    
+    def __init__(self, node):
+        # store the xml if we want to see the raw data
+        self.node = KEEP_DOMAIN_XML and node or None
+        
+        tag = node.getElementsByTagName
+        
+        self.betCategoryType = tag('betCategoryType')[0] \
+            .childNodes[0].nodeValue
+        self.betId = int(tag('betId')[0].childNodes[0].nodeValue)
+        self.betPersistenceType = tag('betPersistenceType')[0] \
+            .childNodes[0].nodeValue
+        self.betStatus = tag('betStatus')[0].childNodes[0].nodeValue
+        
+        # BSP liability (might be null)
+        bspLiability = tag('bspLiability')[0]
+        self.bspLiability = None
+        if bspLiability.hasChildNodes():
+            self.bspLiability = float(bspLiability.childNodes[0].nodeValue)
+            
+        self.marketId = int(tag('marketId')[0].childNodes[0].nodeValue)
+        self.matchedSize = float(tag('matchedSize')[0].childNodes[0].nodeValue)
+        self.remainingSize = float(tag('remainingSize')[0] \
+            .childNodes[0].nodeValue)
+        
+    def __repr__(self):
+        """Returns formatted XML representing the object, if it was kept."""
+        return _node_xml(self)
+        
+    def __str__(self):
+        return '%i (m%i) %s, %.2f matched, %.2f remaining' % (self.betId,
+                    self.marketId, self.betStatus, self.matchedSize, 
+                    self.remainingSize)
+        
+class MUBetLite(object):
+    """Represents the status and size of a matched or unmatched bet on 
+    Betfair, as returned by getMUBetsLite.
+    
+    Attributes:
+        betCategoryType    -- (E)xchange, (M)arket on close or (L)imit on close
+        betId              -- unique identifier generated for every bet 
+                              placement
+        betPersistenceType -- (NONE), (IP) persist in-play or (SP) take the 
+                              starting price
+        betStatus          -- (M)atched or (U)nmatched
+        bspLiability       -- liability of a BSP bet (None if not applicable)
+        marketId           -- id of the market
+        size               -- value of bet
+        transactionId      -- unique identifier for the matched or unmatched 
+                              portion of the bet
+
+    """
+    __slots__ = ('node', 'betCategoryType', 'betId', 'betPersistenceType',
+                 'betStatus', 'bspLiability', 'marketId', 'size', 
+                 'transactionId')
+    
+    def __init__(self, node):
+        # store the xml if we want to see the raw data
+        self.node = KEEP_DOMAIN_XML and node or None
+        
+        tag = node.getElementsByTagName
+        
+        self.betCategoryType = tag('betCategoryType')[0] \
+            .childNodes[0].nodeValue
+        self.betId = int(tag('betId')[0].childNodes[0].nodeValue)
+        self.betPersistenceType = tag('betPersistenceType')[0] \
+            .childNodes[0].nodeValue
+        self.betStatus = tag('betStatus')[0].childNodes[0].nodeValue
+        
+        # BSP liability (might be null)
+        bspLiability = tag('bspLiability')[0]
+        self.bspLiability = None
+        if bspLiability.hasChildNodes():
+            self.bspLiability = float(bspLiability.childNodes[0].nodeValue)
+            
+        self.marketId = int(tag('marketId')[0].childNodes[0].nodeValue)
+        self.size = float(tag('size')[0].childNodes[0].nodeValue)
+        self.transactionId = int(tag('transactionId')[0].childNodes[0].nodeValue)
+        
+    def __repr__(self):
+        """Returns formatted XML representing the object, if it was kept."""
+        return _node_xml(self)
+        
+    def __str__(self):
+        return '%i (m%i) %s, %.2f' % (self.betId, self.marketId, 
+                                      self.betStatus, self.size)
+        
+class MatchLite(object):
+    """Represents a matched portion of a bet, as returned by 
+    getBetMatchesLite.
+    
+    Attributes:
+        betStatus     -- (C)ancelled, (L)apsed, (M)atched, (S)ettled,
+                         (U)nmatched, (V)oided
+        matchedDate   -- date and time at the bet portion was matched
+        priceMatched  -- price at which this portion was matched
+        sizeMatched   -- size matched in this portion
+        transactionId -- unique identifier for the individual transaction
+
+    """
+    __slots__ = ('node', 'betStatus', 'matchedDate', 'priceMatched',
+                 'sizeMatched', 'transactionId')
+    
+    def __init__(self, node):
+        # store the xml if we want to see the raw data
+        self.node = KEEP_DOMAIN_XML and node or None
+        
+        tag = node.getElementsByTagName
+        
+        self.betStatus = tag('betStatus')[0].childNodes[0].nodeValue
+        self.matchedDate = _convert_iso_time(
+            tag('matchedDate')[0].childNodes[0].nodeValue)
+        self.priceMatched = float(tag('priceMatched')[0].childNodes[0].nodeValue)
+        self.sizeMatched = float(tag('sizeMatched')[0].childNodes[0].nodeValue)
+        self.transactionId = int(tag('transactionId')[0].childNodes[0].nodeValue)
+        
+    def __repr__(self):
+        """Returns formatted XML representing the object, if it was kept."""
+        return _node_xml(self)
+        
+    def __str__(self):
+        return '(%i, %s, %.2f @ %.2f)' % (self.transactionId, self.betStatus,
+                                          self.sizeMatched, self.priceMatched)
+        
+class ProfitAndLoss(object):
     """Represents a profit and loss annotation.
     
     Attributes:
@@ -3727,11 +8521,14 @@ class ProfitAndLoss:
         to             -- the to value; includes +infinity
 
     """
+    __slots__ = ('node', 'futureIfWin', 'ifWin', 'selectionId',
+                 'selectionName', 'worstCaseIfWin', 'from_', 'to')
+    
     def __init__(self, node):
-        # store the xml in case we want to see the raw data
-        self.node = node
+        # store the xml if we want to see the raw data
+        self.node = KEEP_DOMAIN_XML and node or None
         
-        tag = self.node.getElementsByTagName
+        tag = node.getElementsByTagName
         
         self.futureIfWin = Decimal(tag('futureIfWin')[0].childNodes[0].nodeValue)
         self.ifWin = float(tag('ifWin')[0].childNodes[0].nodeValue)
@@ -3745,9 +8542,9 @@ class ProfitAndLoss:
             self.to = Decimal(tag('to')[0].childNodes[0].nodeValue)
 
     def __repr__(self):
-        """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
-            
+        """Returns formatted XML representing the object, if it was kept."""
+        return _node_xml(self)
+        
     def __str__(self):
         return '(%i, %s, %.2f)' % (self.selectionId, self.selectionName, \
                                     self.ifWin)
@@ -3772,7 +8569,7 @@ class ProfitAndLoss:
         """
         return _format_double_line_profit(self.from_, self.to, unit)
         
-class VolumeInfo:
+class VolumeInfo(object):
     """Represents information about volume of money traded on a selection.
     
     Attributes:
@@ -3780,11 +8577,13 @@ class VolumeInfo:
         totalMatchedAmount -- total amount matched for the given odds
         
     """
+    __slots__ = ('node', 'odds', 'totalMatchedAmount')
+    
     def __init__(self, node):
-        # store the xml in case we want to see the raw data
-        self.node = node
+        # store the xml if we want to see the raw data
+        self.node = KEEP_DOMAIN_XML and node or None
         
-        tag = self.node.getElementsByTagName
+        tag = node.getElementsByTagName
         #print tag('odds')
         odds = tag('odds')[0].childNodes[0].nodeValue
         
@@ -3801,11 +8600,95 @@ class VolumeInfo:
             .childNodes[0].nodeValue)
         
     def __repr__(self):
-        """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
-            
+        """Returns formatted XML representing the object, if it was kept."""
+        return _node_xml(self)
+        
     def __str__(self):
         return '(%.2f @ %.2f)' % (self.totalMatchedAmount, self.odds)
+        
+class MarketTradedVolume:
+    
+    """Contains the volume traded at each price on every runner in a market.
+    
+    Attributes:
+        currencyCode -- three letter ISO 4217 code of the amounts
+        marketId     -- id of the market
+        runners      -- list of RunnerTradedVolume, one for each runner (and 
+                        asian line)
+                        
+    """
+    # (selectionId, asianLineId) -> RunnerTradedVolume
+    _runnersIndex = None
+    
+    def __init__(self, marketId, currencyCode, runners):
+        self.marketId = marketId
+        self.currencyCode = currencyCode
+        self.runners = runners
+        
+    def getRunnerTradedVolume(self, selectionId, asianLineId=0):
+        """Return the RunnerTradedVolume for a selection, or None."""
+        if self._runnersIndex is None:
+            self._runnersIndex = _index_runners(self.runners)
+        return self._runnersIndex.get((selectionId, asianLineId))
+        
+    def calculateTotalMatched(self):
+        return sum([ runner.totalMatched() for runner in self.runners ])
+        
+    def calculateTotalBspBackMatched(self):
+        return sum([ runner.totalBspBackMatchedAmount 
+                     for runner in self.runners ])
+        
+    def calculateTotalBspLiabilityMatched(self):
+        return sum([ runner.totalBspLiabilityMatchedAmount 
+                     for runner in self.runners ])
+        
+    def __str__(self):
+        return '(%i, %s)' % (self.marketId, 
+                             [ str(runner) for runner in self.runners ])
+        
+class RunnerTradedVolume(object):
+    
+    """Represents the volume traded at each price on a runner.
+    
+    The volumes are held as parallel arrays, sorted by ascending price, so 
+    the amount matched at prices[i] is amounts[i].
+    
+    Attributes:
+        actualBSP                      -- the actual Betfair Starting Price, 
+                                          or None
+        amounts                        -- amount matched at each price
+        asianLineId                    -- id of the asian line, 0 if the 
+                                          market isn't Asian Handicap
+        prices                         -- the prices traded at
+        selectionId                    -- id of the selection
+        totalBspBackMatchedAmount      -- amount of BSP back bets matched
+        totalBspLiabilityMatchedAmount -- liability of BSP lay bets matched
+        
+    """
+    __slots__ = ('actualBSP', 'amounts', 'asianLineId', 'prices', 
+                 'selectionId', 'totalBspBackMatchedAmount',
+                 'totalBspLiabilityMatchedAmount')
+    
+    def totalMatched(self):
+        """Return the amount matched at all prices."""
+        return sum(self.amounts)
+        
+    def amountMatchedAt(self, price):
+        """Return the amount matched at exactly price."""
+        i = bisect_left(self.prices, price)
+        if i < len(self.prices) and self.prices[i] == price: 
+            return self.amounts[i]
+        return 0.0
+        
+    def amountMatchedBetween(self, low, high):
+        """Return the amount matched at prices from low to high, 
+        inclusive."""
+        return sum(self.amounts[bisect_left(self.prices, low):
+                                bisect_right(self.prices, high)])
+        
+    def __str__(self):
+        return '(%i-%i, %.2f matched at %i prices)' % (self.asianLineId, 
+            self.selectionId, self.totalMatched(), len(self.prices))
                                     
 class Subscription:
     """Represents information on your API subscription.
@@ -3855,7 +8738,7 @@ class Subscription:
         
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
         return '(%i %s (%s))' % (self.productId, self.productName, \
@@ -3887,7 +8770,7 @@ class ServiceCall:
         
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
         
     def __str__(self):
         return self.serviceType
@@ -3972,7 +8855,7 @@ class AccountStatementItem:
         
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
     
     def __str__(self):
         return '%s, %s, %s' % (self.fullMarketName, self.selectionName, \
@@ -4045,7 +8928,7 @@ class BetPlacementResult:
         
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
 
 class CancelBetsResult:
     """Represents the result of an attempt to cancel a bet.
@@ -4074,7 +8957,7 @@ class CancelBetsResult:
         
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
 
 class UpdateBetsResult:
     """Represents the result of an attempt to update a bet.
@@ -4109,7 +8992,7 @@ class UpdateBetsResult:
         
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
 
 class MarketDisplayDetail:
     """Represents additional information about runners, such as silks.
@@ -4139,7 +9022,7 @@ class MarketDisplayDetail:
 
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
 
 class RacingSilk(object):
     """Represents additional information about a single runner.
@@ -4175,7 +9058,7 @@ class RacingSilk(object):
 
     def __repr__(self):
         """Returns formatted XML representing the object."""
-        return self.node.toprettyxml()
+        return _node_xml(self)
 
 class RacingSilkV2(RacingSilk):
     def __init__(self, node):
@@ -4205,18 +9088,228 @@ class Breeding:
         self.yearBorn = extract(tag('yearBorn'))
 
     def __repr__(self):
-        return self.node.toprettyxml()
+        return _node_xml(self)
 
 def extract(tag):
     return tag[0].childNodes[0].nodeValue
 
+# the response class for each SOAP action
+_RESPONSE_CLASSES = {
+    'login':LoginResp,
+    'keepAlive':KeepAliveResp,
+    'getActiveEventTypes':GetEventTypesResp,
+    'getEvents':GetEventsResp,
+    'getSubscriptionInfo':GetSubscriptionInfoResp,
+    'getAccountFunds':GetAccountFundsResp,
+    'getAccountStatement':GetAccountStatementResp,
+    'getBetHistory':GetBetHistoryResp,
+    'getCurrentBets':GetCurrentBetsResp,
+    'getMUBets':GetMUBetsResp,
+    'getCurrentBetsLite':GetCurrentBetsLiteResp,
+    'getMUBetsLite':GetMUBetsLiteResp,
+    'getBetLite':GetBetLiteResp,
+    'getBetMatchesLite':GetBetMatchesLiteResp,
+    'getMarket':GetMarketResp,
+    'getAllMarkets':GetAllMarketsResp,
+    'getInPlayMarkets':GetInPlayMarketsResp,
+    'getMarketPrices':GetMarketPricesResp,
+    'getMarketPricesCompressed':GetMarketPricesCompressedResp,
+    'getCompleteMarketPricesCompressed':GetCompleteMarketPricesCompressedResp,
+    'getSilks':GetSilksResp,
+    'getSilksV2':GetSilksResp,
+    'getMarketProfitAndLoss':GetMarketProfitAndLossResp,
+    'getMarketTradedVolume':GetMarketTradedVolumeResp,
+    'getMarketTradedVolumeCompressed':GetMarketTradedVolumeCompressedResp,
+    'getDetailAvailableMktDepth':GetDetailAvailableMktDepthResp,
+    'placeBets':PlaceBetsResp,
+    'updateBets':UpdateBetsResp,
+    'cancelbets':CancelBetsResp,
+    'getBet':GetBetResp,
+}
+
+def _time_calls(func, duration):
+    """Return the calls per second func manages.
+    
+    The number of calls is doubled until they take at least duration 
+    seconds, and the better of two runs of that many calls is used.
+    
+    """
+    number = 1
+    while True:
+        started = time()
+        for i in xrange(number): func()
+        elapsed = time() - started
+        if elapsed >= duration: break
+        number *= 2
+        
+    started = time()
+    for i in xrange(number): func()
+    elapsed = min(elapsed, time() - started)
+        
+    return number / elapsed
+    
+def _count_objects(func):
+    """Return the number of objects tracked by gc that the result of func 
+    keeps alive."""
+    enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        before = len(gc.get_objects())
+        result = func()
+        return len(gc.get_objects()) - before
+    finally:
+        if enabled: gc.enable()
+        
+def _load_corpus(corpusDir):
+    """Load a corpus of captured responses from a directory, as a list of
+    (name, action, envelope) tuples. Each file is named for the SOAP action
+    of the response it holds, e.g. getMarketPrices-20.xml. corpusDir may 
+    also be a CaptureFile path, when each response is named for its action
+    and position in the file."""
+    corpus = []
+    if os.path.isfile(corpusDir):
+        for i, (timestamp, action, envelope, responseBody) in \
+                enumerate(CaptureFile(corpusDir).records()):
+            if action in _RESPONSE_CLASSES:
+                corpus.append(('%s-%i' % (action, i), action, responseBody))
+        return corpus
+        
+    for filename in sorted(os.listdir(corpusDir)):
+        name, extension = os.path.splitext(filename)
+        action = name.split('-')[0]
+        if extension != '.xml' or action not in _RESPONSE_CLASSES: continue
+        
+        f = open(os.path.join(corpusDir, filename), 'rb')
+        try:
+            corpus.append((name, action, f.read()))
+        finally:
+            f.close()
+    return corpus
+    
+def _benchmark(corpusDir=None, duration=0.05, parsers=None):
+    """Time response parsing and envelope building, and print the results.
+    
+    Each response in the corpus is parsed with each parser and built into its
+    response object, as often as fits in duration seconds. The corpus is 
+    generated by mockbetfair unless a directory of captured responses is 
+    given (see _load_corpus). objs is the number of objects tracked by gc
+    that the parsed document, or the response object built from it, keeps 
+    alive.
+    
+    Then the envelope for each BFExchangeService call is built, without 
+    being sent.
+    
+    """
+    if corpusDir:
+        corpus = _load_corpus(corpusDir)
+    else:
+        from mockbetfair import make_corpus
+        corpus = make_corpus()
+        
+    parsers = parsers or _PARSERS.keys()
+    parsers.sort()
+    
+    print "%-44s %8s %-8s %12s %8s %12s %8s" % ("response", "bytes", "parser",
+        "parse/sec", "objs", "build/sec", "objs")
+    for name, action, envelope in corpus:
+        respClass = _RESPONSE_CLASSES[action]
+        for parserName in parsers:
+            parse = _PARSERS[parserName]
+            doc = parse(envelope)
+            print "%-44s %8i %-8s %12.1f %8i %12.1f %8i" % (name, 
+                len(envelope), parserName, 
+                _time_calls(lambda: parse(envelope), duration),
+                _count_objects(lambda: parse(envelope)),
+                _time_calls(lambda: respClass(doc), duration),
+                _count_objects(lambda: respClass(doc)))
+    print
+    
+    # stands in for the response, for the methods that fill it in further
+    class Envelope(str):
+        depth = None
+        
+    class EnvelopeProxy(BFExchangeService):
+        def _call(self, env, action, respClass, started=None):
+            return Envelope(env)
+            
+    proxy = EnvelopeProxy()
+    token = 'x' * 40
+    marketId = 20771785
+    placeBet = PlaceBet(0, 47999, marketId, 'B', 2.0, 2.0)
+    updateBet = UpdateBets(1, 2.02, 2.0, 2.0, 2.0)
+    calls = [
+        ('getAccountFunds', (token,)),
+        ('getAccountStatement', (token,)),
+        ('getBetHistory', (token,)),
+        ('getCurrentBets', (token,)),
+        ('getMUBets', (token,)),
+        ('getCurrentBetsLite', (token,)),
+        ('getMUBetsLite', (token,)),
+        ('getMarket', (token, marketId)),
+        ('getAllMarkets', (token,)),
+        ('getInPlayMarkets', (token,)),
+        ('getMarketPrices', (token, marketId)),
+        ('getMarketPricesCompressed', (token, marketId)),
+        ('getCompleteMarketPricesCompressed', (token, marketId)),
+        ('getSilks', (token, [marketId])),
+        ('getSilksV2', (token, [marketId])),
+        ('getMarketProfitAndLoss', (token, marketId)),
+        ('getMarketTradedVolume', (token, marketId, 0, 47999)),
+        ('getMarketTradedVolumeCompressed', (token, marketId)),
+        ('getDetailAvailableMktDepth', (token, marketId, 47999)),
+        ('placeBets', (token, [placeBet])),
+        ('placeBets', (token, [placeBet] * 60)),
+        ('updateBets', (token, [updateBet] * 15)),
+        ('cancelBets', (token, range(1, 41))),
+        ('getBet', (token, 1)),
+        ('getBetLite', (token, 1)),
+        ('getBetMatchesLite', (token, 1)),
+    ]
+    
+    print "%-44s %8s %12s" % ("envelope", "bytes", "build/sec")
+    for method, args in calls:
+        func = getattr(proxy, method)
+        name = "%s(%s)" % (method, ', '.join([ 
+            isinstance(arg, list) and '%i items' % len(arg) or repr(arg) 
+            for arg in args[1:] ]))
+        print "%-44s %8i %12.1f" % (name, len(func(*args)), 
+            _time_calls(lambda: func(*args), duration))
+    print
+    
+    # time decoding, against the strptime/mktime conversion it replaced
+    def strptimeDecode(value):
+        return datetime.fromtimestamp(mktime(strptime(value[:19], 
+                                                      "%Y-%m-%dT%H:%M:%S")))
+                                                      
+    def uncachedDecode(value):
+        _ISO_TIME_CACHE.pop(value, None)
+        return _convert_iso_time(value)
+        
+    print "%-44s %12s %12s" % ("time", "strptime/sec", "decode/sec")
+    for name, value, decode in [
+            ('null date, cached', '0001-01-01T00:00:00.000Z', 
+             _convert_iso_time),
+            ('bet date, cached', '2009-03-12T15:30:04.000Z', 
+             _convert_iso_time),
+            ('bet date, uncached', '2009-03-12T15:30:04.000Z', 
+             uncachedDecode)]:
+        # strptimeDecode can't handle the null date on every platform
+        try:
+            strptimeRate = "%12.1f" % (_time_calls(
+                lambda: strptimeDecode(value), duration),)
+        except (OverflowError, ValueError):
+            strptimeRate = "%12s" % ("n/a",)
+        print "%-44s %s %12.1f" % (name, strptimeRate, 
+            _time_calls(lambda: decode(value), duration))
+
 def _selftest():
     import doctest
     doctest.testmod()
    
 def _formatOutput(apiEntity, outputFormat):
     if outputFormat == "xml":
-        return apiEntity.node.toprettyxml()
+        return _node_xml(apiEntity)
     elif outputFormat == "soap":
         return apiEntity.doc.toprettyxml()
         
@@ -4232,6 +9325,14 @@ Example: pybetfair -umybetfairusername --testInternal -v
         --debuglevel=LEVEL                      1 to display http wiredump
         
     -z, --gzip                                  use gzip compression
+        --parser=NAME                           response parser, minidom (default) or
+                                                expat
+        --timings                               print the time taken by each phase of
+                                                the calls made
+        --capture=FILE                          append every request and response to
+                                                FILE
+        --replay=FILE                           answer requests from the responses
+                                                captured in FILE instead of Betfair
     -u, --username=USERNAME                     login with USERNAME
         --productId=ID                          login with product ID
         --hostname=HOSTNAME                     the hostname to connect to (e.g. live api
@@ -4244,6 +9345,9 @@ Example: pybetfair -umybetfairusername --testInternal -v
         --getEvents=ID                          perform getEvents for parent event ID
                                                 and print
         --getMarket=ID                          perform getMarket for market ID and print
+        --getAllMarkets=EVENT_TYPE              perform getAllMarkets for EVENT_TYPE and
+                                                print
+        --getInPlayMarkets                      perform getInPlayMarkets and print
         --getSilks=ID                           perform getSilks for market ID and print
         --getSilksV2=ID                         perform getSilksV2 for market ID and print
         --getMarketPrices=ID                    perform getMarketPrices for market ID and
@@ -4255,10 +9359,17 @@ Example: pybetfair -umybetfairusername --testInternal -v
         --getCurrentBets=STATUS                 perform getCurrentBets for STATUS (M or U)
                                                 and print
         --getMUBets                             perform getMUBets and print
+        --getCurrentBetsLite=STATUS             perform getCurrentBetsLite for STATUS (M or
+                                                U) and print
+        --getMUBetsLite                         perform getMUBetsLite and print
         --getBetHistory=EVENT_TYPE              perform getBetHistory for EVENT_TYPE and
                                                 print
         --getMarketTradedVolume=ID              perform getMarketTradedVolume for market ID
                                                 and print
+        --getMarketTradedVolumeCompressed=ID    perform getMarketTradedVolumeCompressed for
+                                                market ID and print
+        --getDetailAvailableMktDepth=ID,SEL     perform getDetailAvailableMktDepth for
+                                                selection SEL in market ID and print
         --getAccountFunds                       perform getAccountFunds and print
         --getSubscriptionInfo                   perform getSubscriptionInfo and print
         --keepAlive                             perform keepAlive and print
@@ -4267,9 +9378,14 @@ Example: pybetfair -umybetfairusername --testInternal -v
         --getBet=ID                             perform getBet for ID and print
         
         --testInternal                          run internal unit tests. Use with -v to
-                                                see detailed results"""
+                                                see detailed results
+        --bench                                 time response parsing and envelope
+                                                building, then exit
+        --benchCorpus=DIR                       benchmark the responses captured in DIR,
+                                                or in a --capture FILE, instead of
+                                                generated ones"""
                                     
-    import sys, getopt, os
+    import getopt
     
     # debugging
     verbose = 0
@@ -4286,6 +9402,15 @@ Example: pybetfair -umybetfairusername --testInternal -v
     exchangeUrlPath = '/exchange/v5/BFExchangeService'
     useHTTPS = True
     useCompression=False
+    parser = "minidom"
+    timings = False
+    capture = None
+    replay = None
+    
+    # benchmarks
+    bench = False
+    benchCorpus = None
+    benchParsers = None
     
     # output
     outputFormat = "xml"
@@ -4294,16 +9419,22 @@ Example: pybetfair -umybetfairusername --testInternal -v
     getEventTypes = False
     getEvents = 0
     getMarket = 0
+    getAllMarkets = 0
+    getInPlayMarkets = False
     getSilks = 0
     getSilksV2 = 0
     getMarketPrices = 0
     getMarketPricesCompressed = 0
     getCompleteMarketPricesCompressed = 0
+    getMarketTradedVolumeCompressed = 0
+    getDetailAvailableMktDepth = None
     getCurrentBets = None
     getAccountFunds = False
     getSubscriptionInfo = False
     getBetHistory = 0
     getMUBets = False
+    getCurrentBetsLite = None
+    getMUBetsLite = False
     getMarketProfitAndLoss = 0
     getBet = 0
     
@@ -4321,6 +9452,10 @@ Example: pybetfair -umybetfairusername --testInternal -v
                 # additional options
                 "gzip",
                 "outputFormat=",
+                "parser=",
+                "timings",
+                "capture=",
+                "replay=",
                 
                 # account details
                 "username=",
@@ -4336,13 +9471,19 @@ Example: pybetfair -umybetfairusername --testInternal -v
                 "getEventTypes",
                 "getEvents=",
                 "getMarket=",
+                "getAllMarkets=",
+                "getInPlayMarkets",
                 "getSilks=",
                 "getSilksV2=",
                 "getMarketPrices=",
                 "getMarketPricesCompressed=",
                 "getCompleteMarketPricesCompressed=",
+                "getMarketTradedVolumeCompressed=",
+                "getDetailAvailableMktDepth=",
                 "getCurrentBets=",
                 "getMUBets",
+                "getCurrentBetsLite=",
+                "getMUBetsLite",
                 "getAccountFunds",
                 "getSubscriptionInfo",
                 "getBetHistory=",
@@ -4351,6 +9492,8 @@ Example: pybetfair -umybetfairusername --testInternal -v
                 
                 # unit tests
                 "testInternal",
+                "bench",
+                "benchCorpus=",
             ])
 
     except getopt.GetoptError, ex:
@@ -4380,6 +9523,15 @@ Example: pybetfair -umybetfairusername --testInternal -v
             sys.exit(0)
         elif opt in ("-o", "--outputFormat"):
             outputFormat = arg
+        elif opt == "--parser":
+            parser = arg
+            benchParsers = [arg]
+        elif opt == "--timings":
+            timings = True
+        elif opt == "--capture":
+            capture = CaptureFile(arg)
+        elif opt == "--replay":
+            replay = ReplayTransport(CaptureFile(arg))
                 
         # account details
         elif opt in ("-u", "--username"):
@@ -4408,6 +9560,10 @@ Example: pybetfair -umybetfairusername --testInternal -v
             getEvents = int(arg)
         elif opt == "--getMarket":
             getMarket = int(arg)
+        elif opt == "--getAllMarkets":
+            getAllMarkets = int(arg)
+        elif opt == "--getInPlayMarkets":
+            getInPlayMarkets = True
         elif opt == "--getSilks":
             getSilks = int(arg)
         elif opt == "--getSilksV2":
@@ -4418,10 +9574,18 @@ Example: pybetfair -umybetfairusername --testInternal -v
             getMarketPricesCompressed = int(arg)
         elif opt == "--getCompleteMarketPricesCompressed":
             getCompleteMarketPricesCompressed = int(arg)
+        elif opt == "--getMarketTradedVolumeCompressed":
+            getMarketTradedVolumeCompressed = int(arg)
+        elif opt == "--getDetailAvailableMktDepth":
+            getDetailAvailableMktDepth = map(int, arg.split(","))
         elif opt == "--getCurrentBets":
             getCurrentBets = arg
         elif opt == "--getMUBets":
             getMUBets = True
+        elif opt == "--getCurrentBetsLite":
+            getCurrentBetsLite = arg
+        elif opt == "--getMUBetsLite":
+            getMUBetsLite = True
         elif opt == "--getAccountFunds":
             getAccountFunds = True
         elif opt == "--getSubscriptionInfo":
@@ -4438,6 +9602,16 @@ Example: pybetfair -umybetfairusername --testInternal -v
             print "self test", opt
             _selftest()
             sys.exit(0)
+        elif opt == "--bench":
+            bench = True
+        elif opt == "--benchCorpus":
+            bench = True
+            benchCorpus = arg
+            
+    # benchmarks don't need an account
+    if bench:
+        _benchmark(benchCorpus, parsers=benchParsers)
+        sys.exit(0)
             
     try:
         homedir = os.environ["USERPROFILE"]
@@ -4471,136 +9645,181 @@ Example: pybetfair -umybetfairusername --testInternal -v
         print "Must specify username and password"
         sys.exit(2)
     
+    # one set of metrics for all the proxies
+    metrics = (timings or (useCompression and verbose)) and CallMetrics() \
+                or None
+    
     globalProxy = BFGlobalService(debuglevel=debuglevel, hostname=globalHost, 
                         url=globalUrlPath, secure=useHTTPS,
-                        compressed=useCompression)
+                        compressed=useCompression, parser=parser, 
+                        metrics=metrics, capture=capture, replay=replay)
                         
     exchangeUKProxy = BFExchangeService(debuglevel=debuglevel, 
                         hostname=exchangeHostUK, url=exchangeUrlPath,
-                        secure=useHTTPS, compressed=useCompression)
+                        secure=useHTTPS, compressed=useCompression,
+                        parser=parser, metrics=metrics, capture=capture,
+                        replay=replay)
         
     exchangeAUSProxy = BFExchangeService(debuglevel=debuglevel, 
                         hostname=exchangeHostAUS, url=exchangeUrlPath,
-                        secure=useHTTPS, compressed=useCompression)
+                        secure=useHTTPS, compressed=useCompression,
+                        parser=parser, metrics=metrics, capture=capture,
+                        replay=replay)
+        
+    # log in, so we can perform requests. The session keeps the token up to
+    # date from each response
+    session = BFSession(globalProxy, username, password, productId, 
+                        keepAliveInterval=None)
+    try:
+        l = session.login()
+    except LoginError, e:
+        print "Login failure: %s" % (e.errorCode,)
+        sys.exit(3)
         
-    # log in, so we can perform requests
-    l = globalProxy.login(username, password, productId)
-    sessionToken = l.header.sessionToken
     if verbose == 1: print str(l)
     elif verbose > 1:
         print l.__repr__()
-        
-    if l.errorCode != "OK":
-        print "Login failure: %s" % (l.errorCode,)
-        sys.exit(3)
     
     if getEventTypes:
-        eventTypes = globalProxy.getActiveEventTypes(sessionToken)
-        sessionToken = eventTypes.header.sessionToken
+        eventTypes = session.call(globalProxy.getActiveEventTypes)
         print _formatOutput(eventTypes, outputFormat)
 
     if getEvents > 0:
-        bfEvents = globalProxy.getEvents(sessionToken, getEvents)
-        sessionToken = bfEvents.header.sessionToken
+        bfEvents = session.call(globalProxy.getEvents, getEvents)
         if verbose > 1:
             print bfEvents.__repr__()
         elif verbose == 1: print str(bfEvents)
  
     if getMarket > 0:
-        market = exchangeUKProxy.getMarket(sessionToken, getMarket)
-        sessionToken = market.header.sessionToken
+        market = session.call(exchangeUKProxy.getMarket, getMarket)
         if verbose > 1:
             print market.__repr__()
         elif verbose == 1: print str(market)
  
+    if getAllMarkets > 0:
+        markets = session.call(exchangeUKProxy.getAllMarkets, [getAllMarkets])
+        if verbose > 1:
+            print markets.__repr__()
+        elif verbose == 1: 
+            print str(markets)
+            for market in MarketCatalogue(markets.iterMarkets()).find(): 
+                print str(market)
+ 
+    if getInPlayMarkets:
+        markets = session.call(exchangeUKProxy.getInPlayMarkets)
+        if verbose > 1:
+            print markets.__repr__()
+        elif verbose == 1: 
+            print str(markets)
+            tracker = InPlayTracker()
+            wentInPlay, leftInPlay = tracker.update(markets.iterMarkets())
+            for market in wentInPlay: print str(market)
+ 
     if getSilks > 0:
-        market = exchangeUKProxy.getSilks(sessionToken, [getSilks])
-        sessionToken = market.header.sessionToken
+        market = session.call(exchangeUKProxy.getSilks, [getSilks])
         if verbose > 1:
             print market.__repr__()
         elif verbose == 1: print str(market)
 
     if getSilksV2 > 0:
-        market = exchangeUKProxy.getSilksV2(sessionToken, [getSilksV2])
-        sessionToken = market.header.sessionToken
+        market = session.call(exchangeUKProxy.getSilksV2, [getSilksV2])
         if verbose > 1:
             print market.__repr__()
         elif verbose == 1: print str(market)
  
     if getMarketPrices > 0:
-        prices = exchangeUKProxy.getMarketPrices(sessionToken, getMarketPrices)
-        sessionToken = prices.header.sessionToken
+        prices = session.call(exchangeUKProxy.getMarketPrices, getMarketPrices)
         if verbose > 1:
             print prices.__repr__()
         elif verbose == 1: print str(prices)
 
     if getMarketPricesCompressed >0:
-        prices = exchangeUKProxy.getMarketPricesCompressed(sessionToken, getMarketPricesCompressed)
-        sessionToken = prices.header.sessionToken
+        prices = session.call(exchangeUKProxy.getMarketPricesCompressed, getMarketPricesCompressed)
         if verbose > 1:
             print prices.__repr__()
         elif verbose == 1: print str(prices)
  
     if getCompleteMarketPricesCompressed >0:
-        prices = exchangeUKProxy.getCompleteMarketPricesCompressed(sessionToken, getCompleteMarketPricesCompressed)
-        sessionToken = prices.header.sessionToken
+        prices = session.call(exchangeUKProxy.getCompleteMarketPricesCompressed, getCompleteMarketPricesCompressed)
         if verbose > 1:
             print prices.__repr__()
         elif verbose == 1: print str(prices)
 
+    if getMarketTradedVolumeCompressed > 0:
+        volume = session.call(exchangeUKProxy.getMarketTradedVolumeCompressed, getMarketTradedVolumeCompressed)
+        if verbose > 1:
+            print volume.__repr__()
+        elif verbose == 1: print str(volume)
+
+    if getDetailAvailableMktDepth:
+        depth = session.call(exchangeUKProxy.getDetailAvailableMktDepth, *getDetailAvailableMktDepth)
+        if verbose > 1:
+            print depth.__repr__()
+        elif verbose == 1: print str(depth)
+
     if getCurrentBets:
-        bets = exchangeUKProxy.getCurrentBets(sessionToken, recordCount=10, \
+        bets = session.call(exchangeUKProxy.getCurrentBets, recordCount=10, \
             betStatus=getCurrentBets, orderBy="PLACED_DATE")
-        sessionToken = bets.header.sessionToken
         if verbose > 1:
             print bets.__repr__()
         elif verbose == 1: print str(bets)
 
     if getMUBets:
-        bets = exchangeUKProxy.getMUBets(sessionToken, recordCount=10, \
+        bets = session.call(exchangeUKProxy.getMUBets, recordCount=10, \
+            betStatus="MU")
+        if verbose > 1:
+            print bets.__repr__()
+        elif verbose == 1: print str(bets)
+
+    if getCurrentBetsLite:
+        bets = session.call(exchangeUKProxy.getCurrentBetsLite, \
+            recordCount=10, betStatus=getCurrentBetsLite, orderBy="PLACED_DATE")
+        if verbose > 1:
+            print bets.__repr__()
+        elif verbose == 1: print str(bets)
+
+    if getMUBetsLite:
+        bets = session.call(exchangeUKProxy.getMUBetsLite, recordCount=10, \
             betStatus="MU")
         if verbose > 1:
             print bets.__repr__()
         elif verbose == 1: print str(bets)
 # 
     # if getAccountFunds:
-        # funds = proxy.getAccountFunds(sessionToken)
-        # sessionToken = funds.header.sessionToken
+        # funds = session.call(proxy.getAccountFunds)
         # if verbose > 1:
             # print funds.__repr__()
         # elif verbose == 1: print str(funds)
 # 
     # if getSubscriptionInfo:
-        # info = proxy.getSubscriptionInfo(sessionToken)
-        # sessionToken = info.header.sessionToken
+        # info = session.call(proxy.getSubscriptionInfo)
         # if verbose > 1:
             # print info.__repr__()
         # elif verbose == 1: print str(info)
 # 
     # if getBetHistory:
-        # bets = proxy.getBetHistory(sessionToken, recordCount=10,
+        # bets = session.call(proxy.getBetHistory, recordCount=10,
             # betTypesIncluded='S', eventTypeIds=[getBetHistory])
-        # sessionToken = bets.header.sessionToken
         # if verbose > 1:
             # print bets.__repr__()
         # elif verbose == 1: print str(bets)
  
     if getMarketProfitAndLoss:
-        pl = exchangeUKProxy.getMarketProfitAndLoss(sessionToken, getMarketProfitAndLoss)
-        sessionToken = pl.header.sessionToken
+        pl = session.call(exchangeUKProxy.getMarketProfitAndLoss, getMarketProfitAndLoss)
         if verbose > 1:
             print pl.__repr__()
         elif verbose == 1: print str(pl)
 # 
     # if getBet:
-        # bet = proxy.getBet(sessionToken, getBet)
-        # sessionToken = bet.header.sessionToken
+        # bet = session.call(proxy.getBet, getBet)
         # if verbose > 1:
             # print bet.__repr__()
         # elif verbose == 1: print str(bet)
-# 
-    # if useCompression and verbose:
-        # print "Downloaded %i bytes, expanded to %i" % \
-            # tuple(proxy.compressedDownloadStats)
+
+    if useCompression and verbose:
+        print "Downloaded %i bytes, expanded to %i" % \
+            metrics.getDownloadStats()
+            
+    if timings: print str(metrics)
             
 # vim: set ts=4 sw=4 softtabstop=4 smarttab expandtab:
@@ -28,7 +28,7 @@ def processRunners(market, prices, excludeOver, verbose):
     hitlist = []
     ignoredRunners = []
 
-    for runnerPrices in prices.marketPrices.runnerPrices:
+    for runner, runnerPrices in market.pairRunnerPrices(prices.marketPrices):
 
         totalMatched += runnerPrices.totalAmountMatched
 
@@ -39,8 +39,6 @@ def processRunners(market, prices, excludeOver, verbose):
             overround = 1000
             break
     
-        runner = market.findRunner(runnerPrices.selectionId, runnerPrices.asianLineId)
-    
         # ignore runner if over the exclude limit
         if runnerPrices.bestPricesToBack[0].price > excludeOver:
             ignoredRunners.append(runner)
@@ -61,8 +59,9 @@ def processRunners(market, prices, excludeOver, verbose):
 
     return (hitlist, ignoredRunners, overround, totalMatched)
 
-def calculateBets(hitlist, divisor, totalStake, verbose):
-    placeBets = []
+def calculateBets(hitlist, divisor, totalStake):
+    "Returns the bets to fire, as (selectionId, asianLineId, price, size) tuples, with the profits and whether the market has the volume"
+    bets = []
     # assume the market has enough money
     moneyIsAvailable = True
     
@@ -70,11 +69,6 @@ def calculateBets(hitlist, divisor, totalStake, verbose):
         # alter stake to fit plan dictated by minimum stake
         stake = runner['winChance'] / divisor
     
-        # print scenario
-        if verbose:
-            print "Back %-28s for %11.2f @ %6.2f %11.2f avail." \
-                % (runner['runner'].name, stake, runner['odds'], runner['available'])
-            
         # check market volume - can't snipe if there isn't enough
         # money to accept all our bets
         if stake > runner['available']:
@@ -83,16 +77,19 @@ def calculateBets(hitlist, divisor, totalStake, verbose):
         # create the bet if we have enough volume
         if moneyIsAvailable:
             r = runner['runner']
-            placeBets.append(PlaceBet(r.asianLineId, r.selectionId, market.marketId, \
-                betType, runner['odds'], stake))
+            bets.append((r.selectionId, r.asianLineId, runner['odds'], stake))
                 
-   # check the least profitable runner is above the specified minimum
+    # check the least profitable runner is above the specified minimum
     profits = [ calculateProfit(runner, divisor, totalStake) for runner in hitlist ]
-    minProfit = min(profits)
 
-    return placeBets, profits, moneyIsAvailable
+    return bets, profits, moneyIsAvailable
 
-def snipe(proxy, sessionToken, market, verbose=False):
+def printScenario(hitlist, divisor):
+    for runner in hitlist:
+        print "Back %-28s for %11.2f @ %6.2f %11.2f avail." \
+            % (runner['runner'].name, runner['winChance'] / divisor, runner['odds'], runner['available'])
+
+def snipe(proxy, session, market, verbose=False):
     # start sniping. Basic algorithm is:
     # 1) get prices
     # 2) calculate overround
@@ -103,13 +100,15 @@ def snipe(proxy, sessionToken, market, verbose=False):
     # 5) make adjustments according to minimum stake
     # 6) print scenario and total stake required
     headshot = False
+    
+    # format the bets for every runner now, so only the prices and stakes
+    # are left to fill in when we take the shot
+    armed = proxy.armBets(market.marketId, market.runners, betType)
     try:
         while not headshot:
             # get prices on specified market, abort on fail
-            prices = proxy.getMarketPrices(sessionToken, marketId=market.marketId)
-            if prices.errorCode == "OK":
-                sessionToken = prices.header.sessionToken
-            else:
+            prices = session.call(proxy.getMarketPrices, marketId=market.marketId)
+            if prices.errorCode != "OK":
                 print "Failed to get prices - aborting (%s)" % (prices.errorCode,)
                 sys.exit(1)
             
@@ -130,10 +129,9 @@ def snipe(proxy, sessionToken, market, verbose=False):
 
                     # all runners processed - is there an opportunity to snipe?
                     if 100.0 - triggerMargin >= overround:
-                        print 
-                        print "*" * 72
-                        print "Sniping opportunity found! Overround is %.1f\n" % (overround,)
-                        placeBets = []
+                        # the time from here until the bets are sent is recorded as 
+                        # their detect phase, so fire before printing anything
+                        detected = time()
                         
                         # lowest stake will be on longest shot
                         outsider = min([ runner['winChance'] for runner in hitlist ])
@@ -142,13 +140,24 @@ def snipe(proxy, sessionToken, market, verbose=False):
                         # how much do we need to bet, given the specified minimum stake,
                         # and is the total too high?
                         totalStake = sum( [ runner['winChance'] / divisor for runner in hitlist ])
+                        bets, profits, moneyIsAvailable = calculateBets(hitlist, divisor, totalStake)
+                        minProfit = min(profits)
+                        
+                        # OK, take the shot if it passes all the rules
+                        results = None
+                        if liveAmmo and moneyIsAvailable and totalStake <= maxTotalStake \
+                                and minProfit >= minimumAverageProfit:
+                            results = session.call(armed.fire, bets, detected=detected)
+                        
+                        print 
+                        print "*" * 72
+                        print "Sniping opportunity found! Overround is %.1f\n" % (overround,)
+                        
                         if totalStake > maxTotalStake:
                             print "Could snipe with stake of %.2f, but limited to %.2f" % (totalStake, maxTotalStake)
                         else:
-                            placeBets, profits, moneyIsAvailable = calculateBets(hitlist, divisor, totalStake, verbose)
-                            minProfit = min(profits)
-
                             if verbose:
+                                printScenario(hitlist, divisor)
                                 if len(ignoredRunners) > 0:
                                     print "Ignoring: ", [ r.name for r in ignoredRunners ]
 
@@ -161,11 +170,14 @@ def snipe(proxy, sessionToken, market, verbose=False):
                                 
                                 if moneyIsAvailable: 
                                     if liveAmmo:
-                                        # OK, take the shot
-                                        results = ukProxy.placeBets(sessionToken, placeBets)
                                         if results.errorCode == "OK":
-                                            sessionToken = results.header.sessionToken
-                                            if verbose: print str(results)
+                                            if verbose: 
+                                                print str(results)
+                                                metrics = proxy.orderLane.metrics
+                                                print "Detection to send: %s" % \
+                                                    (metrics.getHistogram('placeBets', 'detect'),)
+                                                print "Order lane placeBets: %s" % \
+                                                    (metrics.getHistogram('placeBets', 'total'),)
                                         else:
                                             print "Failed to place bets: %s" % (results.errorCode,)
                                             print str(results)
@@ -184,14 +196,17 @@ def snipe(proxy, sessionToken, market, verbose=False):
                                 prices.marketPrices.delay > 0 and ' (in-play)' or '', totalMatched)
                         
             if not headshot:
-                # couldn't snipe this time - pause and try again
+                # couldn't snipe this time - pause and try again, making sure 
+                # the order connection is still open for when we do
+                proxy.warmOrderLane()
                 sleep(interval)
     except KeyboardInterrupt:
         pass
 
 if __name__ == "__main__":
-    from pybetfair import BFGlobalService, BFExchangeService, PlaceBet
-    from time import sleep
+    from pybetfair import BFGlobalService, BFExchangeService, BFSession, \
+        LoginError, OrderLane
+    from time import sleep, time
     import sys, getopt, os
     
     # login credentials
@@ -339,20 +354,23 @@ if __name__ == "__main__":
     # dev settings: api betexb10, exchange betexb58        
     globalProxy = BFGlobalService(debuglevel=debuglevel, hostname=hostname, secure=useHTTPS)
     
-    # login to API, abort on fail
-    loginResponse = globalProxy.login(username, password, productId)
-    if loginResponse.errorCode == "OK":
-        sessionToken = loginResponse.header.sessionToken
-    else:
-        print "Failed to login - aborting (%s)" % (loginResponse.errorCode,)
+    # login to API, abort on fail. The session keeps the login alive while
+    # we wait for an opportunity
+    session = BFSession(globalProxy, username, password, productId)
+    try:
+        session.login()
+    except LoginError, e:
+        print "Failed to login - aborting (%s)" % (e.errorCode,)
         sys.exit(1)
 
     # get specified market, abort on fail
-    ukProxy = BFExchangeService(debuglevel=debuglevel, hostname=hostname, secure=useHTTPS)
-    marketResponse = ukProxy.getMarket(sessionToken, marketId=marketId)
-    if marketResponse.errorCode == "OK":
-        sessionToken = marketResponse.header.sessionToken
-    else:
+    # bets go over a connection of their own, opened up front, so that
+    # taking the shot never waits behind a prices request
+    ukProxy = BFExchangeService(debuglevel=debuglevel, hostname=hostname, secure=useHTTPS, 
+                                orderLane=OrderLane())
+    ukProxy.warmOrderLane()
+    marketResponse = session.call(ukProxy.getMarket, marketId=marketId)
+    if marketResponse.errorCode != "OK":
         print "Failed to get market - aborting (%s)" % (marketResponse.errorCode,)
         sys.exit(1)
 
@@ -369,4 +387,4 @@ if __name__ == "__main__":
             print "       ", runner.name
         print
         
-    snipe(ukProxy, sessionToken, market, verbose)
+    snipe(ukProxy, session, market, verbose)